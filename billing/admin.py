@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment, InvoiceSequence, PaymentReceipt
+from .models import Payment, InvoiceSequence, PaymentReceipt, PrintJob
 
 @admin.register(Payment)
 class BillingPaymentAdmin(admin.ModelAdmin):
@@ -18,3 +18,10 @@ class PaymentReceiptAdmin(admin.ModelAdmin):
     list_display = ("receipt_no", "payment", "issued_at")
     search_fields = ("receipt_no",)
     autocomplete_fields = ("payment",)
+
+@admin.register(PrintJob)
+class PrintJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "printer", "format", "status", "order", "attempts", "created_at", "printed_at")
+    list_filter = ("status", "printer", "format")
+    readonly_fields = ("claimed_at", "printed_at", "attempts", "last_error")
+    exclude = ("payload",)
@@ -0,0 +1,131 @@
+# billing/escpos.py
+"""
+Thermal-printer receipts from ReceiptService.receipt_data(): plain text for
+any printer/preview, ESC/POS bytes for counter printers. Pure string work —
+no reportlab, no images (the QR uses the printer's native QR command).
+"""
+from decimal import Decimal, InvalidOperation
+
+ESC = b"\x1b"
+GS = b"\x1d"
+
+INIT = ESC + b"@"
+ALIGN_LEFT = ESC + b"a\x00"
+ALIGN_CENTER = ESC + b"a\x01"
+BOLD_ON = ESC + b"E\x01"
+BOLD_OFF = ESC + b"E\x00"
+DOUBLE_ON = GS + b"!\x11"
+DOUBLE_OFF = GS + b"!\x00"
+FEED_AND_CUT = ESC + b"d\x04" + GS + b"V\x00"
+
+DEFAULT_WIDTH = 42  # 80 mm paper, font A
+ENCODING = "cp437"
+# Most printer code pages have no rupee sign
+CURRENCY_PREFIX = "Rs."
+
+
+def _amount(value) -> str:
+    return f"{CURRENCY_PREFIX}{value}"
+
+
+def _positive(value) -> bool:
+    try:
+        return Decimal(str(value)) > 0
+    except InvalidOperation:
+        return False
+
+
+def _pair(left: str, right: str, width: int) -> str:
+    room = width - len(right) - 1
+    return f"{left[:room]:<{room}} {right}"
+
+
+def _item_lines(item: dict, width: int):
+    qty_total = f"{item['quantity']} x {item['price']}  {_amount(item['total'])}"
+    name = item["name"]
+    if len(name) + len(qty_total) + 1 <= width:
+        return [_pair(name, qty_total, width)]
+    return [name[:width], qty_total.rjust(width)]
+
+
+def _totals(data: dict):
+    rows = [("Subtotal", _amount(data["subtotal"]))]
+    if _positive(data["discount_amount"]):
+        rows.append((data["discount_label"].rstrip(":"), f"-{_amount(data['discount_amount'])}"))
+    if _positive(data["tax_amount"]):
+        rows.append((f"Tax ({data['tax_percent']}%)", _amount(data["tax_amount"])))
+    if _positive(data["tip_amount"]):
+        rows.append(("Tip", _amount(data["tip_amount"])))
+    return rows
+
+
+def _body(data: dict, width: int) -> list:
+    rule = "-" * width
+    lines = [
+        f"Invoice: {data['invoice_no']}",
+        f"Date:    {data['date']}",
+        f"Table:   {data['table']}",
+        f"Customer: {data['customer']}",
+        rule,
+    ]
+    for item in data["items"]:
+        lines.extend(_item_lines(item, width))
+    lines.append(rule)
+    lines.extend(_pair(label, value, width) for label, value in _totals(data))
+    return lines
+
+
+def _footer(data: dict, width: int) -> list:
+    lines = [_pair("Paid", _amount(data["amount_paid"]), width)]
+    if _positive(data["balance_due"]):
+        lines.append(_pair("Balance", _amount(data["balance_due"]), width))
+    for payment in data["payments"]:
+        lines.append(_pair(f"  {payment['label']}", _amount(payment["amount"]), width))
+    return lines
+
+
+def render_receipt_text(data: dict, width: int = DEFAULT_WIDTH) -> str:
+    """Fixed-width plain-text receipt."""
+    header = [data["org_name"].center(width)]
+    for extra in (data["org_address"], f"Phone: {data['org_phone']}" if data["org_phone"] else ""):
+        if extra:
+            header.append(extra.center(width))
+    lines = header + [""] + _body(data, width)
+    lines.append(_pair("TOTAL", _amount(data["total"]), width))
+    lines += _footer(data, width)
+    lines += ["", "Thank you for your business!".center(width), "Please visit again!".center(width), ""]
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def _qr(payload: str) -> bytes:
+    """Native ESC/POS QR (GS ( k): model 2, module size 4, error level M."""
+    data = payload.encode(ENCODING, errors="replace")
+    size = len(data) + 3
+    return b"".join([
+        GS + b"(k\x04\x00\x31\x41\x32\x00",
+        GS + b"(k\x03\x00\x31\x43\x04",
+        GS + b"(k\x03\x00\x31\x45\x31",
+        GS + b"(k" + bytes([size % 256, size // 256]) + b"\x31\x50\x30" + data,
+        GS + b"(k\x03\x00\x31\x51\x30",
+    ])
+
+
+def render_receipt_escpos(data: dict, width: int = DEFAULT_WIDTH, qr: bool = True) -> bytes:
+    """Printer-ready ESC/POS bytes for the same receipt."""
+    def enc(text: str) -> bytes:
+        return text.encode(ENCODING, errors="replace") + b"\n"
+
+    out = [INIT, ALIGN_CENTER, DOUBLE_ON, enc(data["org_name"][: width // 2]), DOUBLE_OFF]
+    if data["org_address"]:
+        out.append(enc(data["org_address"]))
+    if data["org_phone"]:
+        out.append(enc(f"Phone: {data['org_phone']}"))
+    out += [ALIGN_LEFT, b"\n"]
+    out += [enc(line) for line in _body(data, width)]
+    out += [BOLD_ON, enc(_pair("TOTAL", _amount(data["total"]), width)), BOLD_OFF]
+    out += [enc(line) for line in _footer(data, width)]
+    out.append(ALIGN_CENTER)
+    if qr:
+        out += [b"\n", _qr(f"Order: {data['reference']}\nTotal: {_amount(data['total'])}\nDate: {data['created_date']}")]
+    out += [b"\n", enc("Thank you for your business!"), enc("Please visit again!"), FEED_AND_CUT]
+    return b"".join(out)
@@ -0,0 +1,97 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from billing.escpos import render_receipt_escpos, render_receipt_text
+from billing.services import ReceiptService
+from payments.render_farm import render_many, shutdown
+
+
+def _sample_receipt(n: int, items: int) -> dict:
+    return {
+        "org_name": "Bench Bistro",
+        "org_address": "1 Main Street",
+        "org_phone": "555-0100",
+        "invoice_no": f"INV-{n:06d}",
+        "reference": f"INV-{n:06d}",
+        "order_id": n,
+        "date": "2024-01-01 12:00",
+        "created_date": "2024-01-01",
+        "table": "7",
+        "customer": "Walk-in",
+        "items": [
+            {"name": f"Dish {i} + extra cheese", "quantity": 2, "price": "9.50", "total": "19.00"}
+            for i in range(items)
+        ],
+        "subtotal": f"{19 * items}.00",
+        "discount_amount": "0",
+        "discount_label": "Discount:",
+        "tax_amount": "0",
+        "tax_percent": "0",
+        "tip_amount": "2.00",
+        "total": f"{19 * items + 2}.00",
+        "amount_paid": f"{19 * items + 2}.00",
+        "balance_due": "0",
+        "payments": [{"label": "CARD", "amount": f"{19 * items + 2}.00"}],
+    }
+
+
+class Command(BaseCommand):
+    help = "Render synthetic receipts (ESC/POS, text, PDF) in memory and report receipts/sec (no DB, no storage)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=200)
+        parser.add_argument("--items", type=int, default=8, help="line items per receipt")
+        parser.add_argument("--threads", type=int, default=4, help="concurrent renders (0 = skip)")
+        parser.add_argument("--processes", type=int, default=0, help="render farm processes (0 = skip)")
+
+    def handle(self, *args, **opts):
+        count, threads = opts["count"], opts["threads"]
+        jobs = [_sample_receipt(n, opts["items"]) for n in range(count)]
+
+        for label, render in (("escpos", render_receipt_escpos), ("text", render_receipt_text)):
+            start = time.perf_counter()
+            for job in jobs:
+                render(job)
+            wall = time.perf_counter() - start
+            self.stdout.write(
+                f"{label:<11} {count} receipts in {wall:6.3f}s  "
+                f"{count / wall:9.0f} receipts/s  {wall / count * 1e6:7.1f} us/receipt"
+            )
+
+        ReceiptService.render_receipt_pdf(jobs[0])  # warm style cache / fonts
+
+        start = time.perf_counter()
+        sizes = [len(ReceiptService.render_receipt_pdf(job)) for job in jobs]
+        wall = time.perf_counter() - start
+        self.stdout.write(
+            f"serial      {count} receipts in {wall:6.2f}s  "
+            f"{count / wall:7.1f} receipts/s  avg={sum(sizes) // len(sizes)} bytes"
+        )
+
+        if threads:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                pdfs = list(pool.map(ReceiptService.render_receipt_pdf, jobs))
+            wall = time.perf_counter() - start
+            bad = sum(1 for pdf in pdfs if not pdf.startswith(b"%PDF"))
+            self.stdout.write(
+                f"threads={threads:<3} {count} receipts in {wall:6.2f}s  "
+                f"{count / wall:7.1f} receipts/s  invalid={bad}"
+            )
+
+        if opts["processes"]:
+            processes = opts["processes"]
+            try:
+                render_many([("receipt", job) for job in jobs[:processes * 2]], workers=processes)  # start the pool
+                start = time.perf_counter()
+                pdfs = render_many([("receipt", job) for job in jobs], workers=processes)
+                wall = time.perf_counter() - start
+            finally:
+                shutdown()
+            bad = sum(1 for pdf in pdfs if not (pdf or b"").startswith(b"%PDF"))
+            self.stdout.write(
+                f"procs={processes:<5} {count} receipts in {wall:6.2f}s  "
+                f"{count / wall:7.1f} receipts/s  invalid={bad}"
+            )
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentreceipt',
+            name='receipt_file',
+            field=models.FileField(blank=True, null=True, upload_to='receipts/'),
+        ),
+    ]
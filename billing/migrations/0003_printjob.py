@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_paymentreceipt_receipt_file'),
+        ('orders', '0005_order_invoice_archived_to_alter_order_invoice_pdf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrintJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('printer', models.CharField(default='counter', max_length=64)),
+                ('format', models.CharField(choices=[('escpos', 'ESC/POS'), ('text', 'Plain text')], default='escpos', max_length=8)),
+                ('payload', models.BinaryField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('claimed', 'Claimed'), ('done', 'Printed'), ('failed', 'Failed')], default='pending', max_length=8)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('printed_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='print_jobs', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Print Job',
+                'verbose_name_plural': 'Print Jobs',
+                'indexes': [models.Index(fields=['printer', 'status', 'id'], name='printjob_queue_idx')],
+            },
+        ),
+    ]
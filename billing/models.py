@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 
 class Payment(models.Model):
     order = models.ForeignKey(
@@ -25,11 +26,30 @@ class InvoiceSequence(models.Model):
     class Meta:
         verbose_name = "Invoice Sequence"
         verbose_name_plural = "Invoice Sequences"
-    def __str__(self): return f"{self.prefix}-{self.last_number:06d}"
+    def __str__(self): return self.format_number(self.last_number)
+    def format_number(self, number: int) -> str:
+        return f"{self.prefix}-{number:06d}"
+    @classmethod
+    def reserve(cls, prefix: str, size: int = 1) -> range:
+        """
+        Atomically claim the next `size` numbers of `prefix`, creating the
+        sequence on first use. The F() update takes the row lock and the
+        re-read inside the same transaction sees our own write, so
+        concurrent callers always get disjoint ranges.
+        """
+        with transaction.atomic():
+            rows = cls.objects.filter(prefix=prefix)
+            if not rows.update(last_number=F("last_number") + size):
+                cls.objects.get_or_create(prefix=prefix)
+                rows.update(last_number=F("last_number") + size)
+            last = rows.values_list("last_number", flat=True).get()
+        return range(last - size + 1, last + 1)
+    def reserve_block(self, size: int = 1) -> range:
+        block = InvoiceSequence.reserve(self.prefix, size)
+        self.last_number = block[-1]
+        return block
     def next_invoice_no(self) -> str:
-        self.last_number += 1
-        self.save(update_fields=["last_number"])
-        return f"{self.prefix}-{self.last_number:06d}"
+        return self.format_number(self.reserve_block(1)[0])
 
 class PaymentReceipt(models.Model):
     payment = models.ForeignKey(
@@ -38,9 +58,43 @@ class PaymentReceipt(models.Model):
     )
     receipt_no = models.CharField(max_length=32, unique=True, null=True, blank=True)
     issued_at = models.DateTimeField(auto_now_add=True)
+    receipt_file = models.FileField(upload_to="receipts/", blank=True, null=True)
     notes = models.TextField(blank=True, default="")
     class Meta:
         verbose_name = "Payment Receipt"
         verbose_name_plural = "Payment Receipts"
     def __str__(self):
         return f"Receipt {self.receipt_no or '-'} for BillingPayment {self.payment_id or '-'}"
+
+class PrintJob(models.Model):
+    """Printer-ready bytes waiting for a local print agent (see billing.views_print)."""
+    STATUS_PENDING = "pending"
+    STATUS_CLAIMED = "claimed"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_CLAIMED, "Claimed"),
+        (STATUS_DONE, "Printed"),
+        (STATUS_FAILED, "Failed"),
+    ]
+    FORMAT_CHOICES = [("escpos", "ESC/POS"), ("text", "Plain text")]
+
+    printer = models.CharField(max_length=64, default="counter")
+    format = models.CharField(max_length=8, choices=FORMAT_CHOICES, default="escpos")
+    payload = models.BinaryField()
+    order = models.ForeignKey(
+        "orders.Order", on_delete=models.SET_NULL, null=True, blank=True, related_name="print_jobs",
+    )
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    printed_at = models.DateTimeField(null=True, blank=True)
+    class Meta:
+        verbose_name = "Print Job"
+        verbose_name_plural = "Print Jobs"
+        indexes = [models.Index(fields=["printer", "status", "id"], name="printjob_queue_idx")]
+    def __str__(self):
+        return f"PrintJob {self.pk} -> {self.printer} ({self.status})"
@@ -1,8 +1,16 @@
-import os
-import qrcode
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from functools import lru_cache
 from io import BytesIO
+
+import qrcode
 from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db import connection, connections, transaction
+from django.db.models import F, Q
 from django.utils import timezone
 from reportlab.lib.pagesizes import A5
 from reportlab.lib.units import inch
@@ -10,62 +18,127 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-from .models import PaymentReceipt
+from core.money import ZERO, Money
+from .models import InvoiceSequence, PaymentReceipt, PrintJob
 
-class ReceiptService:
-    @staticmethod
-    def generate_receipt_pdf(order, user):
-        """Generate PDF receipt for an order"""
-        
-        # Create filename
-        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"receipt_{order.invoice_no or order.id}_{timestamp}.pdf"
-        filepath = os.path.join(settings.MEDIA_ROOT, 'receipts', filename)
-        
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        
-        # Create PDF document
-        doc = SimpleDocTemplate(filepath, pagesize=A5, topMargin=0.5*inch, bottomMargin=0.5*inch)
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle(
+logger = logging.getLogger(__name__)
+
+CURRENCY_SYMBOL = "₹"
+
+
+@lru_cache(maxsize=1)
+def _receipt_styles():
+    """Paragraph styles, built once per process (getSampleStyleSheet is not cheap)."""
+    styles = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle(
             'CustomTitle',
             parent=styles['Heading1'],
             fontSize=16,
             alignment=TA_CENTER,
             spaceAfter=12
-        )
-        
-        header_style = ParagraphStyle(
+        ),
+        "header": ParagraphStyle(
             'Header',
             parent=styles['Normal'],
             fontSize=10,
             alignment=TA_CENTER,
             spaceAfter=6
-        )
-        
+        ),
+        "footer": ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=8,
+            alignment=TA_CENTER
+        ),
+    }
+
+
+def _money(value):
+    return f"{CURRENCY_SYMBOL}{value}"
+
+
+class ReceiptService:
+    @staticmethod
+    def receipt_data(order):
+        """
+        Plain-data snapshot of a receipt (no ORM objects), so rendering can run
+        anywhere. Uses the order's prefetched items__menu_item and
+        billing_payments when the caller loaded them (bulk reprints).
+        """
+        prefetched = getattr(order, "_prefetched_objects_cache", {})
+        lines = list(order.items.all() if "items" in prefetched else order.items.select_related("menu_item"))
+        items = []
+        for item in lines:
+            modifiers = [m.get("name", "") for m in (item.modifiers or []) if isinstance(m, dict)]
+            items.append({
+                "name": getattr(item.menu_item, "name", "Item") + (' + ' + ', '.join(modifiers) if modifiers else ''),
+                "quantity": int(item.quantity),
+                "price": str(item.unit_price),
+                "total": str(item.line_total()),
+            })
+
+        # Subtotal and total from the same lines (no second items query)
+        subtotal = Money(sum(item.line_money().cents for item in lines))
+        total = order._total_money(subtotal)
+        payments = [
+            {"label": payment.reference or payment.currency.upper(), "amount": str(payment.amount)}
+            for payment in order.billing_payments.all()
+        ]
+        return {
+            "org_name": getattr(settings, "SITE_NAME", "RMS Store"),
+            "org_address": "",
+            "org_phone": "",
+            "invoice_no": f'ORD-{order.id}',
+            "reference": str(order.id),
+            "order_id": order.id,
+            "date": order.created_at.strftime('%Y-%m-%d %H:%M'),
+            "created_date": order.created_at.strftime('%Y-%m-%d'),
+            "table": str(order.table_number) if order.table_number else 'N/A',
+            "customer": 'Walk-in',
+            "items": items,
+            "subtotal": str(subtotal),
+            "discount_amount": str(order.discount_amount or 0),
+            "discount_label": ReceiptService._discount_label(order),
+            "tax_amount": "0",
+            "tax_percent": "0",
+            "tip_amount": str(order.tip_amount or 0),
+            "total": str(total),
+            "amount_paid": str(total if order.is_paid else ZERO),
+            "balance_due": "0",
+            "payments": payments,
+        }
+
+    @staticmethod
+    def _discount_label(order):
+        return f"Discount ({order.discount_code}):" if order.discount_code else "Discount:"
+
+    @staticmethod
+    def render_receipt_pdf(data):
+        """Render receipt bytes entirely in memory (QR and PDF both via BytesIO)."""
+        styles = _receipt_styles()
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A5, topMargin=0.5*inch, bottomMargin=0.5*inch)
+        story = []
+
         # Organization header
-        org = order.location.organization
-        story.append(Paragraph(org.name, title_style))
-        if org.address:
-            story.append(Paragraph(org.address, header_style))
-        if org.phone:
-            story.append(Paragraph(f"Phone: {org.phone}", header_style))
-        
+        story.append(Paragraph(data["org_name"], styles["title"]))
+        if data["org_address"]:
+            story.append(Paragraph(data["org_address"], styles["header"]))
+        if data["org_phone"]:
+            story.append(Paragraph(f"Phone: {data['org_phone']}", styles["header"]))
+
         story.append(Spacer(1, 12))
-        
+
         # Receipt details
         receipt_data = [
             ['Receipt', ''],
-            ['Invoice No:', order.invoice_no or f'ORD-{order.id}'],
-            ['Date:', order.closed_at.strftime('%Y-%m-%d %H:%M') if order.closed_at else order.created_at.strftime('%Y-%m-%d %H:%M')],
-            ['Table:', order.table_number or 'N/A'],
-            ['Customer:', order.customer_name or 'Walk-in'],
+            ['Invoice No:', data["invoice_no"]],
+            ['Date:', data["date"]],
+            ['Table:', data["table"]],
+            ['Customer:', data["customer"]],
         ]
-        
+
         receipt_table = Table(receipt_data, colWidths=[2*inch, 2*inch])
         receipt_table.setStyle(TableStyle([
             ('FONTSIZE', (0, 0), (-1, -1), 9),
@@ -74,26 +147,15 @@ class ReceiptService:
             ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
             ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
         ]))
-        
+
         story.append(receipt_table)
         story.append(Spacer(1, 12))
-        
+
         # Order items
         item_data = [['Item', 'Qty', 'Price', 'Total']]
-        
-        for item in order.items.all():
-            modifiers_text = ''
-            if item.modifiers:
-                modifiers_text = ' + ' + ', '.join([mod['name'] for mod in item.modifiers])
-            
-            item_name = item.menu_item_name + modifiers_text
-            item_data.append([
-                item_name,
-                str(item.quantity),
-                f"₹{item.menu_item_price}",
-                f"₹{item.item_total}"
-            ])
-        
+        for item in data["items"]:
+            item_data.append([item["name"], str(item["quantity"]), _money(item["price"]), _money(item["total"])])
+
         items_table = Table(item_data, colWidths=[2.5*inch, 0.5*inch, 0.7*inch, 0.7*inch])
         items_table.setStyle(TableStyle([
             ('FONTSIZE', (0, 0), (-1, -1), 8),
@@ -103,33 +165,27 @@ class ReceiptService:
             ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
         ]))
-        
+
         story.append(items_table)
         story.append(Spacer(1, 12))
-        
+
         # Totals
         totals_data = [
-            ['Subtotal:', f"₹{order.subtotal}"],
+            ['Subtotal:', _money(data["subtotal"])],
         ]
-        
-        if order.discount_amount > 0:
-            discount_text = f"Discount ({order.discount_type}):"
-            if order.discount_type == 'PERCENT':
-                discount_text = f"Discount ({order.discount_value}%):"
-            totals_data.append([discount_text, f"-₹{order.discount_amount}"])
-        
-        if order.tax_amount > 0:
-            totals_data.append([f"Tax ({order.tax_percent}%):", f"₹{order.tax_amount}"])
-        
-        if order.tip_amount > 0:
-            totals_data.append(['Tip:', f"₹{order.tip_amount}"])
-        
-        totals_data.append(['Total:', f"₹{order.total}"])
-        totals_data.append(['Paid:', f"₹{order.amount_paid}"])
-        
-        if order.balance_due > 0:
-            totals_data.append(['Balance:', f"₹{order.balance_due}"])
-        
+        if Decimal(data["discount_amount"]) > 0:
+            totals_data.append([data["discount_label"], f"-{_money(data['discount_amount'])}"])
+        if Decimal(data["tax_amount"]) > 0:
+            totals_data.append([f"Tax ({data['tax_percent']}%):", _money(data["tax_amount"])])
+        if Decimal(data["tip_amount"]) > 0:
+            totals_data.append(['Tip:', _money(data["tip_amount"])])
+
+        totals_data.append(['Total:', _money(data["total"])])
+        totals_data.append(['Paid:', _money(data["amount_paid"])])
+
+        if Decimal(data["balance_due"]) > 0:
+            totals_data.append(['Balance:', _money(data["balance_due"])])
+
         totals_table = Table(totals_data, colWidths=[3*inch, 1*inch])
         totals_table.setStyle(TableStyle([
             ('FONTSIZE', (0, 0), (-1, -1), 9),
@@ -138,16 +194,16 @@ class ReceiptService:
             ('LINEABOVE', (0, -3), (-1, -3), 1, colors.black),
             ('LINEABOVE', (0, -1), (-1, -1), 2, colors.black),
         ]))
-        
+
         story.append(totals_table)
         story.append(Spacer(1, 12))
-        
+
         # Payment details
-        if order.payments.exists():
+        if data["payments"]:
             payment_data = [['Payment Method', 'Amount']]
-            for payment in order.payments.all():
-                payment_data.append([payment.get_method_display(), f"₹{payment.amount}"])
-            
+            for payment in data["payments"]:
+                payment_data.append([payment["label"], _money(payment["amount"])])
+
             payment_table = Table(payment_data, colWidths=[2*inch, 2*inch])
             payment_table.setStyle(TableStyle([
                 ('FONTSIZE', (0, 0), (-1, -1), 8),
@@ -155,74 +211,230 @@ class ReceiptService:
                 ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
                 ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
             ]))
-            
+
             story.append(payment_table)
             story.append(Spacer(1, 12))
-        
-        # QR Code
-        qr_data = f"Order: {order.invoice_no or order.id}\nTotal: ₹{order.total}\nDate: {order.created_at.strftime('%Y-%m-%d')}"
+
+        # QR Code (kept in memory; no shared temp file)
+        qr_data = f"Order: {data['reference']}\nTotal: {_money(data['total'])}\nDate: {data['created_date']}"
         qr = qrcode.QRCode(version=1, box_size=3, border=1)
         qr.add_data(qr_data)
         qr.make(fit=True)
-        
-        qr_img = qr.make_image(fill_color="black", back_color="white")
+
         qr_buffer = BytesIO()
-        qr_img.save(qr_buffer, format='PNG')
+        qr.make_image(fill_color="black", back_color="white").save(qr_buffer, format='PNG')
         qr_buffer.seek(0)
-        
-        # Save QR temporarily
-        qr_temp_path = os.path.join(settings.MEDIA_ROOT, 'temp_qr.png')
-        with open(qr_temp_path, 'wb') as f:
-            f.write(qr_buffer.getvalue())
-        
-        qr_image = Image(qr_temp_path, width=1*inch, height=1*inch)
-        
+        qr_image = Image(qr_buffer, width=1*inch, height=1*inch)
+
         # Center the QR code
         qr_table = Table([[qr_image]], colWidths=[4.4*inch])
         qr_table.setStyle(TableStyle([
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
         ]))
-        
+
         story.append(qr_table)
         story.append(Spacer(1, 12))
-        
+
         # Footer
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=8,
-            alignment=TA_CENTER
-        )
-        
-        story.append(Paragraph("Thank you for your business!", footer_style))
-        story.append(Paragraph("Please visit again!", footer_style))
-        
-        # Build PDF
+        story.append(Paragraph("Thank you for your business!", styles["footer"]))
+        story.append(Paragraph("Please visit again!", styles["footer"]))
+
         doc.build(story)
-        
-        # Clean up temp QR file
-        if os.path.exists(qr_temp_path):
-            os.remove(qr_temp_path)
-        
-        # Create receipt record
-        with open(filepath, 'rb') as f:
-            receipt = PaymentReceipt.objects.create(
-                order=order,
-                file_name=filename,
-                generated_by=user
-            )
-            receipt.receipt_file.save(filename, ContentFile(f.read()), save=True)
-        
-        # Clean up temp PDF file
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        
+        return buffer.getvalue()
+
+    @staticmethod
+    def generate_receipt_pdf(order, user):
+        """
+        Generate the PDF receipt for an order and attach it to the receipt of
+        its latest billing payment. Returns None if the order has no billing
+        payment yet (nothing to issue a receipt for).
+        """
+        payment = ReceiptService._latest_payment(order)
+        if payment is None:
+            logger.info("No billing payment for order %s; receipt not generated", order.pk)
+            return None
+        data = ReceiptService.receipt_data(order)
+        pdf_bytes = ReceiptService.render_receipt_pdf(data)
+
+        return ReceiptService._store_receipt(payment, data, pdf_bytes)
+
+    @staticmethod
+    def _latest_payment(order):
+        return max(order.billing_payments.all(), key=lambda p: p.pk, default=None)
+
+    @staticmethod
+    def _store_receipt(payment, data, pdf_bytes):
+        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"receipt_{data['invoice_no']}_{timestamp}.pdf"
+
+        receipt = PaymentReceipt.objects.filter(payment=payment).order_by('-issued_at').first()
+        if receipt is None:
+            receipt = PaymentReceipt.objects.create(payment=payment, receipt_no=next_receipt_no("INV"))
+        # Buffer goes straight to storage; nothing touches MEDIA_ROOT directly
+        receipt.receipt_file.save(filename, ContentFile(pdf_bytes), save=True)
         return receipt
 
+    @staticmethod
+    def generate_receipt_pdfs(orders, workers=None):
+        """Bulk reprint: render on the process-pool render farm, then store. Returns the receipts."""
+        from payments.render_farm import render_many
+
+        snapshots = []
+        for order in orders:
+            payment = ReceiptService._latest_payment(order)
+            if payment is not None:
+                snapshots.append((payment, ReceiptService.receipt_data(order)))
+        pdfs = render_many([("receipt", data) for _, data in snapshots], workers=workers)
+        return [
+            ReceiptService._store_receipt(payment, data, pdf_bytes)
+            for (payment, data), pdf_bytes in zip(snapshots, pdfs)
+            if pdf_bytes
+        ]
+
 class PaymentService:
     @staticmethod
     def process_refund(payment, refund_amount, user, reason=''):
         """Process a refund for a payment"""
         # This is a placeholder for refund logic
         # In a real system, you'd integrate with payment gateways
-        pass
\ No newline at end of file
+        pass
+
+
+class InvoiceNumberAllocator:
+    """
+    Per-process receipt/invoice numbers.
+
+    block_size=1: every number is an atomic DB increment inside the
+    caller's transaction, so a rollback gives it back (gapless). The
+    sequence row stays locked until that transaction ends.
+
+    block_size=N: the process reserves N numbers per round trip and hands
+    them out under a local lock; numbers left in a block when the process
+    exits are skipped. A block is always reserved in a transaction of its
+    own, committed at once: on the default connection when no transaction
+    is open, else on a short-lived connection of its own. So the caller's transaction
+    never holds the sequence lock, and rolling it back cannot hand a
+    reserved range out twice (its numbers just become gaps). SQLite has
+    no second writer to hand the reservation to, so inside a transaction
+    there it falls back to one number at a time.
+    """
+    def __init__(self, prefix="INV", block_size=1):
+        self.prefix = prefix
+        self.block_size = max(1, int(block_size))
+        self._lock = threading.Lock()
+        self._format = InvoiceSequence(prefix=prefix).format_number
+        self._block = iter(())
+
+    def _reserve_here(self, size):
+        """Reserve on this thread's connection (joins the caller's transaction, if any)."""
+        return InvoiceSequence.reserve(self.prefix, size)
+
+    def _reserve_private(self, size):
+        """
+        Reserve and commit outside the caller's transaction. Connections are
+        per thread, so a short-lived worker thread opens its own, commits the
+        block and closes the connection again.
+        """
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="invoice-block") as pool:
+            return pool.submit(_reserve_committed, self.prefix, size).result()
+
+    def next_number(self):
+        with self._lock:
+            number = next(self._block, None)
+            if number is None:
+                in_transaction = connection.in_atomic_block
+                if self.block_size == 1 or (in_transaction and connection.vendor == "sqlite"):
+                    return self._format(self._reserve_here(1)[0])
+                block = self._reserve_private(self.block_size) if in_transaction else self._reserve_here(self.block_size)
+                self._block = iter(block)
+                number = next(self._block)
+            return self._format(number)
+
+
+def _reserve_committed(prefix, size):
+    try:
+        return InvoiceSequence.reserve(prefix, size)
+    finally:
+        connections.close_all()
+
+
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+
+def next_receipt_no(prefix="INV"):
+    """Next number for `prefix`, block size from settings.INVOICE_NUMBER_BLOCK_SIZE (default 1)."""
+    with _allocators_lock:
+        allocator = _allocators.get(prefix)
+        if allocator is None:
+            allocator = InvoiceNumberAllocator(prefix, getattr(settings, "INVOICE_NUMBER_BLOCK_SIZE", 1))
+            _allocators[prefix] = allocator
+    return allocator.next_number()
+
+
+# ---------- Thermal print queue ----------
+PRINT_CLAIM_TIMEOUT = timedelta(minutes=2)
+
+
+def enqueue_receipt_print(order, printer=None, fmt="escpos"):
+    """Render the counter receipt as ESC/POS (or plain text) and queue it for the print agent."""
+    from .escpos import render_receipt_escpos, render_receipt_text
+
+    data = ReceiptService.receipt_data(order)
+    payload = render_receipt_escpos(data) if fmt == "escpos" else render_receipt_text(data).encode("utf-8")
+    return PrintJob.objects.create(
+        printer=printer or getattr(settings, "RECEIPT_PRINTER", "counter") or "counter",
+        format=fmt,
+        payload=payload,
+        order=order,
+    )
+
+
+def _print_max_attempts():
+    return max(1, int(getattr(settings, "PRINT_MAX_ATTEMPTS", 5)))
+
+
+def claim_print_job(printer):
+    """
+    Hand the oldest pending job for `printer` to exactly one agent (conditional
+    UPDATE). Jobs claimed but never acked within PRINT_CLAIM_TIMEOUT are retried
+    until they have been handed out PRINT_MAX_ATTEMPTS times, then marked failed.
+    """
+    now = timezone.now()
+    max_attempts = _print_max_attempts()
+    stale = Q(status=PrintJob.STATUS_CLAIMED, claimed_at__lt=now - PRINT_CLAIM_TIMEOUT)
+    PrintJob.objects.filter(stale, printer=printer, attempts__gte=max_attempts).update(
+        status=PrintJob.STATUS_FAILED, last_error="Never acknowledged by the print agent",
+    )
+    ready = Q(status=PrintJob.STATUS_PENDING) | (stale & Q(attempts__lt=max_attempts))
+    for job_id in PrintJob.objects.filter(ready, printer=printer).order_by("id").values_list("id", flat=True)[:5]:
+        claimed = PrintJob.objects.filter(ready, pk=job_id).update(
+            status=PrintJob.STATUS_CLAIMED, claimed_at=now, attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return PrintJob.objects.get(pk=job_id)
+    return None
+
+
+def complete_print_job(job_id, ok=True, error=""):
+    """
+    Agent ack. A failed job goes back to pending for the next poll until it
+    has been tried PRINT_MAX_ATTEMPTS times, then stays failed. Returns the
+    job's new status, or None when it was not claimed.
+    """
+    if ok:
+        status = PrintJob.STATUS_DONE
+        updates = {"printed_at": timezone.now(), "last_error": ""}
+        claimed = PrintJob.objects.filter(pk=job_id, status=PrintJob.STATUS_CLAIMED)
+    else:
+        attempts = (
+            PrintJob.objects.filter(pk=job_id, status=PrintJob.STATUS_CLAIMED)
+            .values_list("attempts", flat=True).first()
+        )
+        if attempts is None:
+            return None
+        status = PrintJob.STATUS_FAILED if attempts >= _print_max_attempts() else PrintJob.STATUS_PENDING
+        updates = {"claimed_at": None, "last_error": error[:2000]}
+        # Still the claim we read: a re-claim in between bumped attempts
+        claimed = PrintJob.objects.filter(pk=job_id, status=PrintJob.STATUS_CLAIMED, attempts=attempts)
+    return status if claimed.update(status=status, **updates) else None
@@ -1,3 +1,148 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core.testing import THREADS, retry_locked, run_threads
+
+from .models import InvoiceSequence, PrintJob
+from .services import InvoiceNumberAllocator, claim_print_job, complete_print_job
+
+PER_THREAD = 25
+
+
+class InvoiceSequenceConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        self.seq = InvoiceSequence.objects.create(prefix="TST")
+
+    def test_concurrent_next_invoice_no_has_no_duplicates_or_gaps(self):
+        def take():
+            seq = retry_locked(lambda: InvoiceSequence.objects.get(pk=self.seq.pk))
+            return [retry_locked(seq.next_invoice_no) for _ in range(PER_THREAD)]
+
+        numbers, errors = run_threads(take)
+
+        self.assertEqual(errors, [])
+        total = THREADS * PER_THREAD
+        self.assertEqual(len(set(numbers)), total)
+        self.assertEqual(sorted(numbers), [self.seq.format_number(n) for n in range(1, total + 1)])
+        self.seq.refresh_from_db()
+        self.assertEqual(self.seq.last_number, total)
+
+    def test_block_allocation_gaps_only_inside_reserved_blocks(self):
+        block = 10
+        per_thread = 13  # deliberately not a multiple of the block size
+
+        def take():
+            allocator = InvoiceNumberAllocator("TST", block_size=block)
+            out = []
+            for _ in range(per_thread):
+                out.append(retry_locked(allocator.next_number))
+            return out
+
+        numbers, errors = run_threads(take)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(set(numbers)), THREADS * per_thread)
+        self.seq.refresh_from_db()
+        # every worker reserved ceil(13/10) = 2 blocks; nothing beyond that
+        self.assertEqual(self.seq.last_number, THREADS * 2 * block)
+        issued = {int(n.split("-")[1]) for n in numbers}
+        self.assertTrue(issued <= set(range(1, self.seq.last_number + 1)))
+        # each reserved block is used from its start: unused numbers are block tails
+        for first in range(1, self.seq.last_number + 1, block):
+            used = sorted(n for n in issued if first <= n < first + block)
+            self.assertEqual(used, list(range(first, first + len(used))))
+
+    def test_shared_allocator_is_thread_safe(self):
+        allocator = InvoiceNumberAllocator("TST", block_size=7)
+
+        numbers, errors = run_threads(
+            lambda: [retry_locked(allocator.next_number) for _ in range(PER_THREAD)]
+        )
+
+        self.assertEqual(errors, [])
+        total = THREADS * PER_THREAD
+        self.assertEqual(sorted(numbers), [self.seq.format_number(n) for n in range(1, total + 1)])
+
+
+class _Rollback(Exception):
+    pass
+
+
+class InvoiceBlockRollbackTests(TransactionTestCase):
+    def test_rolled_back_caller_never_reissues_a_reserved_block(self):
+        from unittest import mock
+        from django.db import connection, transaction
+
+        first = InvoiceNumberAllocator("TST", block_size=5)
+        # Take the separate-connection path as on a server database
+        with mock.patch.object(connection, "vendor", "postgresql"):
+            try:
+                with transaction.atomic():
+                    taken = first.next_number()
+                    raise _Rollback
+            except _Rollback:
+                pass
+        # The block was committed on its own: nobody else gets those numbers
+        self.assertEqual(InvoiceSequence.objects.get(prefix="TST").last_number, 5)
+        other = InvoiceNumberAllocator("TST", block_size=5).next_number()
+        self.assertEqual((taken, other), ("TST-000001", "TST-000006"))
+        self.assertEqual(first.next_number(), "TST-000002")
+
+    def test_sqlite_in_transaction_takes_single_numbers(self):
+        from django.db import transaction
+
+        first = InvoiceNumberAllocator("TST", block_size=5)
+        try:
+            with transaction.atomic():
+                self.assertEqual(first.next_number(), "TST-000001")
+                raise _Rollback
+        except _Rollback:
+            pass
+        # Rolled back with the caller and nothing cached: the number is reused, not duplicated
+        self.assertFalse(InvoiceSequence.objects.filter(prefix="TST").exists())
+        self.assertEqual(InvoiceNumberAllocator("TST", block_size=5).next_number(), "TST-000001")
+        self.assertEqual(first.next_number(), "TST-000006")
+
+
+@override_settings(PRINT_AGENT_TOKEN="agent-secret", PRINT_MAX_ATTEMPTS=2)
+class PrintQueueTests(TestCase):
+    def setUp(self):
+        self.job = PrintJob.objects.create(printer="counter", payload=b"receipt")
+
+    def _ack(self, status, **headers):
+        return self.client.post(f"/api/print/jobs/{self.job.pk}/ack/", {"status": status}, **headers)
+
+    def test_ack_needs_the_agent_token(self):
+        claim_print_job("counter")
+        staff = get_user_model().objects.create_user(username="staff", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self._ack("done").status_code, 403)
+        response = self._ack("done", HTTP_X_PRINT_AGENT_TOKEN="agent-secret")
+        self.assertEqual(response.json()["status"], PrintJob.STATUS_DONE)
+
+    def test_failed_job_stops_after_max_attempts(self):
+        self.assertIsNotNone(claim_print_job("counter"))
+        self.assertEqual(complete_print_job(self.job.pk, ok=False, error="jam"), PrintJob.STATUS_PENDING)
+        self.assertIsNotNone(claim_print_job("counter"))
+        self.assertEqual(complete_print_job(self.job.pk, ok=False, error="jam"), PrintJob.STATUS_FAILED)
+        self.assertIsNone(claim_print_job("counter"))
+
+    def test_unacked_job_stops_after_max_attempts(self):
+        for _ in range(2):
+            self.assertIsNotNone(claim_print_job("counter"))
+            PrintJob.objects.filter(pk=self.job.pk).update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertIsNone(claim_print_job("counter"))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, PrintJob.STATUS_FAILED)
+
+    def test_wsgi_poll_returns_at_once(self):
+        PrintJob.objects.all().delete()
+        start = time.monotonic()
+        response = self.client.get("/api/print/jobs/next/?wait=25", HTTP_X_PRINT_AGENT_TOKEN="agent-secret")
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(response.status_code, 204)
+        self.assertIn("Retry-After", response)
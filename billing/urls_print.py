@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views_print
+
+app_name = "print"
+
+urlpatterns = [
+    path("jobs/next/", views_print.next_print_job, name="next_print_job"),
+    path("jobs/<int:job_id>/ack/", views_print.ack_print_job, name="ack_print_job"),
+]
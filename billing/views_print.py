@@ -0,0 +1,95 @@
+# billing/views_print.py
+"""
+Long-poll endpoint for the local print agent.
+
+    GET  /api/print/jobs/next/?printer=counter&wait=25
+         -> 200 raw bytes (X-Print-Job-Id, X-Print-Format) or 204 when nothing arrived
+    POST /api/print/jobs/<id>/ack/   status=done|failed [error=...]
+
+Auth: X-Print-Agent-Token == settings.PRINT_AGENT_TOKEN. Fetching also
+accepts a staff session; the ack is CSRF-exempt and so takes the token only.
+
+Only an ASGI server holds the poll open. Under WSGI a waiting request would
+pin a sync worker, so the view answers at once: 204 with Retry-After.
+"""
+import asyncio
+import hmac
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .services import claim_print_job, complete_print_job
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.5
+MAX_WAIT = 30
+# Seconds a WSGI-served agent is told to wait before polling again
+RETRY_AFTER = 2
+
+
+def _token_ok(request):
+    token = (getattr(settings, "PRINT_AGENT_TOKEN", "") or "").strip()
+    sent = request.headers.get("X-Print-Agent-Token", "")
+    return bool(token and sent and hmac.compare_digest(token, sent))
+
+
+def _agent_allowed(request):
+    if _token_ok(request):
+        return True
+    user = getattr(request, "user", None)
+    return bool(user and user.is_staff)
+
+
+def _job_response(job):
+    response = HttpResponse(bytes(job.payload), content_type="application/octet-stream")
+    response["X-Print-Job-Id"] = str(job.pk)
+    response["X-Print-Format"] = job.format
+    return response
+
+
+@require_GET
+async def next_print_job(request):
+    if not await sync_to_async(_agent_allowed, thread_sensitive=True)(request):
+        return HttpResponse(status=403)
+
+    printer = request.GET.get("printer") or getattr(settings, "RECEIPT_PRINTER", "counter") or "counter"
+    try:
+        wait = max(0.0, min(float(request.GET.get("wait", 25)), MAX_WAIT))
+    except ValueError:
+        wait = 25.0
+    if not isinstance(request, ASGIRequest):
+        wait = 0.0
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        job = await sync_to_async(claim_print_job, thread_sensitive=True)(printer)
+        if job is not None:
+            return _job_response(job)
+        if loop.time() >= deadline:
+            response = HttpResponse(status=204)
+            if not wait:
+                response["Retry-After"] = str(RETRY_AFTER)
+            return response
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+@csrf_exempt
+@require_POST
+def ack_print_job(request, job_id: int):
+    if not _token_ok(request):
+        return HttpResponse(status=403)
+    status = request.POST.get("status", "done")
+    if status not in ("done", "failed"):
+        return JsonResponse({"detail": "status must be done or failed"}, status=400)
+    new_status = complete_print_job(job_id, ok=(status == "done"), error=request.POST.get("error", ""))
+    if new_status is None:
+        return JsonResponse({"detail": "job is not claimed"}, status=409)
+    # "pending" when a failed job will be retried
+    return JsonResponse({"id": job_id, "status": new_status})
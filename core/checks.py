@@ -0,0 +1,26 @@
+# core/checks.py
+from django.conf import settings
+from django.core import checks
+
+# Backends whose entries never leave the process
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@checks.register(checks.Tags.caches)
+def shared_cache_check(app_configs, **kwargs):
+    """Version-token invalidation needs one cache for every process (settings.SHARED_CACHE_REQUIRED)."""
+    # Not settings.DEBUG: the test runner turns that off before running checks
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if not getattr(settings, "SHARED_CACHE_REQUIRED", False) or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        checks.Error(
+            "The default cache is local to each process, so availability, coupon, promotion "
+            "and loyalty invalidations do not reach other web or Celery workers.",
+            hint="Set CACHE_REDIS_URL, or SHARED_CACHE_REQUIRED=0 for a single-process deployment.",
+            id="core.E001",
+        )
+    ]
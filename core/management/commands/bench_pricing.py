@@ -0,0 +1,111 @@
+import random
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.management.base import BaseCommand
+
+from coupons.services import compute_discount_for_order
+from orders.models import Order, OrderItem
+from payments.services import compute_order_total_money
+
+
+class _Coupon:
+    def __init__(self, percent):
+        self.percent = percent
+
+    def is_valid_now(self):
+        return True
+
+
+# ---- Decimal pricing as it was before core.money, kept for comparison ----
+def _legacy_line_total(item):
+    return (Decimal(str(item.unit_price)) * int(item.quantity)).quantize(Decimal("0.01"))
+
+
+def _legacy_grand_total(order):
+    sub = Decimal("0.00")
+    for it in order.items.all():
+        sub += Decimal(str(it.unit_price)) * int(it.quantity)
+    sub = sub.quantize(Decimal("0.01"))
+    total = sub + Decimal(str(order.tip_amount or 0)) - Decimal(str(order.discount_amount or 0))
+    if total < 0:
+        total = Decimal("0.00")
+    return total.quantize(Decimal("0.01"))
+
+
+def _legacy_total_cents(order):
+    amount = Decimal(str(_legacy_grand_total(order))).quantize(Decimal("0.01"))
+    return int(amount.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) * 100)
+
+
+def _legacy_discount(order, coupon):
+    if not coupon or not coupon.is_valid_now():
+        return Decimal("0.00")
+    pct = Decimal(str(coupon.percent)) / Decimal("100")
+    discount = (order.subtotal * pct).quantize(Decimal("0.01"))
+    return discount if discount > 0 else Decimal("0.00")
+
+
+def _current_line_total(item):
+    return item.line_total()
+
+
+def _current_discount(order, coupon):
+    return compute_discount_for_order(order, coupon, None)[1]
+
+
+def _sample_orders(count: int, items: int, seed: int):
+    """Unsaved orders with their items pre-attached (no DB)."""
+    rng = random.Random(seed)
+    orders = []
+    for n in range(count):
+        order = Order(pk=n + 1, tip_amount=Decimal(rng.randint(0, 500)) / 100, discount_amount=Decimal("1.25"))
+        lines = [
+            OrderItem(order=order, quantity=rng.randint(1, 4), unit_price=Decimal(rng.randint(99, 4999)) / 100)
+            for _ in range(items)
+        ]
+        order._prefetched_objects_cache = {"items": lines}
+        order.subtotal = sum((_legacy_line_total(it) for it in lines), Decimal("0.00"))
+        orders.append(order)
+    return orders
+
+
+class Command(BaseCommand):
+    help = "Benchmark the pricing functions (line/grand totals, coupon discount, Stripe cents): Decimal vs Money. No DB."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=20000)
+        parser.add_argument("--items", type=int, default=6, help="line items per order")
+        parser.add_argument("--percent", default="12.5", help="coupon percent")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def _time(self, label, fn, orders):
+        start = time.perf_counter()
+        results = [fn(o) for o in orders]
+        wall = time.perf_counter() - start
+        return label, wall, results
+
+    def handle(self, *args, **opts):
+        orders = _sample_orders(opts["orders"], opts["items"], opts["seed"])
+        coupon = _Coupon(Decimal(opts["percent"]))
+        count = len(orders)
+
+        cases = [
+            ("line_total", lambda o: [_legacy_line_total(it) for it in o.items.all()],
+                           lambda o: [_current_line_total(it) for it in o.items.all()]),
+            ("grand_total", _legacy_grand_total, lambda o: o.grand_total()),
+            ("coupon_discount", lambda o: _legacy_discount(o, coupon), lambda o: _current_discount(o, coupon)),
+            ("stripe_cents", _legacy_total_cents, lambda o: compute_order_total_money(o).cents),
+        ]
+
+        self.stdout.write(f"{count} orders x {opts['items']} items, coupon {opts['percent']}%")
+        self.stdout.write(f"{'function':<16} {'decimal us/order':>17} {'money us/order':>15} {'speedup':>8} {'diffs':>6}")
+        for name, legacy, current in cases:
+            _, before, old = self._time(name, legacy, orders)
+            _, after, new = self._time(name, current, orders)
+            # Differences are half-even (old quantize default) vs half-up rounding
+            diffs = sum(1 for a, b in zip(old, new) if a != b)
+            self.stdout.write(
+                f"{name:<16} {before / count * 1e6:17.2f} {after / count * 1e6:15.2f} "
+                f"{before / after if after else 0:7.2f}x {diffs:6d}"
+            )
@@ -24,3 +24,14 @@ class Location(models.Model):
 
     def __str__(self):
         return f"{self.organization.name} - {self.name}"
+
+    @property
+    def tzinfo(self):
+        """The location's zone; the project default if the name is unknown."""
+        from zoneinfo import ZoneInfo
+        from django.utils import timezone
+
+        try:
+            return ZoneInfo(self.timezone)
+        except Exception:
+            return timezone.get_default_timezone()
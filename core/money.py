@@ -0,0 +1,225 @@
+# core/money.py
+"""
+Money as integer minor units (cents).
+
+All pricing goes through Money so every path rounds the same way:
+amounts are rounded once, to the cent, ROUND_HALF_UP (away from zero on
+.5), when they enter as Decimal/str/float or when a percentage is taken.
+Sums and integer quantities are exact.
+
+There are two ways in, and they never guess the unit:
+
+    Money(1999)                  -> 19.99   integer cents only (else TypeError)
+    Money.of("12.345")           -> Money(1235)   major units (dollars), any type
+    Money.of(5)                  -> Money(500)    an int given to of() is dollars
+
+    Money.of("19.99") * 3        -> Money(5997)
+    Money(1000).percent("12.5")  -> Money(125)
+    Money(1999).to_decimal()     -> Decimal("19.99")
+
+Money compares only with Money and with zero (which needs no unit);
+Money(500) < 6 raises TypeError instead of picking cents or dollars.
+
+MoneyField stores the cents in a BIGINT column and yields Money.
+"""
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Iterable, Union
+
+from django.db import models
+
+Amount = Union["Money", Decimal, int, float, str, None]
+
+
+def _div_half_up(n: int, d: int) -> int:
+    """n / d (d > 0) rounded to the nearest integer, halves away from zero."""
+    q, r = divmod(abs(n), d)
+    if 2 * r >= d:
+        q += 1
+    return q if n >= 0 else -q
+
+
+def to_cents(value: Amount) -> int:
+    """Integer cents for a major-unit amount (an int is whole dollars), rounded half-up; None/"" -> 0."""
+    if isinstance(value, Decimal):
+        # Exact rational; DB values (2 dp) never need the division
+        num, den = value.as_integer_ratio()
+        if 100 % den == 0:
+            return num * (100 // den)
+        return _div_half_up(num * 100, den)
+    if isinstance(value, Money):
+        return value.cents
+    if isinstance(value, int):
+        return value * 100
+    if value is None or value == "":
+        return 0
+    return to_cents(Decimal(str(value)))
+
+
+class Money:
+    __slots__ = ("cents",)
+
+    def __init__(self, cents: int = 0):
+        if cents.__class__ is not int:
+            if not isinstance(cents, int) or isinstance(cents, bool):
+                raise TypeError(f"Money() takes integer cents, got {cents!r}; use Money.of() for amounts")
+            cents = int(cents)
+        _set_cents(self, cents)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Money is immutable")
+
+    @classmethod
+    def _make(cls, cents: int) -> "Money":
+        # Skips __init__'s type check for values that are already ints
+        m = _new(cls)
+        _set_cents(m, cents)
+        return m
+
+    # ---------- construction ----------
+    @classmethod
+    def of(cls, value: Amount) -> "Money":
+        """From a major-unit amount (Decimal/str/int/float) or Money; None -> 0."""
+        if isinstance(value, Money):
+            return value
+        return cls._make(to_cents(value))
+
+    @classmethod
+    def sum(cls, values: Iterable["Money"]) -> "Money":
+        return cls._make(sum(m.cents for m in values))
+
+    # ---------- conversion ----------
+    def to_decimal(self) -> Decimal:
+        # Exact: an integer times 0.01 keeps every digit and the 2 dp exponent
+        return Decimal(self.cents) * _CENT
+
+    def __str__(self) -> str:
+        sign = "-" if self.cents < 0 else ""
+        whole, frac = divmod(abs(self.cents), 100)
+        return f"{sign}{whole}.{frac:02d}"
+
+    def __repr__(self) -> str:
+        return f"Money({self.cents})"
+
+    def __int__(self) -> int:
+        return self.cents
+
+    # ---------- arithmetic ----------
+    def __add__(self, other: "Money") -> "Money":
+        if isinstance(other, Money):
+            return Money._make(self.cents + other.cents)
+        return NotImplemented
+
+    def __radd__(self, other) -> "Money":
+        # Lets sum() start from 0
+        if other == 0 and not isinstance(other, Money):
+            return self
+        return self.__add__(other)
+
+    def __sub__(self, other: "Money") -> "Money":
+        if isinstance(other, Money):
+            return Money._make(self.cents - other.cents)
+        return NotImplemented
+
+    def __neg__(self) -> "Money":
+        return Money._make(-self.cents)
+
+    def __mul__(self, qty: int) -> "Money":
+        if isinstance(qty, int) and not isinstance(qty, bool):
+            return Money._make(self.cents * qty)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def percent(self, pct) -> "Money":
+        """`pct` percent of this amount, rounded half-up to the cent."""
+        if not isinstance(pct, (Decimal, int)):
+            pct = Decimal(str(pct))
+        num, den = pct.as_integer_ratio()
+        return Money._make(_div_half_up(self.cents * num, den * 100))
+
+    def clamp(self, low: "Money" = None, high: "Money" = None) -> "Money":
+        cents = self.cents
+        if low is not None and cents < low.cents:
+            cents = low.cents
+        if high is not None and cents > high.cents:
+            cents = high.cents
+        return self if cents == self.cents else Money._make(cents)
+
+    # ---------- comparison ----------
+    def __eq__(self, other) -> bool:
+        other = _comparable_cents(other)
+        return NotImplemented if other is None else self.cents == other
+
+    def __hash__(self) -> int:
+        return hash(self.cents)
+
+    def __lt__(self, other: "Money") -> bool:
+        other = _comparable_cents(other)
+        return NotImplemented if other is None else self.cents < other
+
+    def __le__(self, other: "Money") -> bool:
+        other = _comparable_cents(other)
+        return NotImplemented if other is None else self.cents <= other
+
+    def __gt__(self, other: "Money") -> bool:
+        other = _comparable_cents(other)
+        return NotImplemented if other is None else self.cents > other
+
+    def __ge__(self, other: "Money") -> bool:
+        other = _comparable_cents(other)
+        return NotImplemented if other is None else self.cents >= other
+
+    def __bool__(self) -> bool:
+        return self.cents != 0
+
+    def __reduce__(self):
+        return (Money, (self.cents,))
+
+
+def _comparable_cents(other):
+    """Cents of `other` if it can be compared with Money (Money or zero), else None."""
+    if isinstance(other, Money):
+        return other.cents
+    if isinstance(other, (int, Decimal, float)) and not isinstance(other, bool) and other == 0:
+        return 0
+    return None
+
+
+_new = object.__new__
+_set_cents = Money.cents.__set__
+_CENT = Decimal("0.01")
+ZERO = Money(0)
+
+
+class MoneyField(models.BigIntegerField):
+    """Amount stored as integer cents; Python side is Money."""
+    description = "Money (integer minor units)"
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else Money(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Money):
+            return value
+        if isinstance(value, int):
+            return Money(value)
+        return Money.of(value)
+
+    def run_validators(self, value):
+        # BIGINT range validators compare ints; Money only compares with Money
+        super().run_validators(value.cents if isinstance(value, Money) else value)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, Money):
+            return value.cents
+        if isinstance(value, int):
+            return value
+        return Money.of(value).cents
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return "" if value is None else str(self.get_prep_value(value))
@@ -0,0 +1,51 @@
+# core/testing.py
+"""Helpers for tests that race real DB connections (TransactionTestCase)."""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Iterable, List, Tuple
+
+from django.db import OperationalError, connections
+
+THREADS = 8
+
+
+def retry_locked(fn: Callable):
+    # SQLite has no row locks: a concurrent writer gets "database is locked"
+    # instead of waiting. Postgres blocks on the row lock and never hits this.
+    while True:
+        try:
+            return fn()
+        except OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            time.sleep(0.001)
+
+
+def run_threads(target: Callable[[], Iterable], threads: int = THREADS) -> Tuple[List, List[Exception]]:
+    """
+    Run `target` in `threads` threads released together by a barrier.
+    Returns everything the calls returned (concatenated) and the errors raised.
+    """
+    results, errors = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def worker():
+        try:
+            start.wait()
+            got = target()
+            with lock:
+                results.extend(got)
+        except Exception as e:  # surfaced by the caller's assertion
+            errors.append(e)
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return results, errors
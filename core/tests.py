@@ -0,0 +1,94 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, override_settings
+
+from .money import Money, MoneyField, to_cents
+from .versioned_cache import VersionedCache
+
+
+class MoneyTests(SimpleTestCase):
+    def test_amounts_round_half_up_to_the_cent(self):
+        self.assertEqual(to_cents("12.345"), 1235)
+        self.assertEqual(to_cents("12.344"), 1234)
+        self.assertEqual(to_cents("-0.005"), -1)
+        self.assertEqual(to_cents(1.005), 101)  # float goes through its repr, not its binary value
+        self.assertEqual(to_cents(Decimal("19.99")), 1999)
+        self.assertEqual((to_cents(None), to_cents("")), (0, 0))
+
+    def test_entry_points_never_guess_the_unit(self):
+        self.assertEqual(Money.of(5), Money(500))
+        self.assertEqual(Money.of("19.99") * 3, Money(5997))
+        for bad in (1.5, Decimal("2"), "3", True):
+            with self.assertRaises(TypeError):
+                Money(bad)
+        with self.assertRaises(TypeError):
+            Money(500) < 6
+        self.assertTrue(Money(0) == 0 and Money(1) > 0)
+
+    def test_percent_rounds_once(self):
+        self.assertEqual(Money(1000).percent("12.5"), Money(125))
+        self.assertEqual(Money(1).percent(50), Money(1))
+        self.assertEqual(Money(-1).percent(50), Money(-1))
+        self.assertEqual(Money(333).percent(Decimal("33.3333")), Money(111))
+
+    def test_decimal_and_str_are_exact(self):
+        self.assertEqual(Money(1999).to_decimal(), Decimal("19.99"))
+        self.assertEqual(str(Money(-5)), "-0.05")
+        self.assertEqual(Money.sum([Money(1), Money(2)]), Money(3))
+        self.assertEqual(sum([Money(1), Money(2)]), Money(3))
+
+
+class MoneyFieldTests(SimpleTestCase):
+    def setUp(self):
+        self.field = MoneyField()
+
+    def test_to_python_reads_ints_as_cents_and_the_rest_as_amounts(self):
+        self.assertEqual(self.field.to_python(250), Money(250))
+        self.assertEqual(self.field.to_python("2.505"), Money(251))
+        self.assertEqual(self.field.get_prep_value(Decimal("1.10")), 110)
+        self.assertIsNone(self.field.get_prep_value(None))
+
+    def test_range_validators_check_the_cents(self):
+        top = 2 ** 63 - 1
+        self.assertEqual(self.field.clean(Money(top), None), Money(top))
+        with self.assertRaises(ValidationError):
+            self.field.clean(Money(top + 1), None)
+        with self.assertRaises(ValidationError):
+            self.field.clean(Money(-top - 2), None)
+
+
+class VersionedCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.loads = []
+
+        def load(key):
+            self.loads.append(key)
+            return f"{key}#{len(self.loads)}"
+
+        self.cache = VersionedCache("tests:version", load, ttl_setting="TESTS_CACHE_TTL")
+
+    def test_value_is_kept_until_the_token_changes(self):
+        self.assertEqual(self.cache.get(1), "1#1")
+        self.assertEqual(self.cache.get(1), "1#1")
+        self.assertEqual(self.cache.get(2), "2#2")
+
+        # Another process bumped: replacing the shared token is enough
+        cache.set("tests:version", "elsewhere", None)
+        self.assertEqual(self.cache.get(1), "1#3")
+        self.assertEqual(self.loads, [1, 2, 1])
+
+    def test_bump_reloads_and_peek_does_not_load(self):
+        self.assertIsNone(self.cache.peek())
+        self.cache.get()
+        self.cache.bump()
+        self.assertIsNone(self.cache.peek())
+        self.assertEqual(self.cache.get(), "None#2")
+
+    @override_settings(TESTS_CACHE_TTL=0)
+    def test_ttl_is_a_backstop(self):
+        self.cache.get()
+        self.cache.get()
+        self.assertEqual(len(self.loads), 2)
@@ -0,0 +1,94 @@
+# core/versioned_cache.py
+"""
+Process-local values kept current by a shared version token.
+
+Each process keeps what it built (compiled promotions, the loyalty config,
+a Bloom filter, ...) together with the token that was current in the
+Django cache when it built it. A change replaces the token once it
+commits, and every process rebuilds on its next read. The TTL is a
+backstop for a lost bump; with the cache down the token reads as None and
+only the TTL applies.
+
+    _rules = VersionedCache("app:rules_version", load_rules, ttl_setting="RULES_CACHE_TTL")
+    _rules.get(location_id)
+    transaction.on_commit(_rules.bump)
+
+shared_versions()/bump_versions() expose the tokens themselves, for
+callers that fold them into keys of the shared cache instead.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Hashable, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def shared_versions(keys: Iterable[str]) -> Dict[str, Optional[str]]:
+    """The current token of each key, created if missing; all None if the cache is down."""
+    keys = list(keys)
+    try:
+        found = cache.get_many(keys)
+        for key in keys:
+            if key not in found:
+                # add(): concurrent first readers all end up with the same token
+                cache.add(key, uuid.uuid4().hex, None)
+                found[key] = cache.get(key)
+        return found
+    except Exception as e:
+        logger.info("Cache version unavailable for %s: %s", ", ".join(keys), e)
+        return {key: None for key in keys}
+
+
+def bump_versions(*keys: str) -> None:
+    """Replace the tokens (call after the change commits)."""
+    try:
+        cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+    except Exception as e:
+        logger.info("Could not bump cache version for %s: %s", ", ".join(keys), e)
+
+
+class VersionedCache:
+    """load(key) per key, reloaded when the token at version_key changes or after the TTL."""
+
+    def __init__(self, version_key: str, load: Callable, ttl_setting: str, ttl: float = 300):
+        self.version_key = version_key
+        self.load = load
+        self.ttl_setting = ttl_setting
+        self.default_ttl = ttl
+        self._entries: Dict[Hashable, tuple] = {}  # key -> (version, loaded_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable = None):
+        version = shared_versions([self.version_key])[self.version_key]
+        ttl = float(getattr(settings, self.ttl_setting, self.default_ttl))
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version and time.monotonic() - entry[1] < ttl:
+            return entry[2]
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not entry and current is not None:  # another thread just loaded it
+                return current[2]
+            value = self.load(key)
+            self._entries[key] = (version, time.monotonic(), value)
+            return value
+
+    def peek(self, key: Hashable = None):
+        """What this process holds for `key` right now, without loading; None if nothing."""
+        entry = self._entries.get(key)
+        return entry[2] if entry is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def bump(self) -> None:
+        """Reload here right away and in every other process on its next get()."""
+        self.clear()
+        bump_versions(self.version_key)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from django.contrib import admin
-from .models import Coupon
+from .models import Coupon, Promotion
 
 
 @admin.register(Coupon)
@@ -13,7 +13,7 @@ class CouponAdmin(admin.ModelAdmin):
     fieldsets = (
         (None, {"fields": ("code", "phrase", "percent", "active")}),
         ("Validity", {"fields": ("valid_from", "valid_to", "max_uses")}),
-        ("Usage", {"fields": ("times_used",)}),
+        ("Usage", {"fields": ("times_used", "counter_shards")}),
         ("Meta", {"fields": ("created_by", "created_at", "updated_at")}),
     )
 
@@ -21,3 +21,20 @@ class CouponAdmin(admin.ModelAdmin):
         if not obj.created_by_id:
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
+
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ("name", "kind", "scope", "active", "location", "sources", "start_time", "end_time", "priority")
+    list_filter = ("active", "kind", "scope", "location")
+    search_fields = ("name",)
+    raw_id_fields = ("menu_item", "category")
+    readonly_fields = ("created_at", "updated_at")
+
+    fieldsets = (
+        (None, {"fields": ("name", "active", "priority", "location")}),
+        ("Discount", {"fields": ("kind", "percent", "amount", "buy_quantity", "get_quantity")}),
+        ("Applies to", {"fields": ("scope", "menu_item", "category", "min_subtotal", "sources")}),
+        ("When", {"fields": ("weekdays", "start_time", "end_time", "valid_from", "valid_to")}),
+        ("Meta", {"fields": ("created_at", "updated_at")}),
+    )
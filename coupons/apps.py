@@ -6,3 +6,7 @@ class PromotionsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "coupons"
     verbose_name = "Promotions & Coupons"
+
+    def ready(self):
+        # drop cached coupon lookups on save/delete
+        from . import signals  # noqa
@@ -0,0 +1,62 @@
+# coupons/bloom.py
+"""
+Small Bloom filter: "definitely not present" or "maybe present".
+No false negatives; the false-positive rate is set at construction.
+"""
+from __future__ import annotations
+
+import math
+from hashlib import blake2b
+from typing import Iterable
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(int(capacity), 1)
+        error_rate = min(max(float(error_rate), 1e-9), 0.5)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(64, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def from_items(cls, items: Iterable[str], error_rate: float = 0.01, headroom: float = 2.0) -> "BloomFilter":
+        items = list(items)
+        bloom = cls(max(len(items) * headroom, 64), error_rate)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+    def _positions(self, item: str):
+        # Double hashing (Kirsch–Mitzenmacher): k positions from one 128-bit digest
+        digest = blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def fill_ratio(self) -> float:
+        return sum(bin(b).count("1") for b in self.bits) / self.num_bits
+
+    @property
+    def estimated_fp_rate(self) -> float:
+        return self.fill_ratio ** self.num_hashes
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.bits)
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:15
+
+from django.db import migrations, models
+from django.db.models.functions import Trim, Upper
+
+
+def fill_normalized(apps, schema_editor):
+    Coupon = apps.get_model("coupons", "Coupon")
+    Coupon.objects.update(code_norm=Upper(Trim("code")), phrase_norm=Upper(Trim("phrase")))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupons', '0003_alter_coupon_code_alter_coupon_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='code_norm',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='phrase_norm',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=128),
+        ),
+        migrations.RunPython(fill_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupons', '0004_coupon_code_norm_coupon_phrase_norm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='counter_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='CouponCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('coupon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_rows', to='coupons.coupon')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('coupon', 'shard'), name='uniq_coupon_counter_shard')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('coupons', '0005_coupon_counter_shards_couponcountershard'),
+        ('menu', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Promotion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=120)),
+                ('active', models.BooleanField(default=True)),
+                ('kind', models.CharField(choices=[('PERCENT', 'Percent off'), ('AMOUNT', 'Amount off (per unit for items, once for the order)'), ('BXGY', 'Buy X get Y free (same item)')], default='PERCENT', max_length=8)),
+                ('scope', models.CharField(choices=[('ORDER', 'Whole order'), ('ITEM', 'Menu item'), ('CATEGORY', 'Menu category')], default='ORDER', max_length=8)),
+                ('percent', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('buy_quantity', models.PositiveSmallIntegerField(default=0)),
+                ('get_quantity', models.PositiveSmallIntegerField(default=0)),
+                ('min_subtotal', models.DecimalField(decimal_places=2, default=0, help_text='ORDER scope only.', max_digits=10)),
+                ('sources', models.CharField(blank=True, help_text='Comma-separated order sources, e.g. DINE_IN (blank = all).', max_length=64)),
+                ('weekdays', models.CharField(blank=True, help_text='Digits 0–6 for Mon–Sun, e.g. 01234 (blank = every day).', max_length=7)),
+                ('start_time', models.TimeField(blank=True, help_text="Daily window in the location's time zone.", null=True)),
+                ('end_time', models.TimeField(blank=True, help_text='May be before start_time to run past midnight.', null=True)),
+                ('valid_from', models.DateTimeField(blank=True, null=True)),
+                ('valid_to', models.DateTimeField(blank=True, null=True)),
+                ('priority', models.IntegerField(default=0, help_text='Breaks ties between equal discounts.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='promotions', to='menu.menucategory')),
+                ('location', models.ForeignKey(blank=True, help_text='Blank = every location.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='promotions', to='core.location')),
+                ('menu_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='promotions', to='menu.menuitem')),
+            ],
+            options={
+                'ordering': ['-priority', 'name'],
+                'indexes': [models.Index(fields=['active', 'location'], name='coupons_pro_active_55b1ad_idx')],
+            },
+        ),
+    ]
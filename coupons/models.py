@@ -6,6 +6,11 @@ from django.db import models
 from django.utils import timezone
 
 
+def normalize_code(value: str) -> str:
+    """How codes and phrases are matched: trimmed, upper-case."""
+    return (value or "").strip().upper()
+
+
 class Coupon(models.Model):
     code = models.CharField(max_length=64, unique=True)
     percent = models.PositiveSmallIntegerField(
@@ -14,12 +19,18 @@ class Coupon(models.Model):
         help_text="Percent discount (0–100).",
     )
     phrase = models.CharField(max_length=128, blank=True)
+    # normalize_code(code/phrase), kept by save(); what lookups filter on
+    code_norm = models.CharField(max_length=64, db_index=True, editable=False, default="")
+    phrase_norm = models.CharField(max_length=128, db_index=True, editable=False, default="")
 
     active = models.BooleanField(default=True)
     valid_from = models.DateTimeField(null=True, blank=True)
     valid_to = models.DateTimeField(null=True, blank=True)
     max_uses = models.PositiveIntegerField(null=True, blank=True)
     times_used = models.PositiveIntegerField(default=0)
+    # >0: redemptions go to this many CouponCounterShard rows instead of
+    # times_used (hot promo codes); times_used then trails their sum
+    counter_shards = models.PositiveSmallIntegerField(default=0)
 
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL, null=True, blank=True,
@@ -34,6 +45,20 @@ class Coupon(models.Model):
     def __str__(self) -> str:
         return f"{self.code} (-{self.percent}%)"
 
+    def save(self, *args, **kwargs):
+        self.code_norm = normalize_code(self.code)
+        self.phrase_norm = normalize_code(self.phrase)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and ({"code", "phrase"} & set(update_fields)):
+            kwargs["update_fields"] = set(update_fields) | {"code_norm", "phrase_norm"}
+        elif update_fields is None and not self._state.adding and not kwargs.get("force_insert"):
+            # times_used only moves through atomic UPDATEs (coupons.services.redeem_coupon);
+            # a full save of a stale instance must not write it back
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != "times_used"
+            ]
+        super().save(*args, **kwargs)
+
     def is_valid_now(self) -> bool:
         if not self.active:
             return False
@@ -47,3 +72,108 @@ class Coupon(models.Model):
         if self.percent <= 0:
             return False
         return True
+
+
+class CouponCounterShard(models.Model):
+    """One slice of a sharded redemption counter (see coupons.services.redeem_coupon)."""
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name="counter_rows")
+    shard = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["coupon", "shard"], name="uniq_coupon_counter_shard"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.coupon_id}#{self.shard}: {self.count}"
+
+
+class CouponRedemption(models.Model):
+    """The one counted use of a coupon an order holds (coupons.services.redeem_coupon_for_order)."""
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name="redemptions")
+    order = models.OneToOneField("orders.Order", on_delete=models.CASCADE, related_name="coupon_redemption")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.coupon_id} for order {self.order_id}"
+
+
+class Promotion(models.Model):
+    """
+    Automatic discount evaluated against the cart (coupons.promotions), no
+    code needed. ITEM/CATEGORY promotions price individual lines; ORDER
+    promotions apply to what is left of the subtotal.
+    """
+    KIND_PERCENT = "PERCENT"
+    KIND_AMOUNT = "AMOUNT"
+    KIND_BUY_X_GET_Y = "BXGY"
+    KIND_CHOICES = [
+        (KIND_PERCENT, "Percent off"),
+        (KIND_AMOUNT, "Amount off (per unit for items, once for the order)"),
+        (KIND_BUY_X_GET_Y, "Buy X get Y free (same item)"),
+    ]
+    SCOPE_ORDER = "ORDER"
+    SCOPE_ITEM = "ITEM"
+    SCOPE_CATEGORY = "CATEGORY"
+    SCOPE_CHOICES = [
+        (SCOPE_ORDER, "Whole order"),
+        (SCOPE_ITEM, "Menu item"),
+        (SCOPE_CATEGORY, "Menu category"),
+    ]
+
+    name = models.CharField(max_length=120)
+    active = models.BooleanField(default=True)
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES, default=KIND_PERCENT)
+    scope = models.CharField(max_length=8, choices=SCOPE_CHOICES, default=SCOPE_ORDER)
+    location = models.ForeignKey(
+        "core.Location", null=True, blank=True, on_delete=models.CASCADE,
+        related_name="promotions", help_text="Blank = every location.",
+    )
+    menu_item = models.ForeignKey("menu.MenuItem", null=True, blank=True, on_delete=models.CASCADE, related_name="promotions")
+    category = models.ForeignKey("menu.MenuCategory", null=True, blank=True, on_delete=models.CASCADE, related_name="promotions")
+
+    percent = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    buy_quantity = models.PositiveSmallIntegerField(default=0)
+    get_quantity = models.PositiveSmallIntegerField(default=0)
+    min_subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="ORDER scope only.")
+
+    sources = models.CharField(max_length=64, blank=True, help_text="Comma-separated order sources, e.g. DINE_IN (blank = all).")
+    weekdays = models.CharField(max_length=7, blank=True, help_text="Digits 0–6 for Mon–Sun, e.g. 01234 (blank = every day).")
+    start_time = models.TimeField(null=True, blank=True, help_text="Daily window in the location's time zone.")
+    end_time = models.TimeField(null=True, blank=True, help_text="May be before start_time to run past midnight.")
+    valid_from = models.DateTimeField(null=True, blank=True)
+    valid_to = models.DateTimeField(null=True, blank=True)
+    priority = models.IntegerField(default=0, help_text="Breaks ties between equal discounts.")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-priority", "name"]
+        indexes = [models.Index(fields=["active", "location"])]
+
+    def __str__(self) -> str:
+        return self.name
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+
+        if self.scope == self.SCOPE_ITEM and not self.menu_item_id:
+            raise ValidationError("Item promotions need a menu item.")
+        if self.scope == self.SCOPE_CATEGORY and not self.category_id:
+            raise ValidationError("Category promotions need a category.")
+        if self.kind == self.KIND_BUY_X_GET_Y:
+            if self.scope == self.SCOPE_ORDER:
+                raise ValidationError("Buy X get Y applies to an item or category.")
+            if not (self.buy_quantity and self.get_quantity):
+                raise ValidationError("Buy X get Y needs both quantities.")
+        if self.kind == self.KIND_PERCENT and not 0 < self.percent <= 100:
+            raise ValidationError("Percent must be between 0 and 100.")
+        if self.kind == self.KIND_AMOUNT and self.amount <= 0:
+            raise ValidationError("Amount must be positive.")
+        if bool(self.start_time) != bool(self.end_time):
+            raise ValidationError("Set both start and end time, or neither.")
+        if self.weekdays and not set(self.weekdays) <= set("0123456"):
+            raise ValidationError("Weekdays are digits 0–6.")
@@ -0,0 +1,288 @@
+# coupons/promotions.py
+"""
+Automatic promotions, compiled once and evaluated in memory.
+
+Active Promotion rows for a location (plus the ones without a location)
+are compiled into plain rules with amounts in integer cents and daily
+windows in minutes of the location's local day, then indexed by menu
+item, by category, and the order-level list. Pricing a cart is then a
+dict lookup per line and never touches the DB:
+
+    result = evaluate_cart(lines, source="DINE_IN", location_id=3)
+    result.discount, result.applied
+
+Each line gets the single best ITEM/CATEGORY rule that is live for the
+source and moment. The best ORDER rule is then applied to what is left of
+the subtotal. Amounts never go below zero.
+
+Compiled indexes are per process (core.versioned_cache). Saving or
+deleting a Promotion replaces a shared version token in the Django cache
+once the change commits (coupons.signals), and every process recompiles
+on its next evaluation. PROMOTIONS_CACHE_TTL is a backstop for that
+recompile.
+"""
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, tzinfo
+from decimal import Decimal
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from core.money import ZERO, Money, to_cents
+from core.versioned_cache import VersionedCache
+from .models import Promotion
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "coupons:promotions_version"
+
+
+class CartLine(NamedTuple):
+    menu_item_id: int
+    category_id: Optional[int]
+    unit_cents: int
+    quantity: int
+
+
+@dataclass(frozen=True)
+class PromotionRule:
+    id: int
+    name: str
+    kind: str
+    scope: str
+    percent: Decimal
+    amount_cents: int
+    buy_quantity: int
+    get_quantity: int
+    min_subtotal_cents: int
+    sources: FrozenSet[str]
+    weekdays: FrozenSet[int]
+    start_minute: Optional[int]
+    end_minute: Optional[int]
+    valid_from: Optional[datetime]
+    valid_to: Optional[datetime]
+    priority: int
+
+    @classmethod
+    def from_model(cls, p: Promotion) -> "PromotionRule":
+        def minute(t):
+            return None if t is None else t.hour * 60 + t.minute
+
+        return cls(
+            id=p.pk, name=p.name, kind=p.kind, scope=p.scope,
+            percent=Decimal(p.percent or 0),
+            amount_cents=to_cents(p.amount),
+            buy_quantity=int(p.buy_quantity or 0),
+            get_quantity=int(p.get_quantity or 0),
+            min_subtotal_cents=to_cents(p.min_subtotal),
+            sources=frozenset(s.strip().upper() for s in (p.sources or "").split(",") if s.strip()),
+            weekdays=frozenset(int(d) for d in (p.weekdays or "") if d.isdigit()),
+            start_minute=minute(p.start_time),
+            end_minute=minute(p.end_time),
+            valid_from=p.valid_from,
+            valid_to=p.valid_to,
+            priority=int(p.priority or 0),
+        )
+
+    def is_live(self, source: str, now: datetime, weekday: int, minute: int) -> bool:
+        if self.sources and source not in self.sources:
+            return False
+        if self.valid_from and now < self.valid_from:
+            return False
+        if self.valid_to and now > self.valid_to:
+            return False
+        if self.start_minute is not None:
+            start, end = self.start_minute, self.end_minute
+            if start <= end:
+                if not start <= minute < end:
+                    return False
+            else:
+                # Window past midnight: the late part counts for the previous day
+                if minute < end:
+                    weekday = (weekday - 1) % 7
+                elif minute < start:
+                    return False
+        if self.weekdays and weekday not in self.weekdays:
+            return False
+        return True
+
+    def line_discount(self, unit_cents: int, quantity: int) -> int:
+        line_cents = unit_cents * quantity
+        if self.kind == Promotion.KIND_PERCENT:
+            off = Money(line_cents).percent(self.percent).cents
+        elif self.kind == Promotion.KIND_AMOUNT:
+            off = self.amount_cents * quantity
+        elif self.kind == Promotion.KIND_BUY_X_GET_Y:
+            group = self.buy_quantity + self.get_quantity
+            off = (quantity // group) * self.get_quantity * unit_cents if group and self.get_quantity else 0
+        else:
+            off = 0
+        return min(off, line_cents)
+
+    def order_discount(self, base_cents: int, subtotal_cents: int) -> int:
+        if subtotal_cents < self.min_subtotal_cents:
+            return 0
+        if self.kind == Promotion.KIND_PERCENT:
+            off = Money(base_cents).percent(self.percent).cents
+        elif self.kind == Promotion.KIND_AMOUNT:
+            off = self.amount_cents
+        else:
+            off = 0
+        return min(off, base_cents)
+
+
+@dataclass
+class CompiledPromotions:
+    tz: tzinfo
+    by_item: Dict[int, Tuple[PromotionRule, ...]] = field(default_factory=dict)
+    by_category: Dict[int, Tuple[PromotionRule, ...]] = field(default_factory=dict)
+    order_rules: Tuple[PromotionRule, ...] = ()
+
+    def __len__(self) -> int:
+        return sum(map(len, self.by_item.values())) + sum(map(len, self.by_category.values())) + len(self.order_rules)
+
+
+@dataclass
+class PromotionResult:
+    subtotal: Money = ZERO
+    discount: Money = ZERO
+    applied: List[dict] = field(default_factory=list)
+
+    @property
+    def total(self) -> Money:
+        return self.subtotal - self.discount
+
+    def as_dict(self) -> dict:
+        return {
+            "discount": str(self.discount),
+            "promotions": [
+                {"id": a["id"], "name": a["name"], "menu_item_id": a["menu_item_id"], "discount": str(a["discount"])}
+                for a in self.applied
+            ],
+        }
+
+
+def compile_promotions(location_id: Optional[int] = None) -> CompiledPromotions:
+    tz = timezone.get_default_timezone()
+    if location_id:
+        from core.models import Location
+
+        name = Location.objects.filter(pk=location_id).values_list("timezone", flat=True).first()
+        try:
+            tz = ZoneInfo(name) if name else tz
+        except Exception as e:
+            logger.info("Location %s has an unknown time zone %r: %s", location_id, name, e)
+
+    qs = Promotion.objects.filter(active=True)
+    qs = qs.filter(Q(location__isnull=True) | Q(location_id=location_id)) if location_id else qs.filter(location__isnull=True)
+    by_item, by_category, order_rules = defaultdict(list), defaultdict(list), []
+    for p in qs:
+        rule = PromotionRule.from_model(p)
+        if p.scope == Promotion.SCOPE_ITEM and p.menu_item_id:
+            by_item[p.menu_item_id].append(rule)
+        elif p.scope == Promotion.SCOPE_CATEGORY and p.category_id:
+            by_category[p.category_id].append(rule)
+        elif p.scope == Promotion.SCOPE_ORDER and p.kind != Promotion.KIND_BUY_X_GET_Y:
+            order_rules.append(rule)
+    return CompiledPromotions(
+        tz=tz,
+        by_item={k: tuple(v) for k, v in by_item.items()},
+        by_category={k: tuple(v) for k, v in by_category.items()},
+        order_rules=tuple(order_rules),
+    )
+
+
+def _compile_logged(location_id: Optional[int]) -> CompiledPromotions:
+    compiled = compile_promotions(location_id)
+    logger.info("Compiled %d promotion rule(s) for location %s", len(compiled), location_id)
+    return compiled
+
+
+# Compiled promotions per location id
+_index = VersionedCache(VERSION_KEY, _compile_logged, ttl_setting="PROMOTIONS_CACHE_TTL")
+
+
+def bump_promotions() -> None:
+    """Make every process recompile its promotions (call after the change commits)."""
+    _index.bump()
+
+
+def default_location_id() -> Optional[int]:
+    # Orders don't carry a location yet; a single-site install prices for its own
+    return getattr(settings, "KITCHEN_LOCATION_ID", None) or None
+
+
+def _best(rules: Iterable[PromotionRule], discount) -> Tuple[Optional[PromotionRule], int]:
+    best, best_off = None, 0
+    for rule in rules:
+        off = discount(rule)
+        if off > best_off or (off and off == best_off and rule.priority > best.priority):
+            best, best_off = rule, off
+    return best, best_off
+
+
+def evaluate_cart(
+    lines: Iterable[CartLine],
+    source: str = "DINE_IN",
+    location_id: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> PromotionResult:
+    """Price `lines` against the compiled promotions. No queries once compiled."""
+    compiled = _index.get(location_id if location_id is not None else default_location_id())
+    now = now or timezone.now()
+    local = now.astimezone(compiled.tz)
+    weekday, minute = local.weekday(), local.hour * 60 + local.minute
+    source = (source or "").upper()
+    live = {}
+
+    def is_live(rule: PromotionRule) -> bool:
+        ok = live.get(rule.id)
+        if ok is None:
+            ok = live[rule.id] = rule.is_live(source, now, weekday, minute)
+        return ok
+
+    subtotal = line_off = 0
+    applied: List[dict] = []
+    by_item, by_category = compiled.by_item, compiled.by_category
+    for line in lines:
+        unit, qty = int(line.unit_cents), int(line.quantity)
+        subtotal += unit * qty
+        candidates = by_item.get(line.menu_item_id, ()) + by_category.get(line.category_id, ())
+        if not candidates:
+            continue
+        rule, off = _best((r for r in candidates if is_live(r)), lambda r: r.line_discount(unit, qty))
+        if rule:
+            line_off += off
+            applied.append({"id": rule.id, "name": rule.name, "menu_item_id": line.menu_item_id, "discount": Money(off)})
+
+    remaining = subtotal - line_off
+    rule, off = _best(
+        (r for r in compiled.order_rules if is_live(r)),
+        lambda r: r.order_discount(remaining, subtotal),
+    )
+    if rule:
+        applied.append({"id": rule.id, "name": rule.name, "menu_item_id": None, "discount": Money(off)})
+    return PromotionResult(subtotal=Money(subtotal), discount=Money(line_off + off), applied=applied)
+
+
+def order_cart_lines(order) -> List[CartLine]:
+    return [
+        CartLine(mi, cat, to_cents(unit), qty)
+        for mi, cat, unit, qty in order.items.values_list(
+            "menu_item_id", "menu_item__category_id", "unit_price", "quantity"
+        )
+    ]
+
+
+def evaluate_order(order, now: Optional[datetime] = None) -> PromotionResult:
+    return evaluate_cart(
+        order_cart_lines(order), source=order.source,
+        location_id=getattr(order, "location_id", None), now=now,
+    )
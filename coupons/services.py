@@ -1,27 +1,212 @@
+# coupons/services.py
+"""
+Coupon lookup, discount and application.
+
+find_active_coupon() matches the indexed code_norm/phrase_norm columns
+(normalize_code: trimmed, upper-case) and sits behind a process-local LRU
+keyed by the normalized input. Misses are cached too ("no such code"), so
+repeated guesses cost no query. Entries live COUPON_CACHE_TTL seconds;
+saving or deleting a Coupon drops its code/phrase keys in this process
+right away (coupons.signals). Validity (dates, usage) is re-checked on
+every hit, never cached.
+
+Before a cache miss reaches the DB it must pass a Bloom filter of every
+active coupon's normalized code and phrase (coupons.bloom). Guesses that
+cannot match return without a query and without filling the LRU. After a
+coupon change commits, a shared version token in the Django cache is
+replaced (core.versioned_cache), and every process rebuilds its filter on
+its next lookup.
+COUPON_FILTER_TTL is a backstop for that rebuild.
+"""
 from __future__ import annotations
+
+import copy
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
 from decimal import Decimal
-from typing import Tuple
+from typing import Optional, Tuple
 
-from django.db.models import Q
-from .models import Coupon
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+
+from core.money import Money, to_cents
+from core.versioned_cache import VersionedCache
+from .bloom import BloomFilter
+from .models import Coupon, CouponCounterShard, CouponRedemption, normalize_code
 from orders.models import Order
 
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+FILTER_VERSION_KEY = "coupons:filter_version"
+
+
+class _CouponCache:
+    """Thread-safe LRU of normalized code -> (expires_at, Coupon | None)."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Optional[Coupon]) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_cache = _CouponCache(
+    maxsize=int(getattr(settings, "COUPON_CACHE_SIZE", 4096)),
+    ttl=float(getattr(settings, "COUPON_CACHE_TTL", 60)),
+)
+
+
+def invalidate_coupon_cache(*codes: str) -> None:
+    """Drop cached lookups for these codes/phrases (all of them if none given)."""
+    keys = [normalize_code(c) for c in codes if c]
+    if keys:
+        _cache.discard(*keys)
+    else:
+        _cache.clear()
+
+
+class _CouponFilter:
+    """Process-local Bloom filter of active codes/phrases, plus hit-rate counters."""
+
+    def __init__(self):
+        self._blooms = VersionedCache(FILTER_VERSION_KEY, self._build, ttl_setting="COUPON_FILTER_TTL")
+        self.checks = self.rejected = self.false_positives = 0
+
+    @property
+    def bloom(self) -> Optional[BloomFilter]:
+        return self._blooms.peek()
+
+    def _build(self, _key=None) -> BloomFilter:
+        keys = set()
+        for code, phrase in Coupon.objects.filter(active=True).values_list("code_norm", "phrase_norm"):
+            keys.add(code)
+            if phrase:
+                keys.add(phrase)
+        keys.discard("")
+        bloom = BloomFilter.from_items(keys, error_rate=float(getattr(settings, "COUPON_FILTER_ERROR_RATE", 0.01)))
+        logger.info(
+            "Coupon filter rebuilt: %d keys, %d bytes, %d hashes",
+            len(keys), bloom.size_bytes, bloom.num_hashes,
+        )
+        return bloom
+
+    def _current(self) -> BloomFilter:
+        return self._blooms.get()
+
+    def bump(self) -> None:
+        self._blooms.bump()
+
+    def might_match(self, key: str) -> bool:
+        try:
+            hit = key in self._current()
+        except Exception as e:
+            # No filter, no shortcut: fall through to the DB
+            logger.info("Coupon filter skipped: %s", e)
+            return True
+        self.checks += 1
+        if not hit:
+            self.rejected += 1
+        every = int(getattr(settings, "COUPON_FILTER_LOG_EVERY", 1000))
+        if every and self.checks % every == 0:
+            self.log_stats()
+        return hit
+
+    def record_false_positive(self) -> None:
+        self.false_positives += 1
+
+    def stats(self) -> dict:
+        passed = self.checks - self.rejected
+        bloom = self.bloom
+        return {
+            "checks": self.checks,
+            "rejected": self.rejected,
+            "reject_rate": self.rejected / self.checks if self.checks else 0.0,
+            "false_positives": self.false_positives,
+            "false_positive_rate": self.false_positives / passed if passed else 0.0,
+            "keys": len(bloom) if bloom else 0,
+            "bytes": bloom.size_bytes if bloom else 0,
+            "fill_ratio": bloom.fill_ratio if bloom else 0.0,
+            "estimated_fp_rate": bloom.estimated_fp_rate if bloom else 0.0,
+        }
+
+    def log_stats(self) -> None:
+        st = self.stats()
+        logger.info(
+            "Coupon filter: %d checks, %.1f%% rejected without DB, %d false positives (%.2f%% of passes); "
+            "%d keys in %d bytes, fill %.1f%%, estimated FP %.3f%%",
+            st["checks"], st["reject_rate"] * 100, st["false_positives"], st["false_positive_rate"] * 100,
+            st["keys"], st["bytes"], st["fill_ratio"] * 100, st["estimated_fp_rate"] * 100,
+        )
+
+
+_filter = _CouponFilter()
+
+
+def bump_coupon_filter() -> None:
+    """Make every process rebuild its coupon filter (call after the change commits)."""
+    _filter.bump()
+
+
+def coupon_filter_stats() -> dict:
+    return _filter.stats()
+
+
+def _lookup(key: str) -> Optional[Coupon]:
+    # Code wins over phrase; each is a single indexed equality lookup
+    active = Coupon.objects.filter(active=True).order_by("-created_at")
+    return active.filter(code_norm=key).first() or active.filter(phrase_norm=key).first()
+
 
 def find_active_coupon(code_or_phrase: str) -> Coupon | None:
-    if not code_or_phrase:
+    key = normalize_code(code_or_phrase)
+    if not key:
         return None
-    code = (code_or_phrase or "").strip()
-    coupon = (
-        Coupon.objects.filter(
-            Q(code__iexact=code) | Q(phrase__iexact=code),
-            active=True,
-        )
-        .order_by("-created_at")
-        .first()
-    )
-    if coupon and coupon.is_valid_now():
-        return coupon
-    return None
+    coupon = _cache.get(key)
+    if coupon is _MISSING:
+        if not _filter.might_match(key):
+            return None
+        coupon = _lookup(key)
+        if coupon is None:
+            _filter.record_false_positive()
+        _cache.set(key, coupon)
+    if coupon is None or not coupon.is_valid_now():
+        return None
+    # Callers may modify/save what they get; keep the cached row pristine
+    return copy.copy(coupon)
 
 
 def compute_discount_for_order(order: Order, coupon: Coupon | None, user) -> Tuple[bool, Decimal, str]:
@@ -30,8 +215,232 @@ def compute_discount_for_order(order: Order, coupon: Coupon | None, user) -> Tup
     if not coupon.is_valid_now():
         return False, Decimal("0.00"), "Coupon not valid"
 
-    pct = Decimal(str(coupon.percent)) / Decimal("100")
-    discount = (order.subtotal * pct).quantize(Decimal("0.01"))
+    discount = Money.of(order.subtotal).percent(coupon.percent)
     if discount <= 0:
         return False, Decimal("0.00"), "No discount"
-    return True, discount, "OK"
+    return True, discount.to_decimal(), "OK"
+
+
+# ---------- Redemption counters ----------
+def shard_quota(max_uses: int, shards: int, index: int) -> int:
+    """Uses shard `index` may hold; the quotas add up to exactly max_uses."""
+    base, extra = divmod(max_uses, shards)
+    return base + (1 if index < extra else 0)
+
+
+def reshard_coupon_counter(coupon: Coupon) -> None:
+    """
+    Lay the current usage out over coupon.counter_shards rows, filling each
+    up to its quota, so the free room left is exactly max_uses - used.
+    Call after counter_shards or max_uses change.
+    """
+    with transaction.atomic():
+        rows = list(CouponCounterShard.objects.select_for_update().filter(coupon_id=coupon.pk))
+        if rows:
+            used = sum(r.count for r in rows)
+        else:
+            used = Coupon.objects.filter(pk=coupon.pk).values_list("times_used", flat=True).first() or 0
+        CouponCounterShard.objects.filter(coupon_id=coupon.pk).delete()
+        shards = coupon.counter_shards
+        if not shards:
+            Coupon.objects.filter(pk=coupon.pk).update(times_used=used)
+            return
+        counts = [0] * shards
+        rest = used
+        if coupon.max_uses is not None:
+            for i in range(shards):
+                counts[i] = min(shard_quota(coupon.max_uses, shards, i), rest)
+                rest -= counts[i]
+        counts[0] += rest
+        CouponCounterShard.objects.bulk_create(
+            [CouponCounterShard(coupon_id=coupon.pk, shard=i, count=n) for i, n in enumerate(counts)]
+        )
+
+
+def coupon_usage(coupon: Coupon) -> int:
+    """Live redemption count (sums the shards in sharded mode)."""
+    if not coupon.counter_shards:
+        return Coupon.objects.filter(pk=coupon.pk).values_list("times_used", flat=True).first() or 0
+    return CouponCounterShard.objects.filter(coupon_id=coupon.pk).aggregate(n=Sum("count"))["n"] or 0
+
+
+def sync_coupon_usage(coupon: Coupon) -> int:
+    """Fold the shard counts into times_used (what is_valid_now and the admin read)."""
+    if not CouponCounterShard.objects.filter(coupon_id=coupon.pk).exists():
+        return coupon.times_used
+    used = CouponCounterShard.objects.filter(coupon_id=coupon.pk).aggregate(n=Sum("count"))["n"] or 0
+    Coupon.objects.filter(pk=coupon.pk).update(times_used=used)
+    coupon.times_used = used
+    invalidate_coupon_cache(coupon.code, coupon.phrase)
+    return used
+
+
+def _redeem_single(coupon: Coupon) -> bool:
+    # UPDATE … SET times_used = times_used + 1 WHERE times_used < max_uses
+    return bool(
+        Coupon.objects.filter(pk=coupon.pk)
+        .filter(Q(max_uses__isnull=True) | Q(times_used__lt=F("max_uses")))
+        .update(times_used=F("times_used") + 1)
+    )
+
+
+def _redeem_sharded(coupon: Coupon) -> bool:
+    # Random start spreads writers over rows; each shard enforces its own
+    # slice of max_uses, so the total can never pass it
+    shards = coupon.counter_shards
+    for attempt in range(2):
+        for index in random.sample(range(shards), shards):
+            qs = CouponCounterShard.objects.filter(coupon_id=coupon.pk, shard=index)
+            if coupon.max_uses is not None:
+                qs = qs.filter(count__lt=shard_quota(coupon.max_uses, shards, index))
+            if qs.update(count=F("count") + 1):
+                return True
+        if attempt == 0 and CouponCounterShard.objects.filter(coupon_id=coupon.pk).count() != shards:
+            reshard_coupon_counter(coupon)
+            continue
+        break
+    return False
+
+
+def redeem_coupon(coupon: Coupon) -> bool:
+    """
+    Count one use of `coupon` if it has uses left; False when exhausted.
+    One conditional UPDATE, no read-modify-write, so concurrent checkouts
+    can't over-redeem a limited promo.
+    """
+    ok = _redeem_sharded(coupon) if coupon.counter_shards else _redeem_single(coupon)
+    if not ok:
+        if coupon.counter_shards:
+            sync_coupon_usage(coupon)
+        # A cached copy may still look valid; make the next lookup re-read it
+        invalidate_coupon_cache(coupon.code, coupon.phrase)
+    return ok
+
+
+def release_coupon(coupon: Coupon) -> None:
+    """Give back one counted use (an unpaid order dropped or swapped the coupon)."""
+    if coupon.counter_shards:
+        for index in random.sample(range(coupon.counter_shards), coupon.counter_shards):
+            if CouponCounterShard.objects.filter(coupon_id=coupon.pk, shard=index, count__gt=0).update(
+                count=F("count") - 1,
+            ):
+                break
+    else:
+        Coupon.objects.filter(pk=coupon.pk, times_used__gt=0).update(times_used=F("times_used") - 1)
+    invalidate_coupon_cache(coupon.code, coupon.phrase)
+
+
+def redeem_coupon_for_order(coupon: Coupon, order: Order) -> bool:
+    """
+    Count one use of `coupon` for `order`, at most once: a repeated checkout
+    and the order.paid handler find the existing CouponRedemption. Swapping
+    to another coupon gives the old one's use back. False when exhausted.
+    """
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                held = CouponRedemption.objects.select_for_update().select_related("coupon").filter(order=order).first()
+                if held is not None and held.coupon_id == coupon.pk:
+                    return True
+                if not redeem_coupon(coupon):
+                    return False
+                if held is None:
+                    CouponRedemption.objects.create(coupon=coupon, order=order)
+                else:
+                    release_coupon(held.coupon)
+                    held.coupon = coupon
+                    held.save(update_fields=["coupon"])
+                return True
+        except IntegrityError:
+            # A concurrent checkout of the same order recorded it first; our count rolled back
+            if attempt:
+                raise
+    return False
+
+
+def release_coupon_for_order(order: Order) -> None:
+    """Drop the coupon use an unpaid order holds, if any (checkout without a coupon)."""
+    with transaction.atomic():
+        held = CouponRedemption.objects.select_for_update().select_related("coupon").filter(order=order).first()
+        if held is not None:
+            release_coupon(held.coupon)
+            held.delete()
+
+
+def redeem_order_coupon(order: Order) -> bool:
+    """
+    Count the coupon behind order.discount_code if checkout has not already
+    (e.g. it was attached through the apply endpoint). True when there is
+    nothing to count; False when the coupon was exhausted in the meantime.
+    """
+    key = normalize_code(order.discount_code)
+    if not key:
+        return True
+    coupon = Coupon.objects.filter(code_norm=key).order_by("-created_at").first()
+    if coupon is None:
+        return True  # LOYALTY and other non-coupon labels
+    return redeem_coupon_for_order(coupon, order)
+
+
+def apply_coupon_code_to_order(order, code: str) -> Tuple[bool, str]:
+    """
+    Attach coupon by code to an order in a flexible way:
+      - order.coupon_percent / order.discount_percent
+      - order.coupon_code
+      - order.coupon (FK to Coupon) if present
+      - order.discount_amount (rough estimate; final amount recomputed in payments.services)
+    Returns (ok, message).
+    """
+    c = find_active_coupon(code)
+    if not c:
+        return False, "Invalid or inactive coupon"
+
+    with transaction.atomic():
+        redeemed = redeem_coupon_for_order(c, order) if isinstance(order, Order) and order.pk else redeem_coupon(c)
+        if not redeemed:
+            return False, "Coupon usage limit reached"
+        _attach_coupon(order, c)
+    return True, f"Applied {c.percent}% off"
+
+
+def _attach_coupon(order, c: Coupon) -> None:
+    updated = []
+
+    # % fields
+    if hasattr(order, "coupon_percent"):
+        setattr(order, "coupon_percent", int(c.percent))
+        updated.append("coupon_percent")
+    elif hasattr(order, "discount_percent"):
+        setattr(order, "discount_percent", int(c.percent))
+        updated.append("discount_percent")
+
+    # Code field
+    if hasattr(order, "coupon_code"):
+        setattr(order, "coupon_code", c.code)
+        updated.append("coupon_code")
+
+    # Relation
+    if hasattr(order, "coupon_id"):
+        try:
+            order.coupon = c
+            updated.append("coupon_id")
+        except Exception:
+            pass
+
+    # Optional: set discount_amount best-effort from items
+    if hasattr(order, "discount_amount"):
+        try:
+            subtotal = Money(sum(
+                to_cents(getattr(it, "unit_price", 0)) * int(getattr(it, "quantity", 0))
+                for it in order.items.all()
+            ))
+            setattr(order, "discount_amount", subtotal.percent(c.percent).to_decimal())
+            updated.append("discount_amount")
+        except Exception:
+            pass
+
+    if updated:
+        try:
+            order.save(update_fields=list(set(updated)))
+        except Exception:
+            order.save()
@@ -0,0 +1,48 @@
+# coupons/signals.py
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Coupon, CouponCounterShard, Promotion
+from .promotions import bump_promotions
+from .services import bump_coupon_filter, invalidate_coupon_cache, reshard_coupon_counter
+
+
+@receiver(pre_save, sender=Coupon)
+def remember_previous_codes(sender, instance: Coupon, update_fields=None, **kwargs):
+    # A renamed code/phrase must also drop the cached entry under its old key
+    instance._previous_codes = ()
+    if update_fields is not None and not ({"code", "phrase"} & set(update_fields)):
+        return
+    if instance.pk:
+        row = Coupon.objects.filter(pk=instance.pk).values_list("code", "phrase").first()
+        if row:
+            instance._previous_codes = row
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def invalidate_coupon_lookup(sender, instance: Coupon, **kwargs):
+    invalidate_coupon_cache(instance.code, instance.phrase, *getattr(instance, "_previous_codes", ()))
+    # Usage counters don't change which codes exist
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and set(update_fields) <= {"times_used", "updated_at"}:
+        return
+    transaction.on_commit(bump_coupon_filter)
+
+
+@receiver(post_save, sender=Coupon)
+def sync_counter_shards(sender, instance: Coupon, created, update_fields=None, **kwargs):
+    # Shard quotas depend on both the shard count and max_uses
+    if update_fields is not None and not ({"counter_shards", "max_uses"} & set(update_fields)):
+        return
+    if instance.counter_shards or (not created and CouponCounterShard.objects.filter(coupon_id=instance.pk).exists()):
+        reshard_coupon_counter(instance)
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def recompile_promotions(sender, instance: Promotion, **kwargs):
+    transaction.on_commit(bump_promotions)
@@ -0,0 +1,277 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core.money import Money
+from core.testing import THREADS, retry_locked, run_threads
+from orders.models import Order
+
+from .models import Coupon, CouponCounterShard, CouponRedemption
+from .services import coupon_usage, redeem_coupon, redeem_order_coupon, shard_quota, sync_coupon_usage
+
+ATTEMPTS_PER_THREAD = 20
+MAX_USES = 50
+
+
+def _redeem_concurrently(coupon_pk):
+    def redeem():
+        coupon = retry_locked(lambda: Coupon.objects.get(pk=coupon_pk))
+        return [sum(1 for _ in range(ATTEMPTS_PER_THREAD) if retry_locked(lambda: redeem_coupon(coupon)))]
+
+    wins, errors = run_threads(redeem)
+    return sum(wins), errors
+
+
+class CouponRedemptionConcurrencyTests(TransactionTestCase):
+    def test_single_counter_never_over_redeems(self):
+        coupon = Coupon.objects.create(code="HOT50", percent=10, max_uses=MAX_USES)
+
+        redeemed, errors = _redeem_concurrently(coupon.pk)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(redeemed, MAX_USES)
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.times_used, MAX_USES)
+        self.assertFalse(coupon.is_valid_now())
+
+    def test_sharded_counter_never_over_redeems(self):
+        coupon = Coupon.objects.create(code="HOTSHARD", percent=10, max_uses=MAX_USES, counter_shards=4)
+        self.assertEqual(CouponCounterShard.objects.filter(coupon=coupon).count(), 4)
+
+        redeemed, errors = _redeem_concurrently(coupon.pk)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(redeemed, MAX_USES)
+        self.assertEqual(coupon_usage(coupon), MAX_USES)
+        self.assertEqual(sync_coupon_usage(coupon), MAX_USES)
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.times_used, MAX_USES)
+
+    def test_unlimited_coupon_counts_every_redemption(self):
+        coupon = Coupon.objects.create(code="OPEN", percent=5)
+
+        redeemed, errors = _redeem_concurrently(coupon.pk)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(redeemed, THREADS * ATTEMPTS_PER_THREAD)
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.times_used, THREADS * ATTEMPTS_PER_THREAD)
+
+
+class CouponCounterShardTests(TransactionTestCase):
+    def test_quotas_add_up_to_max_uses(self):
+        for max_uses, shards in ((50, 4), (3, 8), (0, 2), (101, 7)):
+            self.assertEqual(sum(shard_quota(max_uses, shards, i) for i in range(shards)), max_uses)
+
+    def test_resharding_keeps_usage_and_remaining_room(self):
+        coupon = Coupon.objects.create(code="MOVE", percent=10, max_uses=20)
+        for _ in range(7):
+            self.assertTrue(redeem_coupon(coupon))
+
+        coupon.counter_shards = 3
+        coupon.save()
+        self.assertEqual(coupon_usage(coupon), 7)
+        coupon.counter_shards = 2
+        coupon.save()
+        self.assertEqual(coupon_usage(coupon), 7)
+
+        self.assertEqual(sum(1 for _ in range(30) if redeem_coupon(coupon)), 13)
+        self.assertEqual(coupon_usage(coupon), 20)
+
+        coupon.counter_shards = 0
+        coupon.save()
+        self.assertFalse(CouponCounterShard.objects.filter(coupon=coupon).exists())
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.times_used, 20)
+        self.assertFalse(redeem_coupon(coupon))
+
+    def test_full_save_of_stale_instance_keeps_times_used(self):
+        coupon = Coupon.objects.create(code="STALE", percent=10)
+        stale = Coupon.objects.get(pk=coupon.pk)
+        redeem_coupon(coupon)
+        stale.percent = 15
+        stale.save()
+        coupon.refresh_from_db()
+        self.assertEqual((coupon.percent, coupon.times_used), (15, 1))
+
+
+class CheckoutCouponLimitTests(TestCase):
+    def setUp(self):
+        from core.models import Organization
+        from menu.models import MenuCategory, MenuItem
+
+        category = MenuCategory.objects.create(organization=Organization.objects.create(name="Org"), name="Mains")
+        self.item = MenuItem.objects.create(category=category, name="Momo", price="10.00")
+        self.coupon = Coupon.objects.create(code="ONCE", percent=10, max_uses=1)
+
+    def _checkout(self, username):
+        from unittest import mock
+        from django.contrib.auth import get_user_model
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.get_or_create(username=username)[0])
+        body = {"source": "UBER_EATS", "coupon": "once", "items": [{"id": self.item.pk, "quantity": 1}]}
+        with mock.patch("orders.views.create_checkout_session", return_value=None), \
+                mock.patch("orders.views.request_invoice_render"):
+            return client.post("/api/orders/orders/", body, format="json")
+
+    def test_single_use_coupon_fails_on_a_second_checkout(self):
+        first = self._checkout("first")
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(Order.objects.get(pk=first.data["id"]).discount_amount, Decimal("1.00"))
+
+        second = self._checkout("second")
+        self.assertEqual(second.status_code, 400)
+        self.assertEqual(coupon_usage(self.coupon), 1)
+
+    def test_repeated_checkout_and_paid_handler_count_the_order_once(self):
+        order_id = self._checkout("first").data["id"]
+        self.assertEqual(self._checkout("first").status_code, 201)
+        self.assertTrue(redeem_order_coupon(Order.objects.get(pk=order_id)))
+        self.assertEqual(coupon_usage(self.coupon), 1)
+        self.assertEqual(CouponRedemption.objects.filter(order_id=order_id).count(), 1)
+
+
+class PromotionWindowTests(TestCase):
+    def _rule(self, **fields):
+        from datetime import time as dt_time
+        from .models import Promotion
+        from .promotions import PromotionRule
+
+        fields.setdefault("start_time", dt_time(22, 0))
+        fields.setdefault("end_time", dt_time(2, 0))
+        return PromotionRule.from_model(Promotion(name="Late", **fields))
+
+    def _live(self, rule, weekday, hh, mm=0):
+        from django.utils import timezone
+
+        return rule.is_live("DINE_IN", timezone.now(), weekday, hh * 60 + mm)
+
+    def test_window_past_midnight_belongs_to_the_day_it_started(self):
+        friday_night = self._rule(weekdays="4")
+        self.assertTrue(self._live(friday_night, 4, 22))
+        self.assertTrue(self._live(friday_night, 4, 23, 59))
+        self.assertTrue(self._live(friday_night, 5, 0))      # Saturday 00:00 is still Friday night
+        self.assertTrue(self._live(friday_night, 5, 1, 59))
+        self.assertFalse(self._live(friday_night, 5, 2))     # end is exclusive
+        self.assertFalse(self._live(friday_night, 4, 1))     # Friday 01:00 is Thursday night
+        self.assertFalse(self._live(friday_night, 4, 21, 59))
+
+    def test_sunday_night_wraps_to_monday(self):
+        sunday_night = self._rule(weekdays="6")
+        self.assertTrue(self._live(sunday_night, 0, 1))
+        self.assertFalse(self._live(sunday_night, 6, 1))
+
+
+@override_settings(KITCHEN_LOCATION_ID=None)
+class PromotionStackingTests(TestCase):
+    def setUp(self):
+        from core.models import Organization
+        from menu.models import MenuCategory, MenuItem
+        from .models import Promotion
+        from .promotions import bump_promotions
+
+        category = MenuCategory.objects.create(organization=Organization.objects.create(name="Org"), name="Mains")
+        self.momo = MenuItem.objects.create(category=category, name="Momo", price="5.00")
+        self.thali = MenuItem.objects.create(category=category, name="Thali", price="10.00")
+        self.bogo = Promotion.objects.create(
+            name="Momo 2+1", kind=Promotion.KIND_BUY_X_GET_Y, scope=Promotion.SCOPE_ITEM,
+            menu_item=self.momo, buy_quantity=2, get_quantity=1,
+        )
+        self.tenth = Promotion.objects.create(
+            name="10% over 30", kind=Promotion.KIND_PERCENT, scope=Promotion.SCOPE_ORDER,
+            percent=10, min_subtotal="30.00",
+        )
+        Promotion.objects.create(name="2 off", kind=Promotion.KIND_AMOUNT, scope=Promotion.SCOPE_ORDER, amount="2.00")
+        # A BOGO can't price a whole order; compile_promotions leaves it out
+        Promotion.objects.create(name="Order BOGO", kind=Promotion.KIND_BUY_X_GET_Y, buy_quantity=1, get_quantity=1)
+        bump_promotions()
+
+    def _evaluate(self, momos):
+        from .promotions import CartLine, evaluate_cart
+
+        lines = [
+            CartLine(self.momo.pk, self.momo.category_id, 500, momos),
+            CartLine(self.thali.pk, self.thali.category_id, 1000, 1),
+        ]
+        return evaluate_cart(lines, source="DINE_IN")
+
+    def test_order_rule_applies_to_what_the_bogo_left(self):
+        result = self._evaluate(momos=5)  # one free momo of five; 3 * 5.00 + 10.00 left of 35.00
+
+        self.assertEqual(result.subtotal, Money(3500))
+        self.assertEqual([(a["id"], a["discount"]) for a in result.applied],
+                         [(self.bogo.pk, Money(500)), (self.tenth.pk, Money(300))])
+        self.assertEqual(result.discount, Money(800))
+        self.assertEqual(result.total, Money(2700))
+
+    def test_minimum_is_checked_against_the_full_subtotal(self):
+        result = self._evaluate(momos=2)  # no free momo; 20.00 is under the 10% minimum
+
+        self.assertEqual([a["name"] for a in result.applied], ["2 off"])
+        self.assertEqual(result.discount, Money(200))
+
+
+class CouponGeneratorTests(TestCase):
+    def test_raw_insert_fills_every_column(self):
+        from .generator import CouponBatchSpec, generate_coupons
+
+        codes = generate_coupons(CouponBatchSpec(count=30, percent=15, pattern="fall-####", max_uses=2), chunk_size=7)
+
+        self.assertEqual(len(set(codes)), 30)
+        rows = Coupon.objects.filter(code__in=codes)
+        self.assertEqual(rows.count(), 30)
+        self.assertEqual(
+            set(rows.values_list("percent", "max_uses", "times_used", "active", "phrase")), {(15, 2, 0, True, "")},
+        )
+        self.assertTrue(all(c.startswith("FALL-") and len(c) == 9 for c in codes))
+        self.assertFalse(rows.exclude(code_norm__in=codes).exists())
+
+    def test_chunk_that_loses_a_race_is_redrawn(self):
+        from . import generator
+
+        taken = Coupon.objects.create(code="RACE2345", percent=5)
+        real_unique = generator._unique_codes
+        calls = []
+
+        def stale_unique(spec, n, seen):
+            # The first chunk draws a code another writer committed after the taken set was loaded
+            calls.append(n)
+            codes = real_unique(spec, n, seen)
+            return [taken.code, *codes[1:]] if len(calls) == 1 else codes
+
+        with mock.patch.object(generator, "_unique_codes", side_effect=stale_unique):
+            codes = generator.generate_coupons(generator.CouponBatchSpec(count=10, percent=10), chunk_size=4)
+
+        self.assertEqual(calls, [4, 4, 4, 2])  # the first chunk is drawn twice
+        self.assertEqual(len(set(codes)), 10)
+        self.assertNotIn(taken.code, codes)
+        self.assertEqual(Coupon.objects.count(), 11)
+        taken.refresh_from_db()
+        self.assertEqual(taken.percent, 5)
+
+
+class ThrottleIdentTests(TestCase):
+    def _ident(self, num_proxies, **meta):
+        from django.conf import settings
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory
+
+        from .throttle import client_ident
+
+        request = RequestFactory().post("/api/coupons/validate/", REMOTE_ADDR="10.0.0.2", **meta)
+        request.user = AnonymousUser()
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": num_proxies}):
+            return client_ident(request)
+
+    def test_forwarded_for_is_ignored_without_trusted_proxies(self):
+        self.assertEqual(self._ident(0, HTTP_X_FORWARDED_FOR="198.51.100.9"), "ip:10.0.0.2")
+
+    def test_clients_behind_a_proxy_get_their_own_bucket(self):
+        # The proxy appends the address it saw; anything before it is the client's to invent
+        forwarded = {"HTTP_X_FORWARDED_FOR": "198.51.100.9, 203.0.113.7"}
+        self.assertEqual(self._ident(1, **forwarded), "ip:203.0.113.7")
+        self.assertEqual(self._ident(2, **forwarded), "ip:198.51.100.9")
+        self.assertEqual(self._ident(1), "ip:10.0.0.2")
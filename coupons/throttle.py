@@ -0,0 +1,58 @@
+# coupons/throttle.py
+"""
+Fixed-window request throttling on the Django cache, per client
+(user id when signed in, otherwise the client address as DRF's throttles
+see it: REMOTE_ADDR, or X-Forwarded-For behind REST_FRAMEWORK["NUM_PROXIES"]
+trusted proxies).
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Tuple
+
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_ANON = BaseThrottle()
+
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """'30/min' -> (30, 60). Empty/invalid means no limit: (0, 0)."""
+    try:
+        num, period = (rate or "").split("/")
+        return int(num), _PERIODS[period.strip()[0].lower()]
+    except (ValueError, KeyError, IndexError):
+        return 0, 0
+
+
+def client_ident(request) -> str:
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    # X-Forwarded-For is client-controlled: only the hops our own proxies
+    # appended are trusted (NUM_PROXIES, 0 = REMOTE_ADDR)
+    return f"ip:{_ANON.get_ident(request)}"
+
+
+def allow_request(request, scope: str, rate: str) -> Tuple[bool, int]:
+    """Count this request against `rate` for the client. Returns (allowed, retry_after_seconds)."""
+    limit, window = parse_rate(rate)
+    if not limit:
+        return True, 0
+    now = time.time()
+    bucket = int(now // window)
+    key = f"throttle:{scope}:{client_ident(request)}:{bucket}"
+    try:
+        cache.add(key, 0, window)
+        count = cache.incr(key)
+    except Exception as e:
+        # Throttling is a guard, not a dependency: fail open
+        logger.info("Throttle %s unavailable: %s", scope, e)
+        return True, 0
+    if count > limit:
+        return False, max(1, int((bucket + 1) * window - now))
+    return True, 0
@@ -1,9 +1,11 @@
 # coupons/urls.py
 from django.urls import path
 from .views import validate_coupon, apply_coupon_to_session, apply_coupon_to_order_view
+from .views_bulk import CouponBatchAPIView
 
 urlpatterns = [
     path("validate/", validate_coupon, name="coupon_validate"),
     path("apply/", apply_coupon_to_session, name="coupon_apply_session"),
     path("apply-to-order/", apply_coupon_to_order_view, name="coupon_apply_order"),
+    path("bulk/", CouponBatchAPIView.as_view(), name="coupon_bulk_generate"),
 ]
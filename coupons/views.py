@@ -1,17 +1,24 @@
 from __future__ import annotations
 
 import json
+from django.conf import settings
 from django.views.decorators.http import require_GET, require_POST
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404
 
 from .services import find_active_coupon, compute_discount_for_order
+from .throttle import allow_request
 from orders.models import Order
 
 
 @require_GET
 def validate_coupon(request):
+    allowed, retry_after = allow_request(request, "coupon_validate", getattr(settings, "COUPON_VALIDATE_RATE", "30/min"))
+    if not allowed:
+        resp = JsonResponse({"valid": False, "message": "Too many attempts, try again shortly."}, status=429)
+        resp["Retry-After"] = str(retry_after)
+        return resp
     code = (request.GET.get("code") or "").strip()
     c = find_active_coupon(code)
     if c:
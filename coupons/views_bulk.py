@@ -0,0 +1,51 @@
+# coupons/views_bulk.py
+from __future__ import annotations
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .generator import DEFAULT_PATTERN, CouponBatchSpec, iter_coupon_csv
+
+
+def _when(value):
+    if not value:
+        return None
+    dt = parse_datetime(value)
+    if dt is None:
+        raise ValueError(f"Invalid datetime: {value!r}")
+    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+
+class CouponBatchAPIView(APIView):
+    """
+    POST /coupons/bulk/
+      {"count": 50000, "percent": 15, "pattern": "SPRING-####-####",
+       "max_uses": 1, "valid_from": "...", "valid_to": "..."}
+    Streams back the new codes as CSV while they are inserted.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        data = request.data
+        try:
+            max_uses = data.get("max_uses", 1)
+            spec = CouponBatchSpec(
+                count=int(data.get("count") or 0),
+                percent=int(data.get("percent") or 0),
+                pattern=data.get("pattern") or DEFAULT_PATTERN,
+                max_uses=int(max_uses) if max_uses not in (None, "", 0, "0") else None,
+                valid_from=_when(data.get("valid_from")),
+                valid_to=_when(data.get("valid_to")),
+                created_by=request.user,
+            )
+        except (TypeError, ValueError) as e:
+            return Response({"detail": str(e)}, status=400)
+
+        response = StreamingHttpResponse(iter_coupon_csv(spec), content_type="text/csv")
+        stamp = timezone.now().strftime("%Y%m%d-%H%M%S")
+        response["Content-Disposition"] = f'attachment; filename="coupons-{stamp}.csv"'
+        return response
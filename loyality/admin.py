@@ -0,0 +1,26 @@
+from __future__ import annotations
+from django.contrib import admin
+from .models import LoyaltyLedgerEntry, LoyaltyProgress
+
+
+@admin.register(LoyaltyLedgerEntry)
+class LoyaltyLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ("occurred_at", "user", "kind", "amount", "order_id", "reward")
+    list_filter = ("kind", "occurred_at")
+    search_fields = ("user__username", "user__email", "order_id")
+    raw_id_fields = ("user", "reward")
+    date_hierarchy = "occurred_at"
+
+    # Append-only: the history is what disputes are settled from
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LoyaltyProgress)
+class LoyaltyProgressAdmin(admin.ModelAdmin):
+    list_display = ("user", "total_tip", "last_updated")
+    search_fields = ("user__username", "user__email")
+    readonly_fields = ("user", "total_tip", "last_updated")
@@ -0,0 +1,12 @@
+# FILE: loyalty/apps.py
+from django.apps import AppConfig
+
+
+class LoyalityConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "loyality"
+    verbose_name = "Loyalty"
+
+    def ready(self):
+        # drop the cached LoyaltyConfig on save/delete
+        from . import signals  # noqa
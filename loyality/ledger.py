@@ -0,0 +1,221 @@
+# FILE: loyalty/ledger.py
+"""
+Loyalty ledger: append-only entries plus the balances materialized from them.
+
+Every change to a user's tip balance is a LoyaltyLedgerEntry, written in
+the same transaction as the LoyaltyProgress row that holds the running
+sum. Reading a balance is then one indexed row (get_balance). The
+entries are the source of truth and can always rebuild the balances:
+
+    rebuild_balances()   # per chunk of users: lock balances, one grouped SUM
+    expire_accruals()    # batched; scheduled by loyality.tasks
+
+Expiry: once LOYALTY_ACCRUAL_EXPIRY_DAYS have passed, tips that were
+neither redeemed nor already expired are taken off the balance by an
+EXPIRE entry. Its covers_until marks how far it reached, so the next run
+starts from there.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import DateTimeField, Exists, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import LoyaltyLedgerEntry, LoyaltyProgress, LoyaltyReward
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal("0.00")
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def credit_balance(user_id: int, amount: Decimal) -> None:
+    """Add `amount` (may be negative) to the materialized balance: UPDATE ... SET total_tip = total_tip + x."""
+    now = timezone.now()
+    if LoyaltyProgress.objects.filter(user_id=user_id).update(total_tip=F("total_tip") + amount, last_updated=now):
+        return
+    try:
+        with transaction.atomic():
+            LoyaltyProgress.objects.create(user_id=user_id, total_tip=amount)
+    except IntegrityError:
+        # A concurrent first entry created the row: add to it instead
+        LoyaltyProgress.objects.filter(user_id=user_id).update(total_tip=F("total_tip") + amount, last_updated=now)
+
+
+def get_balance(user) -> Decimal:
+    """Current tip balance: a single indexed lookup, no ledger scan."""
+    user_id = getattr(user, "pk", user)
+    return LoyaltyProgress.objects.filter(user_id=user_id).values_list("total_tip", flat=True).first() or ZERO
+
+
+def history(user):
+    """The user's ledger, oldest first."""
+    return LoyaltyLedgerEntry.objects.filter(user_id=getattr(user, "pk", user)).select_related("reward")
+
+
+def grant_due_rewards(cfg, user_ids: Optional[Iterable[int]] = None, batch_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Create a reward, plus its GRANT entry, for every user at the threshold without an unredeemed reward."""
+    due = LoyaltyProgress.objects.filter(total_tip__gte=cfg.threshold_tip_total).exclude(
+        Exists(LoyaltyReward.objects.filter(user_id=OuterRef("user_id"), is_redeemed=False))
+    )
+    if user_ids is not None:
+        due = due.filter(user_id__in=list(user_ids))
+    rewards = LoyaltyReward.objects.bulk_create(
+        [
+            LoyaltyReward(user_id=uid, reward_type=cfg.reward_type, reward_amount=cfg.reward_amount)
+            for uid in due.values_list("user_id", flat=True)
+        ],
+        batch_size=batch_size,
+    )
+    LoyaltyLedgerEntry.objects.bulk_create(
+        [LoyaltyLedgerEntry(user_id=r.user_id, kind=LoyaltyLedgerEntry.KIND_GRANT, reward=r) for r in rewards],
+        batch_size=batch_size,
+    )
+    return len(rewards)
+
+
+def seed_opening_balances(batch_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Record an OPENING entry for balances that predate the ledger (non-zero, no entries yet)."""
+    rows = list(
+        LoyaltyProgress.objects.exclude(total_tip=0)
+        .exclude(Exists(LoyaltyLedgerEntry.objects.filter(user_id=OuterRef("user_id"))))
+        .values_list("user_id", "total_tip")
+    )
+    LoyaltyLedgerEntry.objects.bulk_create(
+        [LoyaltyLedgerEntry(user_id=uid, kind=LoyaltyLedgerEntry.KIND_OPENING, amount=total) for uid, total in rows],
+        batch_size=batch_size,
+    )
+    return len(rows)
+
+
+def rebuild_balances(
+    user_ids: Optional[Iterable[int]] = None, chunk_size: int = DEFAULT_CHUNK_SIZE, write: bool = True,
+) -> dict:
+    """
+    Replay the ledger into LoyaltyProgress, one chunk of users at a time
+    (keyset-paged by user id). Each chunk is one transaction: the stored
+    balances are locked first, then a grouped SUM(amount) is compared with
+    them and the ones that drifted are corrected. A credit running
+    concurrently either committed before the SUM (so it is counted) or
+    waits on the lock and adds onto the corrected value; missing rows are
+    only inserted, never overwritten. Returns {"users": replayed, "drifted": corrected}.
+    """
+    entries = LoyaltyLedgerEntry.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=list(user_ids))
+    stats = {"users": 0, "drifted": 0}
+    last = 0
+    while True:
+        chunk = list(
+            entries.filter(user_id__gt=last).order_by("user_id")
+            .values_list("user_id", flat=True).distinct()[:chunk_size]
+        )
+        if not chunk:
+            return stats
+        last = chunk[-1]
+        with transaction.atomic():
+            progress = LoyaltyProgress.objects.filter(user_id__in=chunk)
+            if write:
+                progress = progress.select_for_update()
+            stored = {uid: (pk, total) for pk, uid, total in progress.values_list("pk", "user_id", "total_tip")}
+            sums = (
+                entries.filter(user_id__in=chunk).values("user_id")
+                .annotate(total=Sum("amount")).values_list("user_id", "total").order_by()
+            )
+            drifted = [(uid, total) for uid, total in sums if stored.get(uid, (None, None))[1] != total]
+            stats["users"] += len(chunk)
+            stats["drifted"] += len(drifted)
+            if drifted and write:
+                now = timezone.now()
+                LoyaltyProgress.objects.bulk_update(
+                    [
+                        LoyaltyProgress(pk=stored[uid][0], user_id=uid, total_tip=total, last_updated=now)
+                        for uid, total in drifted if uid in stored
+                    ],
+                    ["total_tip", "last_updated"],
+                )
+                # A row created meanwhile already holds its credit; leave it to the next run
+                LoyaltyProgress.objects.bulk_create(
+                    [
+                        LoyaltyProgress(user_id=uid, total_tip=total, last_updated=now)
+                        for uid, total in drifted if uid not in stored
+                    ],
+                    ignore_conflicts=True,
+                )
+                logger.info("Loyalty rebuild corrected %d balance(s)", len(drifted))
+
+
+def expire_accruals(now=None, days: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Append EXPIRE entries for tips older than `days` (default
+    LOYALTY_ACCRUAL_EXPIRY_DAYS; 0 = never). Each chunk of users costs one
+    grouped query, a locked read of their balances and two bulk writes.
+    """
+    days = int(getattr(settings, "LOYALTY_ACCRUAL_EXPIRY_DAYS", 0) if days is None else days)
+    stats = {"users": 0, "amount": ZERO}
+    if days <= 0:
+        return stats
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=days)
+
+    def last(kind, column):
+        return Coalesce(
+            Subquery(
+                LoyaltyLedgerEntry.objects.filter(user_id=OuterRef("user_id"), kind=kind)
+                .values("user_id").annotate(m=Max(column)).values("m")[:1]
+            ),
+            Value(EPOCH, output_field=DateTimeField()),
+        )
+
+    # Tips before the user's last redemption were consumed by it
+    expirable = (
+        LoyaltyLedgerEntry.objects
+        .filter(kind__in=[LoyaltyLedgerEntry.KIND_ACCRUE, LoyaltyLedgerEntry.KIND_OPENING], occurred_at__lte=cutoff)
+        .alias(boundary=Greatest(
+            last(LoyaltyLedgerEntry.KIND_REDEEM, "occurred_at"),
+            last(LoyaltyLedgerEntry.KIND_EXPIRE, "covers_until"),
+        ))
+        .filter(occurred_at__gt=F("boundary"))
+    )
+    last_user = 0
+    while True:
+        users = list(
+            LoyaltyProgress.objects.filter(total_tip__gt=0, user_id__gt=last_user)
+            .order_by("user_id").values_list("user_id", flat=True)[:chunk_size]
+        )
+        if not users:
+            return stats
+        last_user = users[-1]
+        due = dict(
+            expirable.filter(user_id__in=users).values("user_id")
+            .annotate(total=Sum("amount")).values_list("user_id", "total").order_by()
+        )
+        if not due:
+            continue
+        with transaction.atomic():
+            balances = list(LoyaltyProgress.objects.select_for_update().filter(user_id__in=list(due)).order_by("user_id"))
+            entries = []
+            for prog in balances:
+                amount = min(due[prog.user_id], prog.total_tip)
+                if amount <= 0:
+                    continue
+                entries.append(LoyaltyLedgerEntry(
+                    user_id=prog.user_id, kind=LoyaltyLedgerEntry.KIND_EXPIRE, amount=-amount,
+                    occurred_at=now, covers_until=cutoff,
+                ))
+                prog.total_tip -= amount
+                prog.last_updated = now
+                stats["amount"] += amount
+            LoyaltyLedgerEntry.objects.bulk_create(entries)
+            LoyaltyProgress.objects.bulk_update(
+                [p for p in balances if p.last_updated == now], ["total_tip", "last_updated"],
+            )
+            stats["users"] += len(entries)
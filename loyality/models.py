@@ -29,6 +29,12 @@ class LoyaltyConfig(models.Model):
 
 
 class LoyaltyProgress(models.Model):
+    """
+    Materialized tip balance per user: the sum of the user's
+    LoyaltyLedgerEntry amounts. Only loyality.services writes it, in the
+    same transaction as the ledger entry. rebuild_loyalty_balances
+    recomputes it from the ledger.
+    """
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="loyalty_progress")
     total_tip = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     last_updated = models.DateTimeField(auto_now=True)
@@ -36,9 +42,6 @@ class LoyaltyProgress(models.Model):
     def __str__(self):
         return f"{self.user} – tipped {self.total_tip}"
 
-    def reset(self):
-        self.total_tip = Decimal("0.00")
-        self.save(update_fields=["total_tip"])
 
 
 class LoyaltyReward(models.Model):
@@ -60,11 +63,67 @@ class LoyaltyReward(models.Model):
         return f"{self.user} reward {self.reward_type} {self.reward_amount} redeemed={self.is_redeemed}"
 
     def as_discount_amount(self, subtotal):
-        from decimal import Decimal
+        from core.money import Money
+        subtotal = Money.of(subtotal)
         if self.reward_type == self.TYPE_PERCENT:
-            disc = (subtotal * (self.reward_amount / Decimal("100"))).quantize(Decimal("0.01"))
+            disc = subtotal.percent(self.reward_amount)
         else:
-            disc = Decimal(str(self.reward_amount)).quantize(Decimal("0.01"))
-        if disc > subtotal:
-            disc = subtotal
-        return disc
+            disc = Money.of(self.reward_amount)
+        return disc.clamp(high=subtotal).to_decimal()
+
+
+class LoyaltyLedgerEntry(models.Model):
+    """
+    Append-only history of everything that happened to a user's loyalty.
+    `amount` is the entry's effect on the tip balance. GRANT, RESERVE and
+    RELEASE only record what happened to a reward and carry no amount.
+    """
+    KIND_OPENING = "OPENING"
+    KIND_ACCRUE = "ACCRUE"
+    KIND_GRANT = "GRANT"
+    KIND_RESERVE = "RESERVE"
+    KIND_RELEASE = "RELEASE"
+    KIND_REDEEM = "REDEEM"
+    KIND_EXPIRE = "EXPIRE"
+    KINDS = [
+        (KIND_OPENING, "Opening balance"),
+        (KIND_ACCRUE, "Tip accrued"),
+        (KIND_GRANT, "Reward granted"),
+        (KIND_RESERVE, "Reward reserved"),
+        (KIND_RELEASE, "Reward released"),
+        (KIND_REDEEM, "Reward redeemed"),
+        (KIND_EXPIRE, "Tips expired"),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="loyalty_ledger")
+    kind = models.CharField(max_length=8, choices=KINDS)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    order_id = models.IntegerField(null=True, blank=True)
+    reward = models.ForeignKey(LoyaltyReward, null=True, blank=True, on_delete=models.SET_NULL, related_name="ledger_entries")
+    occurred_at = models.DateTimeField(default=timezone.now)
+    # EXPIRE only: accruals that happened up to this moment are expired
+    covers_until = models.DateTimeField(null=True, blank=True)
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["occurred_at", "id"]
+        indexes = [
+            models.Index(fields=["user", "kind", "occurred_at"]),
+        ]
+        constraints = [
+            # A paid order accrues once, however often order.paid is delivered
+            models.UniqueConstraint(
+                fields=["order_id"], condition=models.Q(kind="ACCRUE"), name="loyalty_ledger_one_accrual_per_order",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.kind} {self.amount}"
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("Ledger entries are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries are append-only.")
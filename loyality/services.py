@@ -1,54 +1,215 @@
 # FILE: loyalty/services.py
 from __future__ import annotations
 
+import logging
 from decimal import Decimal
 from typing import Optional
 from django.utils import timezone
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef
 
-from .models import LoyaltyConfig, LoyaltyProgress, LoyaltyReward
+from core.versioned_cache import VersionedCache
+from .ledger import credit_balance, grant_due_rewards, rebuild_balances
+from .models import LoyaltyConfig, LoyaltyLedgerEntry, LoyaltyProgress, LoyaltyReward
 
+logger = logging.getLogger(__name__)
 
-def add_tip_and_maybe_grant(user, tip_amount: Decimal):
+CONFIG_VERSION_KEY = "loyalty:config_version"
+
+# Process-local LoyaltyConfig; saving the config bumps the shared token once
+# the change commits (loyality.signals) and every process reloads on its next
+# accrual. LOYALTY_CONFIG_TTL is a backstop.
+_config = VersionedCache(CONFIG_VERSION_KEY, lambda _key: LoyaltyConfig.get_solo(), ttl_setting="LOYALTY_CONFIG_TTL")
+
+
+def get_config() -> LoyaltyConfig:
+    """The loyalty configuration; treat it as read-only (it is shared)."""
+    return _config.get()
+
+
+def invalidate_config() -> None:
+    """Drop the cached configuration everywhere (call after the change commits)."""
+    _config.bump()
+
+
+def _record_accrual(user_id: int, tip_amount: Decimal, order) -> bool:
+    """Append the ACCRUE entry; False if this order already accrued."""
+    try:
+        with transaction.atomic():
+            LoyaltyLedgerEntry.objects.create(
+                user_id=user_id, kind=LoyaltyLedgerEntry.KIND_ACCRUE, amount=tip_amount,
+                order_id=getattr(order, "pk", None),
+            )
+        return True
+    except IntegrityError:
+        logger.info("Loyalty: order %s already accrued", getattr(order, "pk", None))
+        return False
+
+
+def _grant_if_due(user_id: int, cfg: LoyaltyConfig) -> bool:
+    due = LoyaltyProgress.objects.filter(
+        user_id=user_id, total_tip__gte=cfg.threshold_tip_total
+    ).exclude(
+        Exists(LoyaltyReward.objects.filter(user_id=OuterRef("user_id"), is_redeemed=False))
+    ).exists()
+    if due:
+        reward = LoyaltyReward.objects.create(user_id=user_id, reward_type=cfg.reward_type, reward_amount=cfg.reward_amount)
+        LoyaltyLedgerEntry.objects.create(user_id=user_id, kind=LoyaltyLedgerEntry.KIND_GRANT, reward=reward)
+    return due
+
+
+def add_tip_and_maybe_grant(user, tip_amount: Decimal, order=None):
+    """
+    Add a paid order's tip to the user's balance and grant a reward once
+    the threshold is reached. The ACCRUE ledger entry, the balance
+    increment and the threshold check share one transaction. The increment
+    holds the balance row lock until commit, so concurrent accruals for one
+    user queue up and cannot both grant. A given order accrues only once.
+    """
     if not user or not user.is_authenticated:
         return
-    cfg = LoyaltyConfig.get_solo()
-    prog, _ = LoyaltyProgress.objects.get_or_create(user=user)
-    prog.total_tip = (prog.total_tip or Decimal("0.00")) + (tip_amount or Decimal("0.00"))
-    prog.save(update_fields=["total_tip"])
-    if prog.total_tip >= cfg.threshold_tip_total:
-        has_unredeemed = LoyaltyReward.objects.filter(user=user, is_redeemed=False).exists()
-        if not has_unredeemed:
-            LoyaltyReward.objects.create(
-                user=user,
-                reward_type=cfg.reward_type,
-                reward_amount=cfg.reward_amount,
-            )
+    tip_amount = Decimal(tip_amount or 0)
+    if tip_amount <= 0:
+        return
+    cfg = get_config()
+    with transaction.atomic():
+        if not _record_accrual(user.pk, tip_amount, order):
+            return
+        credit_balance(user.pk, tip_amount)
+        _grant_if_due(user.pk, cfg)
 
 def get_available_reward_for_user(user) -> Optional[LoyaltyReward]:
     if not user or not user.is_authenticated:
         return None
     return LoyaltyReward.objects.filter(user=user, is_redeemed=False, reserved_order_id__isnull=True).order_by("created_at").first()
 
-@transaction.atomic
-def reserve_reward_for_order(reward: LoyaltyReward, order):
-    if reward.reserved_order_id:
-        return
-    reward.reserved_order_id = order.id
-    reward.save(update_fields=["reserved_order_id"])
+def reserve_reward_for_order(reward: LoyaltyReward, order) -> bool:
+    """
+    Reserve `reward` for `order` with one conditional UPDATE; False if it
+    was redeemed or reserved for another order meanwhile. Two checkouts
+    racing for the same reward cannot both win.
+    """
+    with transaction.atomic():
+        won = LoyaltyReward.objects.filter(
+            pk=reward.pk, is_redeemed=False, reserved_order_id__isnull=True
+        ).update(reserved_order_id=order.id)
+        if not won:
+            return False
+        reward.reserved_order_id = order.id
+        LoyaltyLedgerEntry.objects.create(
+            user_id=reward.user_id, kind=LoyaltyLedgerEntry.KIND_RESERVE, reward=reward, order_id=order.id,
+        )
+    return True
+
+
+def claim_reward_for_order(user, order) -> Optional[LoyaltyReward]:
+    """
+    The reward this order may use: the one already reserved for it (a
+    repeated checkout of the same order), else the user's oldest free
+    reward. Candidates another checkout has locked are skipped, never
+    waited on (SKIP LOCKED). The conditional UPDATE in
+    reserve_reward_for_order() is the final guard.
+    """
+    if not user or not user.is_authenticated or not order.pk:
+        return None
+    held = LoyaltyReward.objects.filter(user=user, reserved_order_id=order.id, is_redeemed=False).first()
+    if held:
+        return held
+    with transaction.atomic():
+        reward = (
+            LoyaltyReward.objects.select_for_update(skip_locked=True)
+            .filter(user=user, is_redeemed=False, reserved_order_id__isnull=True)
+            .order_by("created_at").first()
+        )
+        if reward and reserve_reward_for_order(reward, order):
+            return reward
+    return None
+
+
+def release_reward_for_order(order) -> int:
+    """Free any unredeemed reward held by `order` (e.g. its checkout expired)."""
+    with transaction.atomic():
+        held = list(
+            LoyaltyReward.objects.select_for_update()
+            .filter(reserved_order_id=order.id, is_redeemed=False)
+        )
+        if not held:
+            return 0
+        LoyaltyReward.objects.filter(pk__in=[r.pk for r in held]).update(reserved_order_id=None)
+        LoyaltyLedgerEntry.objects.bulk_create([
+            LoyaltyLedgerEntry(user_id=r.user_id, kind=LoyaltyLedgerEntry.KIND_RELEASE, reward=r, order_id=order.id)
+            for r in held
+        ])
+    return len(held)
 
 @transaction.atomic
 def redeem_reserved_reward_if_any(order):
+    """Mark the order's reward redeemed; redeeming consumes the whole tip balance."""
     if not (order and order.created_by_id):
         return
     reward = LoyaltyReward.objects.filter(user=order.created_by, reserved_order_id=order.id, is_redeemed=False).first()
     if not reward:
         return
-    reward.is_redeemed = True
-    reward.redeemed_at = timezone.now()
-    reward.save(update_fields=["is_redeemed","redeemed_at"])
-    try:
-        prog = order.created_by.loyalty_progress
-    except LoyaltyProgress.DoesNotExist:
+    now = timezone.now()
+    if not LoyaltyReward.objects.filter(pk=reward.pk, is_redeemed=False).update(is_redeemed=True, redeemed_at=now):
         return
-    prog.reset()
+    user_id = order.created_by_id
+    balance = (
+        LoyaltyProgress.objects.select_for_update().filter(user_id=user_id)
+        .values_list("total_tip", flat=True).first()
+    ) or Decimal("0.00")
+    LoyaltyLedgerEntry.objects.create(
+        user_id=user_id, kind=LoyaltyLedgerEntry.KIND_REDEEM, amount=-balance,
+        reward=reward, order_id=order.id, occurred_at=now,
+    )
+    if balance:
+        credit_balance(user_id, -balance)
+
+
+def backfill_progress(since=None, write: bool = True, batch_size: int = 1000) -> dict:
+    """
+    Seed the ledger from paid orders for users who have no loyalty history
+    yet, then materialize their balances and grant the rewards that are
+    due. Only orders from the user's last redeemed one onward count, which
+    matches what live accrual would have left. Users who already have
+    ledger entries are skipped, so running it again changes nothing.
+    """
+    from django.db.models import Subquery, Sum
+    from django.db.models.functions import Coalesce
+    from orders.models import Order
+
+    last_redeemed = (
+        LoyaltyReward.objects.filter(user_id=OuterRef("created_by_id"), is_redeemed=True, reserved_order_id__isnull=False)
+        .order_by("-redeemed_at", "-pk").values("reserved_order_id")[:1]
+    )
+    paid = Order.objects.paid().filter(created_by__isnull=False, tip_amount__gt=0)
+    if since:
+        paid = paid.filter(created_at__date__gte=since)
+    paid = (
+        paid.exclude(Exists(LoyaltyLedgerEntry.objects.filter(user_id=OuterRef("created_by_id"))))
+        .alias(cutoff=Coalesce(Subquery(last_redeemed), 0))
+        .filter(pk__gte=F("cutoff"))
+    )
+    totals = list(
+        paid.values("created_by_id").annotate(total=Sum("tip_amount"))
+        .values_list("created_by_id", "total").order_by()
+    )
+    cfg = get_config()
+    stats = {"users": len(totals), "tips": sum((t for _, t in totals), Decimal("0.00")), "rewards": 0}
+    if not write:
+        holding = set(LoyaltyReward.objects.filter(is_redeemed=False).values_list("user_id", flat=True))
+        stats["rewards"] = sum(1 for uid, t in totals if t >= cfg.threshold_tip_total and uid not in holding)
+        return stats
+
+    rows = list(paid.values_list("pk", "created_by_id", "tip_amount", "created_at").order_by("pk"))
+    with transaction.atomic():
+        LoyaltyLedgerEntry.objects.bulk_create(
+            [
+                LoyaltyLedgerEntry(user_id=uid, kind=LoyaltyLedgerEntry.KIND_ACCRUE, amount=tip, order_id=pk, occurred_at=at)
+                for pk, uid, tip, at in rows
+            ],
+            batch_size=batch_size, ignore_conflicts=True,
+        )
+        rebuild_balances(user_ids=[uid for uid, _ in totals], chunk_size=batch_size)
+        stats["rewards"] = grant_due_rewards(cfg, batch_size=batch_size)
+    return stats
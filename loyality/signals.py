@@ -0,0 +1,15 @@
+# FILE: loyalty/signals.py
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import LoyaltyConfig
+from .services import invalidate_config
+
+
+@receiver(post_save, sender=LoyaltyConfig)
+@receiver(post_delete, sender=LoyaltyConfig)
+def invalidate_cached_config(sender, instance: LoyaltyConfig, **kwargs):
+    transaction.on_commit(invalidate_config)
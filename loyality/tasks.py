@@ -0,0 +1,12 @@
+# FILE: loyalty/tasks.py
+from __future__ import annotations
+from celery import shared_task
+
+from .ledger import expire_accruals
+
+
+@shared_task
+def expire_loyalty_accruals() -> str:
+    """Expire tips older than LOYALTY_ACCRUAL_EXPIRY_DAYS, in batches (no-op when 0)."""
+    stats = expire_accruals()
+    return f"{stats['users']} user(s), {stats['amount']} expired"
@@ -0,0 +1,102 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from orders.models import Order
+
+from .ledger import expire_accruals, rebuild_balances
+from .models import LoyaltyLedgerEntry, LoyaltyProgress
+from .services import backfill_progress
+
+ACCRUE, REDEEM, EXPIRE = LoyaltyLedgerEntry.KIND_ACCRUE, LoyaltyLedgerEntry.KIND_REDEEM, LoyaltyLedgerEntry.KIND_EXPIRE
+
+
+def _entry(user, kind, amount, at=None):
+    return LoyaltyLedgerEntry.objects.create(user=user, kind=kind, amount=Decimal(amount), occurred_at=at or timezone.now())
+
+
+def _balance(user):
+    return LoyaltyProgress.objects.get(user=user).total_tip
+
+
+class BackfillProgressTests(TestCase):
+    def test_orders_paid_through_mark_paid_are_seeded(self):
+        from payments.services import mark_paid
+
+        user = get_user_model().objects.create_user(username="regular")
+        paid = Order.objects.create(created_by=user, source="UBER_EATS", tip_amount="7.50")
+        Order.objects.create(created_by=user, source="UBER_EATS", tip_amount="3.00")
+        mark_paid(paid, session_id="cs_paid")
+        LoyaltyLedgerEntry.objects.all().delete()
+
+        stats = backfill_progress()
+
+        self.assertEqual(stats["users"], 1)
+        self.assertEqual(stats["tips"], Decimal("7.50"))
+        self.assertEqual(
+            list(LoyaltyLedgerEntry.objects.values_list("order_id", "kind")),
+            [(paid.pk, LoyaltyLedgerEntry.KIND_ACCRUE)],
+        )
+        self.assertEqual(LoyaltyProgress.objects.get(user=user).total_tip, Decimal("7.50"))
+
+
+class RebuildBalancesTests(TestCase):
+    def setUp(self):
+        users = get_user_model().objects
+        self.drifted, self.missing, self.ok = (users.create_user(username=n) for n in ("drifted", "missing", "ok"))
+        for user, amounts in ((self.drifted, ("10.00", "5.00")), (self.missing, ("3.00",)), (self.ok, ("4.00",))):
+            for amount in amounts:
+                _entry(user, ACCRUE, amount)
+        LoyaltyProgress.objects.create(user=self.drifted, total_tip=Decimal("12.00"))
+        LoyaltyProgress.objects.create(user=self.ok, total_tip=Decimal("4.00"))
+
+    def test_dry_run_reports_drift_without_writing(self):
+        self.assertEqual(rebuild_balances(write=False), {"users": 3, "drifted": 2})
+        self.assertEqual(_balance(self.drifted), Decimal("12.00"))
+        self.assertFalse(LoyaltyProgress.objects.filter(user=self.missing).exists())
+
+    def test_drifted_and_missing_balances_are_repaired_chunk_by_chunk(self):
+        self.assertEqual(rebuild_balances(chunk_size=1), {"users": 3, "drifted": 2})
+        self.assertEqual(
+            [_balance(u) for u in (self.drifted, self.missing, self.ok)],
+            [Decimal("15.00"), Decimal("3.00"), Decimal("4.00")],
+        )
+        self.assertEqual(rebuild_balances(), {"users": 3, "drifted": 0})
+
+
+class ExpireAccrualsTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = get_user_model().objects.create_user(username="regular")
+
+        def ago(days):
+            return self.now - timedelta(days=days)
+
+        _entry(self.user, ACCRUE, "10.00", ago(60))
+        _entry(self.user, REDEEM, "-10.00", ago(50))
+        _entry(self.user, ACCRUE, "2.00", ago(50))  # on the redemption boundary, not after it
+        _entry(self.user, ACCRUE, "7.00", ago(40))
+        _entry(self.user, ACCRUE, "5.00", ago(10))
+        LoyaltyProgress.objects.create(user=self.user, total_tip=Decimal("14.00"))
+
+    def _expired(self):
+        return list(
+            LoyaltyLedgerEntry.objects.filter(user=self.user, kind=EXPIRE).values_list("amount", "covers_until")
+        )
+
+    def test_only_tips_after_the_last_redemption_expire(self):
+        self.assertEqual(expire_accruals(now=self.now, days=30), {"users": 1, "amount": Decimal("7.00")})
+        self.assertEqual(self._expired(), [(Decimal("-7.00"), self.now - timedelta(days=30))])
+        self.assertEqual(_balance(self.user), Decimal("7.00"))
+
+    def test_next_run_starts_where_the_last_expiry_reached(self):
+        expire_accruals(now=self.now, days=30)
+        self.assertEqual(expire_accruals(now=self.now + timedelta(days=1), days=30)["users"], 0)
+
+        later = self.now + timedelta(days=25)
+        self.assertEqual(expire_accruals(now=later, days=30), {"users": 1, "amount": Decimal("5.00")})
+        self.assertEqual(_balance(self.user), Decimal("2.00"))
+        self.assertEqual(rebuild_balances(), {"users": 1, "drifted": 0})
@@ -1,11 +1,11 @@
 from __future__ import annotations
 
 import csv
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.http import HttpResponse
 from django.utils.html import format_html
 
-from .models import Order, OrderItem
+from .models import Order, OrderItem, Ticket
 
 # Optional Payment inline
 try:
@@ -75,7 +75,7 @@ class OrderAdmin(admin.ModelAdmin):
         return "-"
     invoice_link.short_description = "Invoice"
 
-    actions = ["export_sales_csv"]
+    actions = ["export_sales_csv", "export_invoices_zip", "export_invoices_pdf"]
 
     def export_sales_csv(self, request, queryset):
         response = HttpResponse(content_type="text/csv")
@@ -102,3 +102,28 @@ class OrderAdmin(admin.ModelAdmin):
             ])
         return response
     export_sales_csv.short_description = "Export Sales (CSV)"
+
+    def _export_invoices(self, request, queryset, kind):
+        from payments.invoice_export import invoice_export_response
+        try:
+            return invoice_export_response(queryset.order_by("id"), kind=kind)
+        except ValueError as e:
+            self.message_user(request, str(e), level=messages.WARNING)
+            return None
+
+    def export_invoices_zip(self, request, queryset):
+        return self._export_invoices(request, queryset, "zip")
+    export_invoices_zip.short_description = "Export invoices (ZIP)"
+
+    def export_invoices_pdf(self, request, queryset):
+        return self._export_invoices(request, queryset, "pdf")
+    export_invoices_pdf.short_description = "Export invoices (single PDF)"
+
+
+@admin.register(Ticket)
+class TicketAdmin(admin.ModelAdmin):
+    list_display = ("ticket_number", "order", "location", "station", "status", "seq", "created_at")
+    list_filter = ("status", "station", "location")
+    search_fields = ("ticket_number", "=order__id")
+    raw_id_fields = ("order",)
+    readonly_fields = ("seq", "items_snapshot", "created_at", "updated_at")
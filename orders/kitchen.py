@@ -0,0 +1,179 @@
+# orders/kitchen.py
+"""
+Kitchen order tickets (KOT) and the realtime kitchen display feed.
+
+- create_ticket_for_order() snapshots the order's items into one Ticket per
+  station (idempotent) — called on placement and from the order.paid outbox.
+- Every create/status change takes the next value of its location's
+  counter (KitchenSequence, next_sync_seq). The counter row stays locked
+  until the transaction commits, so per location seq order is commit order
+  and "seq > N" never skips a change. Locations never wait on each other.
+- Tickets are written in a transaction of their own (place_order creates
+  the ticket once the order has committed), so that lock is held only for
+  the ticket write and the ticket is pushed as soon as it commits to the
+  location's websocket group (orders.consumers.OrderConsumer). Reconnecting
+  screens catch up through the delta endpoint (orders.views_kitchen) with
+  ?since=<last seq>.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import KitchenSequence, Order, Ticket
+
+logger = logging.getLogger(__name__)
+
+TICKET_NUMBER_PREFIX = "KOT"
+
+
+def group_name(location_id) -> str:
+    # Same naming as OrderConsumer.connect
+    return f"loc_{location_id or 'default'}_orders"
+
+
+def _default_location_id() -> Optional[int]:
+    return getattr(settings, "KITCHEN_LOCATION_ID", None) or None
+
+
+def _bump(location_id: Optional[int], **increments) -> tuple:
+    """Add `increments` to the location's counters (row locked until commit); returns the new values."""
+    key = location_id or 0
+    fields = list(increments)
+    rows = KitchenSequence.objects.filter(location_key=key)
+    if not rows.update(**{name: F(name) + step for name, step in increments.items()}):
+        try:
+            with transaction.atomic():
+                KitchenSequence.objects.create(location_key=key)
+        except IntegrityError:
+            pass  # created concurrently
+        rows.update(**{name: F(name) + step for name, step in increments.items()})
+    return rows.values_list(*fields).get()
+
+
+def next_sync_seq(location_id: Optional[int] = None) -> int:
+    """Must be called inside the transaction that writes the ticket."""
+    return _bump(location_id, last_seq=1)[0]
+
+
+def _next_seq_and_number(location_id: Optional[int]) -> tuple:
+    seq, number = _bump(location_id, last_seq=1, last_ticket_number=1)
+    return seq, f"{TICKET_NUMBER_PREFIX}-{number:06d}"
+
+
+def serialize_ticket(ticket: Ticket) -> dict:
+    return {
+        "id": ticket.pk,
+        "seq": ticket.seq,
+        "order_id": ticket.order_id,
+        "location_id": ticket.location_id,
+        "station": ticket.station,
+        "ticket_number": ticket.ticket_number,
+        "status": ticket.status,
+        "table_number": ticket.order.table_number,
+        "items": ticket.items_snapshot,
+        "created_at": ticket.created_at.isoformat() if ticket.created_at else None,
+        "updated_at": ticket.updated_at.isoformat() if ticket.updated_at else None,
+    }
+
+
+def _broadcast(payload: dict) -> None:
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        async_to_sync(layer.group_send)(
+            group_name(payload.get("location_id")),
+            {"type": "order.event", "data": {"event": "ticket", "ticket": payload}},
+        )
+    except Exception as e:
+        # Screens catch up via the delta endpoint
+        logger.info("Kitchen broadcast skipped for ticket %s: %s", payload.get("id"), e)
+
+
+def _publish_on_commit(ticket: Ticket) -> None:
+    payload = serialize_ticket(ticket)
+    transaction.on_commit(lambda: _broadcast(payload), robust=True)
+
+
+def _items_snapshot(order: Order) -> list:
+    snapshot = []
+    for item in order.items.select_related("menu_item"):
+        snapshot.append({
+            "name": getattr(item.menu_item, "name", "Item"),
+            "quantity": int(item.quantity),
+            "modifiers": item.modifiers or [],
+            "notes": item.notes,
+        })
+    return snapshot
+
+
+def create_ticket_for_order(order: Order, station: str = "", location_id: Optional[int] = None) -> Optional[Ticket]:
+    """
+    Create the order's KOT for `station` unless it exists. Returns the new
+    ticket or None. Call it outside longer transactions (see
+    create_ticket_after_commit): the location's counter stays locked until
+    the surrounding transaction commits.
+    """
+    station = station or getattr(settings, "KITCHEN_DEFAULT_STATION", "kitchen") or "kitchen"
+    with transaction.atomic():
+        if Ticket.objects.filter(order=order, station=station).exists():
+            return None
+        items = _items_snapshot(order)
+        if not items:
+            return None
+        location_id = location_id or getattr(order, "location_id", None) or _default_location_id()
+        seq, ticket_number = _next_seq_and_number(location_id)
+        ticket = Ticket.objects.create(
+            order=order,
+            location_id=location_id,
+            station=station,
+            ticket_number=ticket_number,
+            items_snapshot=items,
+            seq=seq,
+        )
+        _publish_on_commit(ticket)
+    return ticket
+
+
+def create_ticket_after_commit(order: Order) -> None:
+    """Ticket the order in its own transaction once the caller's commits (send_to_kitchen backfills failures)."""
+    def create():
+        try:
+            create_ticket_for_order(order)
+        except Exception as e:
+            logger.info("Kitchen ticket for order %s deferred to order.paid: %s", order.pk, e)
+
+    transaction.on_commit(create)
+
+
+def set_ticket_status(ticket_id: int, status: str) -> Optional[Ticket]:
+    """Move a ticket to `status` (new seq, pushed to screens). None if unknown id."""
+    if status not in dict(Ticket.STATUS_CHOICES):
+        raise ValueError(f"Unknown ticket status {status!r}")
+    with transaction.atomic():
+        ticket = Ticket.objects.select_for_update(of=("self",)).select_related("order").filter(pk=ticket_id).first()
+        if ticket is None:
+            return None
+        if ticket.status != status:
+            ticket.status = status
+            ticket.seq = next_sync_seq(ticket.location_id)
+            ticket.save(update_fields=["status", "seq", "updated_at"])
+            _publish_on_commit(ticket)
+    return ticket
+
+
+def tickets_since(since: int, location_id=None, station: str = "", limit: int = 500):
+    """Changes after `since` for a location (oldest first). Returns (tickets, has_more)."""
+    qs = Ticket.objects.select_related("order").filter(seq__gt=since, location_id=location_id)
+    if station:
+        qs = qs.filter(station=station)
+    rows = list(qs.order_by("seq")[: limit + 1])
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_remove_order_closed_at_remove_order_customer_email_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='invoice_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
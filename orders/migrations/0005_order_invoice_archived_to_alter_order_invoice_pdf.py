@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:00
+
+import orders.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_invoice_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='invoice_archived_to',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='invoice_pdf',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to=orders.models.invoice_upload_to),
+        ),
+    ]
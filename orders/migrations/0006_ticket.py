@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('orders', '0005_order_invoice_archived_to_alter_order_invoice_pdf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ticket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('station', models.CharField(default='kitchen', max_length=32)),
+                ('ticket_number', models.CharField(max_length=32)),
+                ('status', models.CharField(choices=[('NEW', 'New'), ('IN_PROGRESS', 'In progress'), ('READY', 'Ready'), ('SERVED', 'Served'), ('CANCELLED', 'Cancelled')], default='NEW', max_length=12)),
+                ('items_snapshot', models.JSONField(blank=True, default=list)),
+                ('seq', models.BigIntegerField(unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tickets', to='core.location')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='orders.order')),
+            ],
+            options={
+                'ordering': ['seq'],
+                'indexes': [models.Index(fields=['location', 'station', 'status'], name='ticket_station_status_idx'), models.Index(fields=['location', 'seq'], name='ticket_location_seq_idx')],
+                'constraints': [models.UniqueConstraint(fields=('order', 'station'), name='ticket_one_per_order_station')],
+            },
+        ),
+    ]
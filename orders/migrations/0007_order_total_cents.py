@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:08
+
+import core.money
+from django.db import migrations
+
+
+def backfill_total_cents(apps, schema_editor):
+    from core.money import ZERO, Money
+
+    Order = apps.get_model("orders", "Order")
+    batch = []
+    for order in Order.objects.only("id", "subtotal", "tip_amount", "discount_amount").iterator(chunk_size=2000):
+        total = Money.of(order.subtotal) + Money.of(order.tip_amount) - Money.of(order.discount_amount)
+        order.total_cents = total.clamp(low=ZERO)
+        batch.append(order)
+        if len(batch) >= 2000:
+            Order.objects.bulk_update(batch, ["total_cents"])
+            batch = []
+    if batch:
+        Order.objects.bulk_update(batch, ["total_cents"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_ticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_cents',
+            field=core.money.MoneyField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_total_cents, migrations.RunPython.noop),
+    ]
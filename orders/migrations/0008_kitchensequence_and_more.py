@@ -0,0 +1,57 @@
+# Generated by Django 5.1.2 on 2026-10-18 23:09
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_kitchen_sequences(apps, schema_editor):
+    # Continue from the shared KDS/KOT counters so screens' ?since= cursors and ticket numbers stay valid
+    InvoiceSequence = apps.get_model("billing", "InvoiceSequence")
+    KitchenSequence = apps.get_model("orders", "KitchenSequence")
+    Ticket = apps.get_model("orders", "Ticket")
+    counters = dict(InvoiceSequence.objects.filter(prefix__in=["KDS", "KOT"]).values_list("prefix", "last_number"))
+    last_seq = max(counters.get("KDS", 0), Ticket.objects.aggregate(m=Max("seq"))["m"] or 0)
+    keys = {location_id or 0 for location_id in Ticket.objects.values_list("location_id", flat=True).distinct()}
+    KitchenSequence.objects.bulk_create([
+        KitchenSequence(location_key=key, last_seq=last_seq, last_ticket_number=counters.get("KOT", 0))
+        for key in sorted(keys)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_printjob'),
+        ('core', '0001_initial'),
+        ('orders', '0007_order_total_cents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KitchenSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location_key', models.PositiveIntegerField(unique=True)),
+                ('last_seq', models.BigIntegerField(default=0)),
+                ('last_ticket_number', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Kitchen Sequence',
+                'verbose_name_plural': 'Kitchen Sequences',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='ticket_location_seq_idx',
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='seq',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.UniqueConstraint(fields=('location', 'seq'), name='ticket_location_seq_uniq'),
+        ),
+        migrations.RunPython(seed_kitchen_sequences, migrations.RunPython.noop),
+    ]
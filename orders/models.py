@@ -5,8 +5,29 @@ from decimal import Decimal
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
+
+from core.money import Money, MoneyField, to_cents
 from menu.models import MenuItem
 
+INVOICES_PER_SHARD = 1000
+
+
+def invoice_upload_to(instance, filename: str) -> str:
+    """
+    invoices/<yyyy>/<mm>/<id // 1000>/<filename> — keeps every directory to
+    at most INVOICES_PER_SHARD files instead of one flat invoices/ folder.
+    """
+    when = timezone.localtime(instance.created_at or timezone.now())
+    shard = (instance.pk or 0) // INVOICES_PER_SHARD
+    return f"invoices/{when:%Y}/{when:%m}/{shard:04d}/{filename}"
+
+
+class OrderQuerySet(models.QuerySet):
+    def paid(self):
+        """Paid by any of the flags: Payment.is_paid, Order.is_paid or status PAID."""
+        return self.filter(models.Q(payment__is_paid=True) | models.Q(is_paid=True) | models.Q(status="PAID"))
+
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -43,6 +64,9 @@ class Order(models.Model):
     tip_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     discount_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     discount_code = models.CharField(max_length=64, blank=True, default="")
+    # grand_total() in integer cents as of the last save(), for reporting and filtering;
+    # Stripe is charged from grand_total_money(), recomputed from the items at checkout
+    total_cents = MoneyField(default=0, editable=False)
     loyalty_reward_applied = models.BooleanField(default=False)
 
     # Optional reservation relation (ok if app not installed; keep null/blank)
@@ -58,7 +82,13 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     # Optional: PDF invoice file
-    invoice_pdf = models.FileField(upload_to="invoices/", blank=True, null=True)
+    invoice_pdf = models.FileField(upload_to=invoice_upload_to, max_length=255, blank=True, null=True)
+    # sha256 of payments.services.invoice_data() the PDF was rendered from
+    invoice_hash = models.CharField(max_length=64, blank=True, default="")
+    # Where archive_invoices put the PDF ("<storage path>" or "<zip path>#<member>")
+    invoice_archived_to = models.CharField(max_length=255, blank=True, default="")
+
+    objects = OrderQuerySet.as_manager()
 
     class Meta:
         ordering = ["-created_at"]
@@ -67,20 +97,20 @@ class Order(models.Model):
         return f"Order #{self.pk}"
 
     # ---------- Totals ----------
+    def items_subtotal_money(self) -> Money:
+        return Money._make(sum(to_cents(it.unit_price) * int(it.quantity) for it in self.items.all()))
+
+    def _total_money(self, subtotal: Money) -> Money:
+        return Money._make(max(0, subtotal.cents + to_cents(self.tip_amount) - to_cents(self.discount_amount)))
+
+    def grand_total_money(self) -> Money:
+        return self._total_money(self.items_subtotal_money())
+
     def items_subtotal(self) -> Decimal:
-        total = Decimal("0.00")
-        for it in self.items.all():
-            total += (Decimal(str(it.unit_price)) * int(it.quantity))
-        return total.quantize(Decimal("0.01"))
+        return self.items_subtotal_money().to_decimal()
 
     def grand_total(self) -> Decimal:
-        sub = self.items_subtotal()
-        tip = Decimal(str(self.tip_amount or 0))
-        disc = Decimal(str(self.discount_amount or 0))
-        total = sub + tip - disc
-        if total < 0:
-            total = Decimal("0.00")
-        return total.quantize(Decimal("0.01"))
+        return self.grand_total_money().to_decimal()
 
     def clean(self):
         if self.source == "DINE_IN" and not self.table_number:
@@ -91,9 +121,25 @@ class Order(models.Model):
             raise ValidationError("Tip cannot be negative.")
 
     def sync_subtotals(self):
-        self.subtotal = self.items_subtotal()
+        if self.pk is None:
+            # No items yet; keep the subtotal the caller set
+            self.total_cents = self._total_money(Money.of(self.subtotal))
+            return
+        subtotal = self.items_subtotal_money()
+        self.subtotal = subtotal.to_decimal()
+        self.total_cents = self._total_money(subtotal)
+
+    # Saving any of these (or an item change) moves the total
+    PRICING_FIELDS = frozenset({"subtotal", "tip_amount", "discount_amount", "total_cents"})
 
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if not update_fields & self.PRICING_FIELDS:
+                return super().save(*args, **kwargs)
+            # Write the recomputed totals along with the pricing field
+            kwargs["update_fields"] = update_fields | {"subtotal", "total_cents"}
         try:
             self.sync_subtotals()
         except Exception:
@@ -111,8 +157,68 @@ class OrderItem(models.Model):
     modifiers = models.JSONField(default=list, blank=True)
     notes = models.CharField(max_length=255, blank=True, default="")
 
+    def line_money(self) -> Money:
+        return Money._make(to_cents(self.unit_price) * int(self.quantity))
+
     def line_total(self) -> Decimal:
-        return (Decimal(str(self.unit_price)) * int(self.quantity)).quantize(Decimal("0.01"))
+        return self.line_money().to_decimal()
 
     def __str__(self) -> str:
         return f"{self.menu_item} x {self.quantity}"
+
+
+class Ticket(models.Model):
+    """Kitchen order ticket (KOT): what a station has to cook for an order."""
+    STATUS_NEW = "NEW"
+    STATUS_IN_PROGRESS = "IN_PROGRESS"
+    STATUS_READY = "READY"
+    STATUS_SERVED = "SERVED"
+    STATUS_CANCELLED = "CANCELLED"
+    STATUS_CHOICES = [
+        (STATUS_NEW, "New"),
+        (STATUS_IN_PROGRESS, "In progress"),
+        (STATUS_READY, "Ready"),
+        (STATUS_SERVED, "Served"),
+        (STATUS_CANCELLED, "Cancelled"),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="tickets")
+    location = models.ForeignKey(
+        "core.Location", on_delete=models.SET_NULL, null=True, blank=True, related_name="tickets",
+    )
+    station = models.CharField(max_length=32, default="kitchen")
+    ticket_number = models.CharField(max_length=32)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default=STATUS_NEW)
+    items_snapshot = models.JSONField(default=list, blank=True)
+    # Bumped on every change from the location's KitchenSequence (orders.kitchen.next_sync_seq); delta sync key
+    seq = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["seq"]
+        constraints = [
+            models.UniqueConstraint(fields=["order", "station"], name="ticket_one_per_order_station"),
+            models.UniqueConstraint(fields=["location", "seq"], name="ticket_location_seq_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["location", "station", "status"], name="ticket_station_status_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.ticket_number} ({self.station}, {self.status})"
+
+
+class KitchenSequence(models.Model):
+    """Per-location counters for the kitchen feed: change seq and KOT ticket numbers."""
+    # Location id; 0 for the default feed (tickets without a location)
+    location_key = models.PositiveIntegerField(unique=True)
+    last_seq = models.BigIntegerField(default=0)
+    last_ticket_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Kitchen Sequence"
+        verbose_name_plural = "Kitchen Sequences"
+
+    def __str__(self) -> str:
+        return f"Kitchen {self.location_key or 'default'}: seq {self.last_seq}"
@@ -0,0 +1,9 @@
+# orders/routing.py
+from django.urls import path
+
+from .consumers import OrderConsumer
+
+websocket_urlpatterns = [
+    # Kitchen display feed; "default" when tickets have no location
+    path("ws/kitchen/<str:location_id>/", OrderConsumer.as_asgi()),
+]
@@ -1,7 +1,8 @@
 from decimal import Decimal
 from django.utils import timezone
 from django.db import transaction
-from .models import Order, Ticket
+from .models import Order
+from .kitchen import create_ticket_after_commit
 
 class PricingService:
     @staticmethod
@@ -51,22 +52,8 @@ class OrderService:
         order.placed_at = timezone.now()
         order.save()
         
-        # Create KOT ticket
-        ticket_number = f"KOT-{order.id}-{timezone.now().strftime('%H%M%S')}"
-        items_snapshot = []
-        for item in order.items.all():
-            items_snapshot.append({
-                'name': item.menu_item_name,
-                'quantity': item.quantity,
-                'modifiers': item.modifiers,
-                'notes': item.notes
-            })
-        
-        Ticket.objects.create(
-            order=order,
-            ticket_number=ticket_number,
-            items_snapshot=items_snapshot
-        )
+        # Create KOT ticket once the order commits (pushed to the kitchen display on its own commit)
+        create_ticket_after_commit(order)
         
         return order
 
@@ -0,0 +1,173 @@
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+
+from core.money import Money
+from coupons.models import Coupon
+
+from .models import Order, OrderItem
+
+
+class DiscountTotalCentsTests(TestCase):
+    def test_partial_save_of_a_discount_updates_total_cents(self):
+        order = Order.objects.create(source="UBER_EATS", tip_amount=Decimal("25.00"))
+        self.assertEqual(order.total_cents, Money(2500))
+
+        order.discount_code = "SAVE5"
+        order.discount_amount = Decimal("5.00")
+        order.save(update_fields=["discount_code", "discount_amount"])
+        order.refresh_from_db()
+        self.assertEqual(order.total_cents, Money(2000))
+
+    def test_partial_save_without_pricing_fields_leaves_totals(self):
+        order = Order.objects.create(source="UBER_EATS", tip_amount=Decimal("25.00"))
+        Order.objects.filter(pk=order.pk).update(tip_amount=Decimal("1.00"))
+        order.status = "PAID"
+        order.save(update_fields=["status"])
+        order.refresh_from_db()
+        self.assertEqual(order.total_cents, Money(2500))
+
+
+class RepriceCouponTests(TestCase):
+    def setUp(self):
+        from core.models import Organization
+        from menu.models import MenuCategory, MenuItem
+
+        category = MenuCategory.objects.create(organization=Organization.objects.create(name="Org"), name="Mains")
+        item = MenuItem.objects.create(category=category, name="Momo", price="10.00")
+        self.order = Order.objects.create(source="UBER_EATS")
+        OrderItem.objects.create(order=self.order, menu_item=item, quantity=2, unit_price=Decimal("10.00"))
+
+    def _reprice(self, discount):
+        from .pricing import PricingRules, reprice_orders
+
+        reprice_orders(Order.objects.filter(pk=self.order.pk), rules=PricingRules(discount=discount), write=True)
+        self.order.refresh_from_db()
+
+    def test_coupon_codes_match_case_insensitively(self):
+        Coupon.objects.create(code="SAVE10", percent=10)
+        Order.objects.filter(pk=self.order.pk).update(discount_code="save10 ")
+        self._reprice("coupon")
+        self.assertEqual(self.order.discount_amount, Decimal("2.00"))
+        self.assertEqual(self.order.total_cents, Money(1800))
+
+    def test_keep_mode_clamps_the_total_not_the_discount(self):
+        Order.objects.filter(pk=self.order.pk).update(discount_amount=Decimal("25.00"), tip_amount=Decimal("3.00"))
+        self._reprice("keep")
+        self.assertEqual(self.order.discount_amount, Decimal("25.00"))
+        self.assertEqual(self.order.total_cents, Money(0))
+
+
+class _KitchenFixture:
+    def setUp(self):
+        from core.models import Location, Organization
+        from menu.models import MenuCategory, MenuItem
+
+        org = Organization.objects.create(name="Org")
+        self.uptown = Location.objects.create(organization=org, name="Uptown")
+        self.downtown = Location.objects.create(organization=org, name="Downtown")
+        self.item = MenuItem.objects.create(category=MenuCategory.objects.create(organization=org, name="Mains"),
+                                            name="Momo", price="10.00")
+
+    def _order(self, items=1):
+        order = Order.objects.create(source="DINE_IN", table_number=4)
+        for _ in range(items):
+            OrderItem.objects.create(order=order, menu_item=self.item, quantity=2, unit_price=Decimal("10.00"))
+        return order
+
+    def _ticket(self, order, location, station=""):
+        from .kitchen import create_ticket_for_order
+
+        return create_ticket_for_order(order, station=station, location_id=location.pk if location else None)
+
+    def _numbers(self, *tickets):
+        return [(t.location_id, t.seq, t.ticket_number) for t in tickets]
+
+
+@override_settings(KITCHEN_LOCATION_ID=None, KITCHEN_DEFAULT_STATION="kitchen")
+class KitchenTicketTests(_KitchenFixture, TestCase):
+    def test_each_location_numbers_its_own_tickets(self):
+        first, across, second = self._order(), self._order(), self._order()
+        self.assertEqual(
+            self._numbers(
+                self._ticket(first, self.uptown),
+                self._ticket(across, self.downtown),
+                self._ticket(second, self.uptown),
+                self._ticket(first, self.uptown, station="bar"),
+            ),
+            [
+                (self.uptown.pk, 1, "KOT-000001"),
+                (self.downtown.pk, 1, "KOT-000001"),
+                (self.uptown.pk, 2, "KOT-000002"),
+                (self.uptown.pk, 3, "KOT-000003"),
+            ],
+        )
+        self.assertEqual(self._numbers(self._ticket(self._order(), None)), [(None, 1, "KOT-000001")])
+
+    def test_repeat_and_empty_orders_take_no_number(self):
+        order = self._order()
+        self._ticket(order, self.uptown)
+        self.assertIsNone(self._ticket(order, self.uptown))
+        self.assertIsNone(self._ticket(self._order(items=0), self.uptown))
+        self.assertEqual(self._numbers(self._ticket(self._order(), self.uptown)), [(self.uptown.pk, 2, "KOT-000002")])
+
+    def test_status_change_takes_a_new_seq_and_keeps_the_number(self):
+        from .kitchen import set_ticket_status
+
+        ticket = self._ticket(self._order(), self.uptown)
+        self._ticket(self._order(), self.uptown)
+        ticket = set_ticket_status(ticket.pk, "READY")
+        self.assertEqual(self._numbers(ticket), [(self.uptown.pk, 3, "KOT-000001")])
+        with self.assertRaises(ValueError):
+            set_ticket_status(ticket.pk, "EATEN")
+
+
+@override_settings(KITCHEN_LOCATION_ID=None, KITCHEN_DEFAULT_STATION="kitchen")
+class KitchenDeltaEndpointTests(_KitchenFixture, TestCase):
+    URL = "/api/orders/kitchen/tickets/"
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from rest_framework.test import APIClient
+
+        from .kitchen import set_ticket_status
+
+        super().setUp()
+        self.first = self._ticket(self._order(), self.uptown)
+        self.second = self._ticket(self._order(), self.uptown)
+        self.bar = self._ticket(self.second.order, self.uptown, station="bar")
+        self._ticket(self._order(), self.downtown)
+        set_ticket_status(self.first.pk, "READY")  # seq 4: moves behind the others
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username="chef", is_staff=True))
+
+    def _get(self, **params):
+        return self.client.get(self.URL, params)
+
+    def test_changes_since_a_seq_in_seq_order(self):
+        res = self._get(since=0, location=self.uptown.pk)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([(t["id"], t["seq"]) for t in res.data["tickets"]],
+                         [(self.second.pk, 2), (self.bar.pk, 3), (self.first.pk, 4)])
+        self.assertEqual(res.data["tickets"][-1]["status"], "READY")
+
+        res = self._get(since=3, location=self.uptown.pk)
+        self.assertEqual((res.data["seq"], [t["id"] for t in res.data["tickets"]]), (4, [self.first.pk]))
+        self.assertEqual(self._get(since=4, location=self.uptown.pk).data["seq"], 4)
+
+    def test_station_filter_and_paging(self):
+        res = self._get(since=0, location=self.uptown.pk, station="bar")
+        self.assertEqual([t["id"] for t in res.data["tickets"]], [self.bar.pk])
+
+        res = self._get(since=0, location=self.uptown.pk, limit=2)
+        self.assertEqual((res.data["seq"], res.data["has_more"]), (3, True))
+        res = self._get(since=res.data["seq"], location=self.uptown.pk, limit=2)
+        self.assertEqual((res.data["seq"], res.data["has_more"]), (4, False))
+
+    def test_staff_only_and_integer_params(self):
+        from rest_framework.test import APIClient
+
+        self.assertEqual(self._get(since="x").status_code, 400)
+        self.assertEqual(self._get(since=0, location="default").data["tickets"], [])
+        guest = APIClient()
+        self.assertIn(guest.get(self.URL, {"since": 0}).status_code, (401, 403))
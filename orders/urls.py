@@ -4,6 +4,7 @@ from rest_framework.routers import DefaultRouter
 
 from .views import OrderViewSet, SessionCartViewSet  # your existing viewsets
 from .views_my import MyOrdersAPIView               # <-- new
+from .views_kitchen import KitchenTicketDeltaAPIView, KitchenTicketStatusAPIView
 
 router = DefaultRouter()
 router.register(r"orders", OrderViewSet, basename="orders")
@@ -12,4 +13,6 @@ router.register(r"cart", SessionCartViewSet, basename="cart")
 urlpatterns = [
     path("", include(router.urls)),
     path("orders/my/", MyOrdersAPIView.as_view(), name="orders-my"),  # NEW: /api/orders/orders/my/
+    path("kitchen/tickets/", KitchenTicketDeltaAPIView.as_view(), name="kitchen-tickets"),
+    path("kitchen/tickets/<int:ticket_id>/status/", KitchenTicketStatusAPIView.as_view(), name="kitchen-ticket-status"),
 ]
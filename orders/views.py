@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import logging
 from decimal import Decimal
 from typing import Any, Dict, List, Tuple
 
@@ -9,36 +10,48 @@ from django.utils import timezone
 
 from rest_framework import viewsets
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.decorators import action
 
+from core.money import ZERO, Money, to_cents
 from .models import Order, OrderItem
 from menu.models import MenuItem
 
+logger = logging.getLogger(__name__)
+
 # Payments fallbacks (safe if app missing)
 try:
-    from payments.services import create_checkout_session, save_invoice_pdf_file  # type: ignore
+    from payments.services import create_checkout_session, request_invoice_render  # type: ignore
 except Exception:  # pragma: no cover
     def create_checkout_session(order: Order):
         class _Dummy: url = None
         return _Dummy()
-    def save_invoice_pdf_file(order: Order):  # noqa
+    def request_invoice_render(order: Order):  # noqa
         return None
 
 # Coupons services (percent-based)
 try:
-    from coupons.services import find_active_coupon, compute_discount_for_order  # type: ignore
+    from coupons.services import (  # type: ignore
+        compute_discount_for_order, find_active_coupon, redeem_coupon_for_order, release_coupon_for_order,
+    )
 except Exception:  # pragma: no cover
     def find_active_coupon(code: str): return None
     def compute_discount_for_order(order: Order, coupon, user):
         return False, Decimal("0.00"), "coupon service missing"
+    def redeem_coupon_for_order(coupon, order: Order): return True
+    def release_coupon_for_order(order: Order): return None
+
+# Automatic promotions (compiled, evaluated in memory)
+try:
+    from coupons.promotions import CartLine, evaluate_cart, evaluate_order  # type: ignore
+except Exception:  # pragma: no cover
+    evaluate_cart = evaluate_order = None
 
 # Loyalty services (safe stubs)
 try:
-    from loyalty.services import get_available_reward_for_user, reserve_reward_for_order  # type: ignore
+    from loyality.services import claim_reward_for_order  # type: ignore
 except Exception:  # pragma: no cover
-    def get_available_reward_for_user(user): return None
-    def reserve_reward_for_order(reward, order: Order): return None
+    def claim_reward_for_order(user, order: Order): return None
 
 
 # ---------- Helpers ----------
@@ -78,18 +91,44 @@ def _cart_meta_set(request, meta: Dict[str, Any]):
     request.session.modified = True
 
 def _enrich(items: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Decimal]:
+    menu = {
+        m["id"]: m
+        for m in MenuItem.objects.filter(pk__in={int(it["id"]) for it in items}).values("id", "name", "price", "category_id")
+    }
     enriched: List[Dict[str, Any]] = []
-    subtotal = Decimal("0")
+    subtotal = ZERO
     for it in items:
         pid, qty = int(it["id"]), int(it["quantity"])
-        name, unit = _fetch_menu_item(pid)
-        line = (unit * qty).quantize(Decimal("0.01"))
+        mi = menu.get(pid)
+        if mi is None:
+            raise MenuItem.DoesNotExist(f"MenuItem {pid} does not exist.")
+        unit = Decimal(str(mi["price"] or 0))
+        line = Money(to_cents(unit) * qty)
         enriched.append({
-            "id": pid, "name": name, "quantity": qty,
+            "id": pid, "name": mi["name"], "quantity": qty, "category_id": mi["category_id"],
             "unit_price": str(unit), "line_total": str(line),
         })
         subtotal += line
-    return enriched, subtotal.quantize(Decimal("0.01"))
+    return enriched, subtotal.to_decimal()
+
+def _cart_source(request) -> str:
+    st = str(_cart_meta_get(request).get("service_type") or "").upper().strip()
+    return "UBER_EATS" if st == "UBEREATS" else (st or "DINE_IN")
+
+def _priced(request, enriched: List[Dict[str, Any]], subtotal: Decimal) -> Dict[str, Any]:
+    """Cart preview totals after automatic promotions."""
+    out = {"discount": "0.00", "promotions": [], "total": str(subtotal)}
+    if evaluate_cart is None:
+        return out
+    try:
+        result = evaluate_cart(
+            (CartLine(it["id"], it["category_id"], to_cents(it["unit_price"]), it["quantity"]) for it in enriched),
+            source=_cart_source(request),
+        )
+        out.update(result.as_dict(), total=str(result.total))
+    except Exception as e:
+        logger.info("Promotion preview failed: %s", e)
+    return out
 
 
 # ---------- Session Cart API ----------
@@ -100,13 +139,13 @@ class SessionCartViewSet(viewsets.ViewSet):
         items = _normalize_items(_cart_get(request))
         enriched, subtotal = _enrich(items)
         meta = _cart_meta_get(request)
-        return Response({"items": enriched, "subtotal": str(subtotal), "currency": _currency(), "meta": meta})
+        return Response({"items": enriched, "subtotal": str(subtotal), **_priced(request, enriched, subtotal), "currency": _currency(), "meta": meta})
 
     def create(self, request):
         items = _normalize_items(request.data.get("items", []))
         _cart_set(request, items)
         enriched, subtotal = _enrich(items)
-        return Response({"status": "ok", "items": enriched, "subtotal": str(subtotal), "currency": _currency()})
+        return Response({"status": "ok", "items": enriched, "subtotal": str(subtotal), **_priced(request, enriched, subtotal), "currency": _currency()})
 
     @action(methods=["post"], detail=False, url_path="items", permission_classes=[AllowAny])
     def add_item(self, request):
@@ -122,7 +161,7 @@ class SessionCartViewSet(viewsets.ViewSet):
                 items.append(add)
             _cart_set(request, items)
         enriched, subtotal = _enrich(items)
-        return Response({"items": enriched, "subtotal": str(subtotal), "currency": _currency()})
+        return Response({"items": enriched, "subtotal": str(subtotal), **_priced(request, enriched, subtotal), "currency": _currency()})
 
     @action(methods=["post"], detail=False, url_path="items/remove", permission_classes=[AllowAny])
     def remove_item(self, request):
@@ -134,7 +173,7 @@ class SessionCartViewSet(viewsets.ViewSet):
         items = [it for it in _normalize_items(_cart_get(request)) if it["id"] != pid]
         _cart_set(request, items)
         enriched, subtotal = _enrich(items)
-        return Response({"items": enriched, "subtotal": str(subtotal), "currency": _currency()})
+        return Response({"items": enriched, "subtotal": str(subtotal), **_priced(request, enriched, subtotal), "currency": _currency()})
 
     @action(methods=["post"], detail=False, url_path="meta", permission_classes=[AllowAny])
     def set_meta(self, request):
@@ -204,6 +243,8 @@ class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all().order_by("-id")
 
     def get_permissions(self):
+        if self.action == "export_invoices":
+            return [IsAdminUser()]
         if self.action in ("list", "retrieve"):
             return [IsAuthenticated()]
         return [AllowAny()]
@@ -234,12 +275,11 @@ class OrderViewSet(viewsets.ModelViewSet):
         for o in self.get_queryset():
             items = []
             for it in o.items.all():
-                line_total = (Decimal(str(it.unit_price)) * int(it.quantity)).quantize(Decimal("0.01"))
                 items.append({
                     "menu_item": getattr(it, "menu_item_id", None),
                     "quantity": it.quantity,
                     "unit_price": str(it.unit_price),
-                    "line_total": str(line_total),
+                    "line_total": str(it.line_money()),
                 })
             total = o.grand_total()
             data.append({
@@ -343,43 +383,57 @@ class OrderViewSet(viewsets.ModelViewSet):
             tip_dec = Decimal("0.00")
             if tip_amount_custom not in (None, "", 0, "0"):
                 try:
-                    tip_dec = Decimal(str(tip_amount_custom))
+                    tip_dec = Money.of(tip_amount_custom).to_decimal()
                 except Exception:
                     tip_dec = Decimal("0.00")
             elif tip_percent not in (None, "", 0, "0"):
                 try:
-                    pct = Decimal(str(tip_percent)) / Decimal("100")
-                    tip_dec = (order.subtotal * pct).quantize(Decimal("0.01"))
+                    tip_dec = Money.of(order.subtotal).percent(tip_percent).to_decimal()
                 except Exception:
                     tip_dec = Decimal("0.00")
             order.tip_amount = tip_dec
 
-            # ---- Coupon (percent-based)
+            # ---- Automatic promotions
             order.discount_amount = Decimal("0.00")
             order.discount_code = ""
+            promotions = []
+            if evaluate_order is not None:
+                try:
+                    promo = evaluate_order(order)
+                    order.discount_amount = promo.discount.to_decimal()
+                    promotions = promo.as_dict()["promotions"]
+                except Exception as e:
+                    logger.info("Promotions skipped for order %s: %s", order.pk, e)
+
+            # ---- Coupon (percent-based); counts against max_uses once per order
+            coupon_applied = False
             if coupon_code:
                 c = find_active_coupon(coupon_code)
                 ok, disc, _reason = compute_discount_for_order(order, c, user)
                 if ok:
-                    order.discount_amount = disc
+                    if not redeem_coupon_for_order(c, order):
+                        return Response({"detail": "Coupon usage limit reached."}, status=400)
+                    order.discount_amount += disc
                     order.discount_code = c.code
-
-            # ---- Loyalty (auto-apply once when available)
-            if user and user.is_authenticated and not getattr(order, "loyalty_reward_applied", False):
-                reward = get_available_reward_for_user(user)
-                if reward:
-                    reserve_reward_for_order(reward, order)
-                    order.discount_amount = (order.discount_amount or Decimal("0.00")) + reward.as_discount_amount(order.subtotal)
-                    order.loyalty_reward_applied = True
-                    if not order.discount_code:
-                        order.discount_code = "LOYALTY"
+                    coupon_applied = True
+            if not coupon_applied:
+                release_coupon_for_order(order)
+
+            # ---- Loyalty (one reward per order; a repeated checkout keeps the same one)
+            order.loyalty_reward_applied = False
+            reward = claim_reward_for_order(user, order)
+            if reward:
+                order.discount_amount = (order.discount_amount or Decimal("0.00")) + reward.as_discount_amount(order.subtotal)
+                order.loyalty_reward_applied = True
+                if not order.discount_code:
+                    order.discount_code = "LOYALTY"
 
             order.full_clean()
             order.save()
 
-            # Optional invoice generation
+            # Invoice renders in the worker after commit (never inline)
             try:
-                save_invoice_pdf_file(order)
+                request_invoice_render(order)
             except Exception:
                 pass
 
@@ -395,6 +449,35 @@ class OrderViewSet(viewsets.ModelViewSet):
                     "currency": _currency(),
                     "source": order.source,
                     "table_number": getattr(order, "table_number", None),
+                    "promotions": promotions,
                 },
                 status=201,
             )
+
+    @action(methods=["get"], detail=False, url_path="invoices/export")
+    def export_invoices(self, request):
+        """
+        Staff: stream the invoices for a date range.
+          ?start=YYYY-MM-DD&end=YYYY-MM-DD&type=zip|pdf&all=1 (include unpaid)
+        """
+        from datetime import datetime
+        from payments.invoice_export import filter_orders, invoice_export_response
+
+        try:
+            start = request.query_params.get("start")
+            end = request.query_params.get("end")
+            start = datetime.strptime(start, "%Y-%m-%d").date() if start else None
+            end = datetime.strptime(end, "%Y-%m-%d").date() if end else None
+        except ValueError:
+            return Response({"detail": "start/end must be YYYY-MM-DD."}, status=400)
+
+        qs = filter_orders(
+            Order.objects.all(), start=start, end=end,
+            paid_only=request.query_params.get("all") not in ("1", "true"),
+        )
+        kind = (request.query_params.get("type") or "zip").lower()
+        name = f"invoices_{start or 'all'}_{end or 'now'}"
+        try:
+            return invoice_export_response(qs, kind=kind, filename=name)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
@@ -0,0 +1,49 @@
+# orders/views_kitchen.py
+from __future__ import annotations
+
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .kitchen import serialize_ticket, set_ticket_status, tickets_since
+
+
+class KitchenTicketDeltaAPIView(APIView):
+    """
+    GET /api/orders/kitchen/tickets/?since=<seq>&location=<id>&station=<name>
+    Tickets changed after `since` (current state, oldest first). Kitchen
+    screens call this on (re)connect, then follow the websocket feed.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get("since") or 0)
+            location = request.query_params.get("location")
+            location_id = int(location) if location not in (None, "", "default") else None
+            limit = max(1, min(int(request.query_params.get("limit") or 500), 1000))
+        except ValueError:
+            return Response({"detail": "since/location/limit must be integers."}, status=400)
+
+        tickets, has_more = tickets_since(since, location_id, request.query_params.get("station") or "", limit)
+        data = [serialize_ticket(t) for t in tickets]
+        return Response({
+            "since": since,
+            "seq": data[-1]["seq"] if data else since,
+            "has_more": has_more,
+            "tickets": data,
+        })
+
+
+class KitchenTicketStatusAPIView(APIView):
+    """POST /api/orders/kitchen/tickets/<id>/status/ {"status": "READY"}"""
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, ticket_id: int):
+        try:
+            ticket = set_ticket_status(ticket_id, str(request.data.get("status") or "").upper())
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+        if ticket is None:
+            return Response({"detail": "Not found."}, status=404)
+        return Response(serialize_ticket(ticket))
@@ -1,14 +1,18 @@
 # payments/admin.py
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Payment
+from .models import Payment, OutboxEvent
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ("id", "order_link", "provider", "amount", "currency", "is_paid", "created_at")
     list_filter = ("provider", "is_paid", "created_at")
     search_fields = ("=id", "order__id", "stripe_session_id", "stripe_payment_intent")
-    readonly_fields = ("order", "provider", "amount", "currency", "is_paid", "stripe_session_id", "stripe_payment_intent", "created_at", "updated_at")
+    readonly_fields = (
+        "order", "provider", "amount", "currency", "is_paid", "stripe_session_id", "stripe_payment_intent",
+        "stripe_session_url", "stripe_session_expires_at", "stripe_session_amount", "stripe_session_currency",
+        "created_at", "updated_at",
+    )
     ordering = ("-created_at",)
 
     def order_link(self, obj):
@@ -17,3 +21,12 @@ class PaymentAdmin(admin.ModelAdmin):
         except Exception:
             return f"#{obj.order_id}"
     order_link.short_description = "Order"
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "topic", "order_id", "created_at", "processed_at", "attempts", "next_attempt_at")
+    list_filter = ("topic", "processed_at")
+    search_fields = ("=id", "order__id")
+    readonly_fields = ("topic", "order", "payment", "payload", "created_at", "processed_at", "attempts", "last_error", "done_handlers")
+    ordering = ("-id",)
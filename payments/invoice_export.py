@@ -0,0 +1,224 @@
+# payments/invoice_export.py
+"""
+Streaming bulk invoice export (admin action + staff API).
+
+- ZIP: one entry per order. Stored invoices are copied chunk by chunk from
+  storage; missing or stale ones are rendered on the fly from
+  invoice_data(). The archive is written to an unseekable sink and flushed
+  after every chunk, so memory is bounded by one chunk/PDF, not the export.
+- Merged PDF: one page per invoice drawn from plain data by
+  draw_invoice_page() onto _StreamingPdf, which writes every page's objects
+  as soon as the page ends. PDF objects may appear in any order; only their
+  byte offsets (for the closing xref table) and the page ids are kept, so
+  memory does not grow with the PDF and the first page goes out at once.
+  Capped by INVOICE_EXPORT_MERGED_MAX — larger ranges should use ZIP.
+"""
+from __future__ import annotations
+
+import logging
+import zipfile
+import zlib
+from datetime import date, datetime, time as dt_time
+from typing import Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from payments.services import draw_invoice_page, invoice_content_hash, invoice_data, render_invoice_pdf
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+ORDERS_PER_QUERY = 200
+
+
+class _StreamSink:
+    """Write-only, unseekable file object; zipfile writes here, we drain it."""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def filter_orders(queryset, start: Optional[date] = None, end: Optional[date] = None, paid_only: bool = True):
+    """Orders in [start, end] (inclusive, local dates) in a stable id order."""
+    qs = queryset
+    if paid_only:
+        qs = qs.paid()
+    tz = timezone.get_current_timezone()
+    if start:
+        qs = qs.filter(created_at__gte=timezone.make_aware(datetime.combine(start, dt_time.min), tz))
+    if end:
+        qs = qs.filter(created_at__lte=timezone.make_aware(datetime.combine(end, dt_time.max), tz))
+    return qs.order_by("id")
+
+
+def _iter_orders(queryset) -> Iterator:
+    return queryset.prefetch_related("items__menu_item").iterator(chunk_size=ORDERS_PER_QUERY)
+
+
+def _stored_invoice(order, data: dict):
+    """Stored FieldFile if it matches the order's current contents, else None."""
+    if not order.invoice_pdf or order.invoice_hash != invoice_content_hash(data):
+        return None
+    return order.invoice_pdf
+
+
+def stream_invoice_zip(orders: Iterable) -> Iterator[bytes]:
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for order in orders:
+            try:
+                data = invoice_data(order)
+                name = f"invoice_order_{order.id}.pdf"
+                stored = _stored_invoice(order, data)
+                if stored is not None:
+                    with zf.open(name, mode="w", force_zip64=True) as dest:
+                        stored.open("rb")
+                        try:
+                            for chunk in stored.chunks(EXPORT_CHUNK_SIZE):
+                                dest.write(chunk)
+                                yield sink.drain()
+                        finally:
+                            stored.close()
+                else:
+                    pdf = render_invoice_pdf(data)
+                    if not pdf:
+                        continue
+                    zf.writestr(name, pdf)
+            except Exception as e:
+                logger.exception("Invoice export skipped order %s: %s", order.pk, e)
+            yield sink.drain()
+    yield sink.drain()
+
+
+class _StreamingPdf:
+    """
+    Append-only PDF writer with the part of the reportlab canvas API that
+    draw_invoice_page() uses (setFont, drawString, showPage), limited to the
+    standard Type 1 fonts. Pages are written out as they end; drain()
+    returns the bytes written since the last call.
+    """
+
+    def __init__(self, pagesize):
+        self.width, self.height = pagesize
+        self._parts = []
+        self._offset = 0
+        self._offsets = {}
+        self._next_id = 3  # 1 = catalog, 2 = page tree: both written by close()
+        self._fonts = {}  # base font -> (resource name, object id)
+        self._pages = []
+        self._ops = []
+        self._font = None
+        self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _emit(self, data: bytes) -> None:
+        self._parts.append(data)
+        self._offset += len(data)
+
+    def _object(self, body: bytes, num: Optional[int] = None) -> int:
+        if num is None:
+            num, self._next_id = self._next_id, self._next_id + 1
+        self._offsets[num] = self._offset
+        self._emit(b"%d 0 obj\n%s\nendobj\n" % (num, body))
+        return num
+
+    def setFont(self, name: str, size) -> None:
+        if name not in self._fonts:
+            num = self._object(
+                b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % name.encode("ascii")
+            )
+            self._fonts[name] = (b"F%d" % (len(self._fonts) + 1), num)
+        self._font = (self._fonts[name][0], size)
+
+    def drawString(self, x, y, text: str) -> None:
+        if self._font is None:
+            self.setFont("Helvetica", 12)
+        raw = str(text).encode("cp1252", errors="replace")
+        raw = raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+        res, size = self._font
+        self._ops.append(b"BT /%s %.2f Tf %.2f %.2f Td (%s) Tj ET" % (res, float(size), float(x), float(y), raw))
+
+    def abandon_page(self) -> None:
+        """Drop whatever was drawn since the last showPage() (a failed invoice)."""
+        self._ops = []
+
+    def showPage(self) -> None:
+        content = zlib.compress(b"\n".join(self._ops))
+        self._ops = []
+        contents = self._object(
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(content), content)
+        )
+        fonts = b" ".join(b"/%s %d 0 R" % (res, num) for res, num in self._fonts.values())
+        self._pages.append(self._object(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Resources << /Font << %s >> >> /Contents %d 0 R >>"
+            % (self.width, self.height, fonts, contents)
+        ))
+
+    def close(self) -> None:
+        if not self._pages:
+            self.showPage()
+        kids = b" ".join(b"%d 0 R" % num for num in self._pages)
+        self._object(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._pages)), num=2)
+        self._object(b"<< /Type /Catalog /Pages 2 0 R >>", num=1)
+        xref_at = self._offset
+        count = self._next_id
+        self._emit(b"xref\n0 %d\n0000000000 65535 f \n" % count)
+        for num in range(1, count):
+            self._emit(b"%010d 00000 n \n" % self._offsets[num])
+        self._emit(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (count, xref_at))
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def stream_merged_invoice_pdf(orders: Iterable) -> Iterator[bytes]:
+    from reportlab.lib.pagesizes import A4
+
+    pdf = _StreamingPdf(A4)
+    for order in orders:
+        try:
+            draw_invoice_page(pdf, invoice_data(order))
+        except Exception as e:
+            pdf.abandon_page()
+            logger.exception("Invoice export skipped order %s: %s", order.pk, e)
+        chunk = pdf.drain()
+        if chunk:
+            yield chunk
+    pdf.close()
+    yield pdf.drain()
+
+
+def merged_export_limit() -> int:
+    return int(getattr(settings, "INVOICE_EXPORT_MERGED_MAX", 5000))
+
+
+def invoice_export_response(queryset, kind: str = "zip", filename: str = "invoices") -> StreamingHttpResponse:
+    """
+    Chunked download of the invoices for `queryset`. kind: "zip" | "pdf".
+    Raises ValueError for an unknown kind or a merged export over the cap.
+    """
+    if kind == "pdf":
+        if queryset.count() > merged_export_limit():
+            raise ValueError(f"Merged PDF is limited to {merged_export_limit()} invoices; export a ZIP instead.")
+        response = StreamingHttpResponse(stream_merged_invoice_pdf(_iter_orders(queryset)), content_type="application/pdf")
+    elif kind == "zip":
+        response = StreamingHttpResponse(stream_invoice_zip(_iter_orders(queryset)), content_type="application/zip")
+    else:
+        raise ValueError("Unknown export type (use zip or pdf).")
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{kind}"'
+    return response
@@ -0,0 +1,119 @@
+import posixpath
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Retention for generated invoices older than N days. "
+        "--mode zip (default) bundles them into one compressed archive per month; "
+        "--mode move copies each PDF as-is. Both write to the archive storage "
+        "(settings.INVOICE_ARCHIVE_STORAGE alias), then delete the original and "
+        "record the location in Order.invoice_archived_to. A later request for "
+        "the invoice re-renders it from the order's data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, default=365)
+        parser.add_argument("--mode", choices=["zip", "move"], default="zip")
+        parser.add_argument("--prefix", default="archive/invoices", help="path prefix inside the archive storage")
+        parser.add_argument("--batch", type=int, default=500, help="orders per DB round trip")
+        parser.add_argument("--keep-originals", action="store_true")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        alias = getattr(settings, "INVOICE_ARCHIVE_STORAGE", "default")
+        try:
+            archive = storages[alias]
+        except Exception as e:
+            raise CommandError(f"Archive storage {alias!r} is not configured: {e}")
+        source = Order._meta.get_field("invoice_pdf").storage
+
+        cutoff = timezone.now() - timedelta(days=opts["older_than_days"])
+        qs = (
+            Order.objects.filter(created_at__lt=cutoff)
+            .exclude(invoice_pdf="").exclude(invoice_pdf__isnull=True)
+            .filter(invoice_archived_to="")
+            .order_by("id")
+            .only("id", "created_at", "invoice_pdf")
+        )
+
+        # One grouped query for the months and their counts; rows are then
+        # read (and archived) one month at a time
+        tz = timezone.get_current_timezone()
+        months = list(
+            qs.annotate(month=TruncMonth("created_at", tzinfo=tz))
+            .values_list("month").annotate(n=Count("id")).order_by("month")
+        )
+        total = sum(n for _, n in months)
+        if opts["dry_run"]:
+            for start, n in months:
+                self.stdout.write(f"{start:%Y-%m}: {n} invoices")
+            self.stdout.write(self.style.SUCCESS(f"Would archive {total} invoices (dry run)"))
+            return
+
+        archived = 0
+        for start, n in months:
+            month = f"{start:%Y-%m}"
+            end = timezone.make_aware(datetime(start.year + start.month // 12, start.month % 12 + 1, 1), tz)
+            orders = qs.filter(created_at__gte=start, created_at__lt=end).iterator(chunk_size=opts["batch"])
+            if opts["mode"] == "zip":
+                done = self._zip_month(source, archive, opts["prefix"], month, orders)
+            else:
+                done = self._move_each(source, archive, opts["prefix"], orders)
+            for order, location in done:
+                rows = Order.objects.filter(pk=order.pk, invoice_pdf=order.invoice_pdf.name)
+                if opts["keep_originals"]:
+                    updated = rows.update(invoice_archived_to=location)
+                else:
+                    updated = rows.update(invoice_pdf="", invoice_hash="", invoice_archived_to=location)
+                    if updated:
+                        source.delete(order.invoice_pdf.name)
+                archived += updated
+            self.stdout.write(f"{month}: {len(done)}/{n} archived")
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} of {total} invoices ({opts['mode']})"))
+
+    def _zip_month(self, source, archive, prefix, month, orders):
+        done = []
+        # Spools to disk past 32 MB, so a multi-GB month never sits in memory
+        with tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024) as tmp:
+            with zipfile.ZipFile(tmp, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+                for order in orders:
+                    name = order.invoice_pdf.name
+                    member = posixpath.basename(name)
+                    try:
+                        with source.open(name, "rb") as fh, zf.open(member, mode="w", force_zip64=True) as dest:
+                            for chunk in iter(lambda: fh.read(64 * 1024), b""):
+                                dest.write(chunk)
+                    except Exception as e:
+                        self.stderr.write(f"Order {order.pk}: {e}")
+                        continue
+                    done.append((order, member))
+            if not done:
+                return []
+            tmp.seek(0)
+            zip_name = archive.save(f"{prefix}/{month}.zip", File(tmp))
+        return [(order, f"{zip_name}#{member}") for order, member in done]
+
+    def _move_each(self, source, archive, prefix, orders):
+        done = []
+        for order in orders:
+            name = order.invoice_pdf.name
+            try:
+                with source.open(name, "rb") as fh:
+                    done.append((order, archive.save(f"{prefix}/{name.split('/', 1)[-1]}", fh)))
+            except Exception as e:
+                self.stderr.write(f"Order {order.pk}: {e}")
+        return done
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import stripe
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.test import AsyncRequestFactory, RequestFactory
+
+from orders.models import Order
+from payments import views
+
+
+class _SlowStripeClient(stripe.HTTPClient):
+    """Fake Stripe transport: answers every call after a fixed latency and counts created sessions."""
+    name = "bench"
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+        self.created = 0
+        self._lock = threading.Lock()
+
+    def _response(self, method, url):
+        n = uuid.uuid4().hex
+        if method == "post" and url.endswith("/checkout/sessions"):
+            with self._lock:
+                self.created += 1
+        body = json.dumps({
+            "id": f"cs_test_bench_{n}",
+            "object": "checkout.session",
+            "url": f"https://checkout.stripe.com/c/pay/cs_test_bench_{n}",
+            "expires_at": int(time.time()) + 86400,
+            "payment_intent": None,
+        })
+        return body.encode(), 200, {}
+
+    def request(self, method, url, headers, post_data=None):
+        time.sleep(self.latency)
+        return self._response(method, url)
+
+    async def request_async(self, method, url, headers, post_data=None):
+        await asyncio.sleep(self.latency)
+        return self._response(method, url)
+
+
+def _summary(label, wall, latencies, statuses, sessions):
+    lat = sorted(latencies)
+    p95 = lat[max(0, int(len(lat) * 0.95) - 1)]
+    codes = ",".join(f"{code}x{statuses.count(code)}" for code in sorted(set(statuses)))
+    return (
+        f"{label:<46} wall={wall:6.2f}s  req/s={len(lat) / wall:7.1f}  "
+        f"p50={statistics.median(lat) * 1000:6.0f}ms  p95={p95 * 1000:6.0f}ms  "
+        f"status={codes}  sessions={sessions}"
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the real checkout views (sync under a thread pool, async on one event loop) against the DB, "
+        "with Stripe replaced by a fixed-latency fake transport. Also fires concurrent checkouts at a single "
+        "order and reports how many sessions were created (should be 1). Its rows are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="distinct orders checked out")
+        parser.add_argument("--workers", type=int, default=8, help="sync (gunicorn-style) workers")
+        parser.add_argument("--latency-ms", type=int, default=500)
+        parser.add_argument("--same-order", type=int, default=20, help="concurrent checkouts of one order")
+
+    def handle(self, *args, **opts):
+        n, workers, latency = opts["requests"], opts["workers"], opts["latency_ms"] / 1000.0
+        user = get_user_model().objects.create_user(username=f"bench-{uuid.uuid4().hex[:12]}")
+        # Priced through the tip alone so no menu has to exist
+        make = lambda count: [
+            Order.objects.create(created_by=user, source="UBER_EATS", tip_amount=Decimal("25.00")).pk
+            for _ in range(count)
+        ]
+        old_client, old_key = stripe.default_http_client, stripe.api_key
+        stripe.api_key = "sk_test_bench"
+        try:
+            self.stdout.write(f"{n} checkout starts, simulated Stripe latency {opts['latency_ms']} ms")
+            for label, run, pool in (
+                ("sync view (blocking workers)", self._run_sync, workers),
+                ("async view (one event loop)", self._run_async, None),
+            ):
+                for ids, what in ((make(n), "distinct orders"), (make(1) * opts["same_order"], "one order")):
+                    client = stripe.default_http_client = _SlowStripeClient(latency)
+                    wall, lat, statuses = run(user, ids, pool)
+                    self.stdout.write(_summary(f"{label}, {what}", wall, lat, statuses, client.created))
+        finally:
+            stripe.default_http_client, stripe.api_key = old_client, old_key
+            Order.objects.filter(created_by=user).delete()
+            user.delete()
+
+    @staticmethod
+    def _run_sync(user, order_ids, workers):
+        factory = RequestFactory()
+
+        def one(order_id, queued_at):
+            close_old_connections()
+            request = factory.post(f"/payments/create-checkout-session/{order_id}/", content_type="application/json")
+            request.user = user
+            response = views.create_checkout_session_view(request, order_id)
+            return time.perf_counter() - queued_at, response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bench") as pool:
+            futures = [pool.submit(one, oid, time.perf_counter()) for oid in order_ids]
+            results = [f.result() for f in futures]
+            # Each worker thread opened its own connection
+            pool.map(lambda _: connections.close_all(), range(workers))
+        return time.perf_counter() - start, [r[0] for r in results], [r[1] for r in results]
+
+    @staticmethod
+    def _run_async(user, order_ids, _pool):
+        factory = AsyncRequestFactory()
+
+        async def one(order_id):
+            t0 = time.perf_counter()
+            request = factory.post(f"/payments/create-checkout-session/{order_id}/", content_type="application/json")
+            request.user = user
+
+            async def auser():
+                return user
+
+            request.auser = auser
+            response = await views.acreate_checkout_session_view(request, order_id)
+            return time.perf_counter() - t0, response.status_code
+
+        async def run():
+            return await asyncio.gather(*(one(oid) for oid in order_ids))
+
+        start = time.perf_counter()
+        results = asyncio.run(run())
+        return time.perf_counter() - start, [r[0] for r in results], [r[1] for r in results]
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+import stripe
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments.services import find_order_for_checkout_session, mark_paid, payments_by_stripe_ids
+
+
+class Command(BaseCommand):
+    help = (
+        "Match Stripe Checkout Sessions from the last N days against local "
+        "Payments (indexed lookups by session id / payment intent) and mark "
+        "paid sessions whose Payment is still unpaid."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument("--batch", type=int, default=500, help="sessions matched per DB round trip")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        if not stripe.api_key:
+            raise CommandError("Stripe secret key is not configured.")
+
+        since = int((timezone.now() - timedelta(days=opts["days"])).timestamp())
+        sessions = stripe.checkout.Session.list(created={"gte": since}, limit=100).auto_paging_iter()
+
+        stats = {"seen": 0, "matched": 0, "fallback": 0, "fixed": 0, "unknown": 0}
+        batch = []
+        for sess in sessions:
+            batch.append(sess)
+            if len(batch) >= opts["batch"]:
+                self._reconcile(batch, stats, opts["dry_run"])
+                batch = []
+        if batch:
+            self._reconcile(batch, stats, opts["dry_run"])
+
+        self.stdout.write(self.style.SUCCESS(
+            "Sessions: {seen}, matched by id: {matched}, via metadata: {fallback}, "
+            "unknown: {unknown}, marked paid: {fixed}".format(**stats)
+        ))
+
+    def _reconcile(self, sessions, stats, dry_run):
+        by_id = payments_by_stripe_ids(
+            session_ids=[s.get("id") for s in sessions],
+            payment_intent_ids=[s.get("payment_intent") for s in sessions],
+        )
+        for sess in sessions:
+            stats["seen"] += 1
+            pay = by_id.get(sess.get("id")) or by_id.get(sess.get("payment_intent"))
+            if pay:
+                stats["matched"] += 1
+                order, is_paid = pay.order, pay.is_paid
+            else:
+                # Rare: session never persisted locally -> metadata.order_id
+                order, is_paid = find_order_for_checkout_session(sess), False
+                if order is None:
+                    stats["unknown"] += 1
+                    continue
+                stats["fallback"] += 1
+                is_paid = bool(getattr(getattr(order, "payment", None), "is_paid", False))
+
+            if sess.get("payment_status") == "paid" and not is_paid:
+                stats["fixed"] += 1
+                if not dry_run:
+                    mark_paid(order, payment_intent_id=sess.get("payment_intent"), session_id=sess.get("id"))
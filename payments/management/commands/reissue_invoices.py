@@ -0,0 +1,60 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.models import Order
+from payments.render_farm import default_workers, shutdown
+from payments.services import save_invoice_pdf_files
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk (re)render invoice PDFs — and optionally receipts — on the "
+        "process-pool render farm. Unchanged invoices are skipped unless --force."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="only orders created on/after YYYY-MM-DD")
+        parser.add_argument("--all", action="store_true", help="include unpaid orders")
+        parser.add_argument("--force", action="store_true", help="re-render even if the invoice is current")
+        parser.add_argument("--receipts", action="store_true", help="also regenerate billing receipts")
+        parser.add_argument("--workers", type=int, default=0, help="render processes (default: RENDER_FARM_WORKERS / CPU count)")
+        parser.add_argument("--batch", type=int, default=500, help="orders loaded per batch")
+
+    def handle(self, *args, **opts):
+        qs = Order.objects.order_by("id")
+        if not opts["all"]:
+            qs = qs.paid()
+        if opts["since"]:
+            try:
+                qs = qs.filter(created_at__date__gte=datetime.strptime(opts["since"], "%Y-%m-%d").date())
+            except ValueError:
+                raise CommandError("--since must be YYYY-MM-DD")
+
+        # One query per batch for every relation the invoice and receipt snapshots read
+        related = ["items__menu_item", "billing_payments"] if opts["receipts"] else ["items__menu_item"]
+        workers = opts["workers"] or default_workers()
+        seen = invoices = receipts = 0
+        start = time.perf_counter()
+        try:
+            last_id = 0
+            while True:
+                batch = list(qs.filter(id__gt=last_id).prefetch_related(*related)[: opts["batch"]])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                seen += len(batch)
+                invoices += save_invoice_pdf_files(batch, force=opts["force"], workers=workers)
+                if opts["receipts"]:
+                    from billing.services import ReceiptService
+                    receipts += len(ReceiptService.generate_receipt_pdfs(batch, workers=workers))
+                self.stdout.write(f"... {seen} orders")
+        finally:
+            shutdown()
+
+        wall = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Orders: {seen}, invoices written: {invoices}, receipts written: {receipts}, "
+            f"workers: {workers}, {wall:.1f}s"
+        ))
@@ -0,0 +1,64 @@
+import posixpath
+
+from django.core.management.base import BaseCommand
+
+from orders.models import Order, invoice_upload_to
+
+
+class Command(BaseCommand):
+    help = (
+        "Move invoice PDFs from the flat invoices/ folder into the sharded "
+        "invoices/<yyyy>/<mm>/<id//1000>/ layout, in batches, through the storage API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=500, help="orders per DB round trip")
+        parser.add_argument("--limit", type=int, default=0, help="stop after moving N files (0 = all)")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        storage = Order._meta.get_field("invoice_pdf").storage
+        qs = Order.objects.exclude(invoice_pdf="").exclude(invoice_pdf__isnull=True).order_by("id")
+
+        stats = {"seen": 0, "moved": 0, "missing": 0, "failed": 0}
+        last_id = 0
+        while not (opts["limit"] and stats["moved"] >= opts["limit"]):
+            batch = list(qs.filter(id__gt=last_id).only("id", "created_at", "invoice_pdf")[: opts["batch"]])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for order in batch:
+                if opts["limit"] and stats["moved"] >= opts["limit"]:
+                    break
+                stats["seen"] += 1
+                self._move(storage, order, stats, opts["dry_run"])
+            self.stdout.write(f"... {stats['seen']} orders")
+
+        self.stdout.write(self.style.SUCCESS(
+            "Orders: {seen}, moved: {moved}, missing files: {missing}, failed: {failed}".format(**stats)
+            + (" (dry run)" if opts["dry_run"] else "")
+        ))
+
+    def _move(self, storage, order, stats, dry_run):
+        old_name = order.invoice_pdf.name
+        target = invoice_upload_to(order, posixpath.basename(old_name))
+        if old_name == target:
+            return
+        if not storage.exists(old_name):
+            stats["missing"] += 1
+            return
+        if dry_run:
+            stats["moved"] += 1
+            return
+        try:
+            with storage.open(old_name, "rb") as fh:
+                new_name = storage.save(target, fh)
+            # Point the row at the copy before deleting; a crash leaves an orphan, never a dangling link
+            if Order.objects.filter(pk=order.pk, invoice_pdf=old_name).update(invoice_pdf=new_name):
+                storage.delete(old_name)
+            else:
+                storage.delete(new_name)  # re-rendered meanwhile
+            stats["moved"] += 1
+        except Exception as e:
+            stats["failed"] += 1
+            self.stderr.write(f"Order {order.pk}: {e}")
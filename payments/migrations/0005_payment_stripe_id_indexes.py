@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_remove_order_closed_at_remove_order_customer_email_and_more'),
+        ('payments', '0004_payment_checkout_session_cache'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(condition=models.Q(('stripe_session_id', ''), _negated=True), fields=('stripe_session_id',), name='payment_uniq_stripe_session'),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(condition=models.Q(('stripe_payment_intent', ''), _negated=True), fields=('stripe_payment_intent',), name='payment_uniq_stripe_intent'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_outboxevent_done_handlers_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='checkout_lock_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -32,12 +32,92 @@ class Payment(models.Model):
     stripe_session_id = models.CharField(max_length=255, blank=True, default="")
     stripe_payment_intent = models.CharField(max_length=255, blank=True, default="")
 
+    # Cached open Checkout Session (reused while amount/currency are unchanged)
+    stripe_session_url = models.TextField(blank=True, default="")
+    stripe_session_expires_at = models.DateTimeField(null=True, blank=True)
+    stripe_session_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    stripe_session_currency = models.CharField(max_length=10, blank=True, default="")
+    # Lease of the request currently creating this order's session (payments.services._claim_checkout)
+    checkout_lock_until = models.DateTimeField(null=True, blank=True)
+
     # Auditing
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # is_paid as loaded from the DB; lets post_save spot the unpaid -> paid transition
+    _paid_on_load = False
+
     class Meta:
         ordering = ["-created_at"]
+        constraints = [
+            # Partial: most rows have no intent yet, and blanks must not collide
+            models.UniqueConstraint(
+                fields=["stripe_session_id"],
+                condition=~models.Q(stripe_session_id=""),
+                name="payment_uniq_stripe_session",
+            ),
+            models.UniqueConstraint(
+                fields=["stripe_payment_intent"],
+                condition=~models.Q(stripe_payment_intent=""),
+                name="payment_uniq_stripe_intent",
+            ),
+        ]
 
     def __str__(self):
         return f"Payment(order={self.order_id}, provider={self.provider}, paid={self.is_paid})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._paid_on_load = bool(instance.__dict__.get("is_paid", False))
+        return instance
+
+
+class OutboxEvent(models.Model):
+    """
+    Transactional outbox row. Written in the same transaction as the state change
+    it describes and consumed by payments.outbox.dispatch_pending(). Each
+    handler that succeeded is listed in done_handlers; the event is processed
+    once all of them have, and retried (next_attempt_at) until then.
+    """
+    TOPIC_ORDER_PAID = "order.paid"
+    TOPICS = [
+        (TOPIC_ORDER_PAID, "Order paid"),
+    ]
+
+    topic = models.CharField(max_length=32, choices=TOPICS)
+    order = models.ForeignKey(
+        "orders.Order",
+        on_delete=models.CASCADE,
+        related_name="outbox_events",
+    )
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="outbox_events",
+    )
+    payload = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    # Names of handlers that already ran; a retry runs only the rest
+    done_handlers = models.JSONField(default=list, blank=True)
+    # Claim lease while a worker runs it, then the retry time after a failure
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        constraints = [
+            models.UniqueConstraint(fields=["topic", "order"], name="outbox_one_event_per_order_topic"),
+        ]
+        indexes = [
+            models.Index(fields=["processed_at", "id"], name="outbox_pending_idx"),
+        ]
+
+    def __str__(self):
+        state = "done" if self.processed_at else "pending"
+        return f"OutboxEvent({self.topic}, order={self.order_id}, {state})"
@@ -0,0 +1,253 @@
+# payments/outbox.py
+"""
+Transactional outbox for everything that should happen once an order is paid.
+
+- record_order_paid() runs inside the transaction that flips Payment.is_paid and
+  writes exactly one OutboxEvent(topic="order.paid") per order.
+- dispatch_pending() (Celery: payments.tasks.dispatch_outbox) claims each due
+  event with a conditional UPDATE, so concurrent workers never run it at the
+  same time, and fans it out to the handlers registered below. Handlers that
+  fail are retried with backoff; the ones that succeeded are not run again.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from payments.models import OutboxEvent, Payment
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[OutboxEvent], None]
+_HANDLERS: Dict[str, List[Handler]] = {}
+
+
+def register(topic: str):
+    """Decorator: subscribe a handler to an outbox topic."""
+    def deco(fn: Handler) -> Handler:
+        _HANDLERS.setdefault(topic, []).append(fn)
+        return fn
+    return deco
+
+
+# ---------- Producer ----------
+def _kick_worker() -> None:
+    try:
+        from payments.tasks import dispatch_outbox
+        dispatch_outbox.apply_async(retry=False)
+    except Exception as e:
+        # Broker down: the beat sweep picks the event up later.
+        logger.info("Outbox worker not notified: %s", e)
+
+
+def record_order_paid(payment: Payment) -> Optional[OutboxEvent]:
+    """
+    Write the order.paid event for this payment. Must be called inside the
+    transaction that marks the payment paid. Returns None if the order
+    already has one (unique on topic+order).
+    """
+    event, created = OutboxEvent.objects.get_or_create(
+        topic=OutboxEvent.TOPIC_ORDER_PAID,
+        order_id=payment.order_id,
+        defaults={
+            "payment": payment,
+            "payload": {
+                "payment_id": payment.pk,
+                "amount": str(payment.amount or "0"),
+                "currency": payment.currency or "",
+                "reference": payment.stripe_payment_intent or payment.stripe_session_id or "",
+            },
+        },
+    )
+    if not created:
+        return None
+    transaction.on_commit(_kick_worker)
+    return event
+
+
+# ---------- Consumer ----------
+def _retry_delay(attempts: int) -> timedelta:
+    base = float(getattr(settings, "OUTBOX_RETRY_SECONDS", 30))
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), 3600))
+
+
+def process_event(event_id: int) -> bool:
+    """
+    Claim and dispatch a single event. Returns False if it is done, leased
+    by another worker, or not due for a retry yet.
+
+    The claim is a conditional UPDATE that leases the event for
+    OUTBOX_LEASE_SECONDS (a crashed worker's lease just runs out). Every
+    handler not yet in done_handlers then runs in its own transaction,
+    which also records it as done, so one slow or failing handler neither
+    holds the others' locks nor makes them run twice. The event is marked
+    processed only when all handlers have succeeded; otherwise it is due
+    again after an exponential backoff (OUTBOX_RETRY_SECONDS, doubling per
+    attempt), and after OUTBOX_MAX_ATTEMPTS it is closed with its error.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=float(getattr(settings, "OUTBOX_LEASE_SECONDS", 300)))
+    claimed = OutboxEvent.objects.filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now),
+        pk=event_id, processed_at__isnull=True,
+    ).update(next_attempt_at=now + lease, attempts=F("attempts") + 1)
+    if not claimed:
+        return False
+
+    event = OutboxEvent.objects.select_related("order", "payment").get(pk=event_id)
+    done = list(event.done_handlers or [])
+    errors = []
+    for fn in _HANDLERS.get(event.topic, []):
+        if fn.__name__ in done:
+            continue
+        try:
+            with transaction.atomic():
+                fn(event)
+                done.append(fn.__name__)
+                OutboxEvent.objects.filter(pk=event_id).update(done_handlers=done)
+        except Exception as e:
+            if done and done[-1] == fn.__name__:
+                done.pop()
+            logger.info("Outbox handler %s failed for %s (attempt %d): %s", fn.__name__, event, event.attempts, e)
+            errors.append(f"{fn.__name__}: {e}")
+
+    now = timezone.now()
+    if not errors:
+        OutboxEvent.objects.filter(pk=event_id).update(processed_at=now, next_attempt_at=None, last_error="")
+        return True
+    max_attempts = int(getattr(settings, "OUTBOX_MAX_ATTEMPTS", 8))
+    if event.attempts >= max_attempts:
+        logger.error("Outbox %s gave up after %d attempts: %s", event, event.attempts, "; ".join(errors))
+        OutboxEvent.objects.filter(pk=event_id).update(
+            processed_at=now, next_attempt_at=None,
+            last_error=f"Gave up after {event.attempts} attempts\n" + "\n".join(errors),
+        )
+    else:
+        OutboxEvent.objects.filter(pk=event_id).update(
+            next_attempt_at=now + _retry_delay(event.attempts), last_error="\n".join(errors),
+        )
+    return True
+
+
+def dispatch_pending(limit: int = 100) -> int:
+    """Process up to `limit` due events (oldest first). Returns how many were attempted."""
+    ids = list(
+        OutboxEvent.objects.filter(processed_at__isnull=True)
+        .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now()))
+        .order_by("id")
+        .values_list("id", flat=True)[:limit]
+    )
+    done = 0
+    for event_id in ids:
+        try:
+            if process_event(event_id):
+                done += 1
+        except Exception as e:
+            logger.exception("Outbox event %s failed: %s", event_id, e)
+    return done
+
+
+# ---------- order.paid handlers ----------
+def _event_amount(event: OutboxEvent) -> Decimal:
+    try:
+        return Decimal(str(event.payload.get("amount") or "0"))
+    except Exception:
+        return Decimal("0")
+
+
+@register(OutboxEvent.TOPIC_ORDER_PAID)
+def mirror_billing_payment(event: OutboxEvent) -> None:
+    """Ensure a billing.Payment + PaymentReceipt exist for the order."""
+    from billing.models import Payment as BillingPayment, PaymentReceipt
+    from billing.services import next_receipt_no
+
+    order = event.order
+    amount = _event_amount(event)
+    currency = event.payload.get("currency") or getattr(order, "currency", "NPR")
+
+    bp, bp_created = BillingPayment.objects.get_or_create(
+        order=order,
+        defaults={
+            "amount": amount,
+            "currency": currency,
+            "status": "paid",
+            "reference": event.payload.get("reference", ""),
+        },
+    )
+    if not bp_created and bp.status != "paid":
+        bp.status = "paid"
+        bp.amount = amount
+        bp.currency = currency
+        bp.save(update_fields=["status", "amount", "currency"])
+
+    if not PaymentReceipt.objects.filter(payment=bp).exists():
+        PaymentReceipt.objects.create(payment=bp, receipt_no=next_receipt_no("INV"))
+
+
+@register(OutboxEvent.TOPIC_ORDER_PAID)
+def count_coupon_use(event: OutboxEvent) -> None:
+    """Count the order's coupon against max_uses; no-op when checkout already did."""
+    from coupons.services import redeem_order_coupon
+
+    if not redeem_order_coupon(event.order):
+        # Already paid; nothing to undo, but staff should know the promo went over
+        logger.warning("Order %s paid with exhausted coupon %s", event.order_id, event.order.discount_code)
+
+
+@register(OutboxEvent.TOPIC_ORDER_PAID)
+def send_to_kitchen(event: OutboxEvent) -> None:
+    """KOT for the kitchen display; no-op if the order was already ticketed on placement."""
+    from orders.kitchen import create_ticket_for_order
+    create_ticket_for_order(event.order)
+
+
+@register(OutboxEvent.TOPIC_ORDER_PAID)
+def queue_counter_receipt(event: OutboxEvent) -> None:
+    """Dine-in receipts go to the thermal printer queue (ESC/POS), not a PDF."""
+    from django.conf import settings
+    from billing.services import enqueue_receipt_print
+
+    printer = getattr(settings, "RECEIPT_PRINTER", "")
+    if printer and event.order.source == "DINE_IN":
+        enqueue_receipt_print(event.order, printer=printer)
+
+
+@register(OutboxEvent.TOPIC_ORDER_PAID)
+def render_invoice(event: OutboxEvent) -> None:
+    from payments.services import save_invoice_pdf_file
+    save_invoice_pdf_file(event.order)
+
+
+@register(OutboxEvent.TOPIC_ORDER_PAID)
+def bump_daily_sales(event: OutboxEvent) -> None:
+    """Increment DailySales with an F() update (no read-modify-write)."""
+    from reports.models import DailySales
+
+    order = event.order
+    loc_id = getattr(order, "location_id", None)
+    if not loc_id:
+        return
+    day = order.created_at.date()
+    DailySales.objects.get_or_create(location_id=loc_id, date=day)
+    DailySales.objects.filter(location_id=loc_id, date=day).update(
+        total_orders=F("total_orders") + 1,
+        total_sales=F("total_sales") + _event_amount(event),
+    )
+
+
+@register(OutboxEvent.TOPIC_ORDER_PAID)
+def accrue_loyalty(event: OutboxEvent) -> None:
+    from loyality.services import add_tip_and_maybe_grant, redeem_reserved_reward_if_any
+
+    order = event.order
+    if not order.created_by_id:
+        return
+    redeem_reserved_reward_if_any(order)
+    add_tip_and_maybe_grant(order.created_by, order.tip_amount, order=order)
@@ -0,0 +1,124 @@
+# payments/render_farm.py
+"""
+Process-pool PDF rendering for invoices and receipts.
+
+Reportlab is pure Python and CPU-bound, so rendering in web/Celery threads
+serializes on the GIL. Jobs here are plain data — (kind, data) tuples where
+data comes from payments.services.invoice_data() or
+billing.services.ReceiptService.receipt_data() — so they pickle cheaply and
+workers never touch the ORM. Results are PDF bytes, in job order; callers
+store them.
+
+    jobs = [("invoice", invoice_data(o)) for o in orders]
+    pdfs = render_many(jobs)
+
+Falls back to rendering in-process when there is a single job, one worker,
+or no pool can be started (e.g. inside a daemonic Celery prefork child).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from importlib import import_module
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+Job = Tuple[str, dict]
+
+# kind -> "module:attr" of a pure renderer (data -> bytes)
+RENDERERS = {
+    "invoice": "payments.services:render_invoice_pdf",
+    "receipt": "billing.services:ReceiptService.render_receipt_pdf",
+}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _renderer(kind: str):
+    module_path, attr_path = RENDERERS[kind].split(":")
+    obj = import_module(module_path)
+    for attr in attr_path.split("."):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _init_worker() -> None:
+    # Renderers live in app modules that import models; spawn/forkserver
+    # children need the app registry (fork children already have it).
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _render_chunk(jobs: Sequence[Job]) -> List[Optional[bytes]]:
+    out = []
+    for kind, data in jobs:
+        try:
+            out.append(_renderer(kind)(data))
+        except Exception as e:
+            logger.exception("Render of %s job failed: %s", kind, e)
+            out.append(None)
+    return out
+
+
+def default_workers() -> int:
+    return max(1, int(getattr(settings, "RENDER_FARM_WORKERS", 0) or os.cpu_count() or 1))
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._max_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=True)
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def _chunks(jobs: Sequence[Job], size: int) -> Iterable[Sequence[Job]]:
+    for i in range(0, len(jobs), size):
+        yield jobs[i:i + size]
+
+
+def render_many(jobs: Sequence[Job], workers: Optional[int] = None, chunk_size: Optional[int] = None) -> List[Optional[bytes]]:
+    """
+    Render jobs across processes; returns bytes (None for a failed job) in
+    the same order as `jobs`. Jobs are shipped in chunks to amortize IPC.
+    """
+    jobs = list(jobs)
+    workers = workers or default_workers()
+    if len(jobs) <= 1 or workers <= 1:
+        return _render_chunk(jobs)
+
+    chunk_size = chunk_size or max(1, min(50, len(jobs) // (workers * 4) or 1))
+    try:
+        pool = _get_pool(workers)
+        results: List[Optional[bytes]] = []
+        for chunk_result in pool.map(_render_chunk, _chunks(jobs, chunk_size)):
+            results.extend(chunk_result)
+        return results
+    except Exception as e:
+        # No pool in this process (daemonic worker, broken pool...): render inline
+        logger.info("Render farm unavailable, rendering in-process: %s", e)
+        shutdown()
+        return _render_chunk(jobs)
+
+
+def render_one(kind: str, data: dict) -> Optional[bytes]:
+    """Single render, in-process (pool round trip isn't worth it for one PDF)."""
+    return _render_chunk([(kind, data)])[0]
@@ -1,15 +1,25 @@
 # payments/services.py
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
 import logging
-from decimal import Decimal, ROUND_HALF_UP
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 from typing import Optional, Tuple
 
 import stripe
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, prefetch_related_objects
 from django.urls import reverse
+from django.utils import timezone
 from io import BytesIO
 
+from core.money import ZERO, Money
 from payments.models import Payment
 
 logger = logging.getLogger(__name__)
@@ -35,21 +45,12 @@ def _currency() -> str:
     return (cur or "usd").lower()
 
 
-def _as_decimal(x) -> Decimal:
-    if isinstance(x, Decimal):
-        return x
-    return Decimal(str(x))
+def _money_cents(amount) -> int:
+    """Integer cents (minor units) for Stripe."""
+    return Money.of(amount).cents
 
 
-def _money_cents(amount: Decimal) -> int:
-    """
-    Convert Decimal dollars to integer cents (minor units) safely.
-    """
-    cents = (_as_decimal(amount).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) * 100)
-    return int(cents)
-
-
-def _apply_order_discounts(order, total: Decimal) -> Decimal:
+def _apply_order_discounts(order, total: Money) -> Money:
     """
     Apply optional discount fields, if present on the Order:
     - discount_percent / coupon_percent
@@ -62,52 +63,57 @@ def _apply_order_discounts(order, total: Decimal) -> Decimal:
             if hasattr(order, pf):
                 p = getattr(order, pf) or 0
                 if p:
-                    total = total * (Decimal(100) - _as_decimal(p)) / Decimal(100)
+                    total = total - total.percent(p)
 
         # Coupon relation (percent)
         if hasattr(order, "coupon") and getattr(order, "coupon", None):
             pct = getattr(order.coupon, "percent", 0)
             if pct:
-                total = total * (Decimal(100) - _as_decimal(pct)) / Decimal(100)
+                total = total - total.percent(pct)
 
         # Fixed amounts
         for af in ("discount_amount", "coupon_amount"):
             if hasattr(order, af):
                 a = getattr(order, af) or 0
                 if a:
-                    total = total - _as_decimal(a)
+                    total = total - Money.of(a)
     except Exception:
         pass
 
-    return max(Decimal("0.00"), total).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    return total.clamp(low=ZERO)
 
 
-def compute_order_total(order) -> Decimal:
+def compute_order_total_money(order) -> Money:
     """
     Compute order total and apply discounts if present.
-    Prefers order.total/grand_total(); otherwise sums items.
+    Prefers order.grand_total_money()/grand_total()/total; otherwise sums items.
     """
     try:
         # Prefer explicit methods if available
+        if hasattr(order, "grand_total_money"):
+            return order.grand_total_money()
         if hasattr(order, "grand_total"):
-            return _as_decimal(order.grand_total()).quantize(Decimal("0.01"))
+            return Money.of(order.grand_total())
         if getattr(order, "total", None) is not None:
-            return _as_decimal(order.total).quantize(Decimal("0.01"))
+            return Money.of(order.total)
 
         # Fallback: sum items
-        total = Decimal("0.00")
+        total = ZERO
         for it in order.items.all():
-            if hasattr(it, "line_total"):
-                total += _as_decimal(it.line_total())
+            if hasattr(it, "line_money"):
+                total += it.line_money()
+            elif hasattr(it, "line_total"):
+                total += Money.of(it.line_total())
             else:
-                qty = _as_decimal(getattr(it, "quantity", 0))
-                unit = _as_decimal(getattr(it, "unit_price", 0))
-                total += (qty * unit)
-        total = total.quantize(Decimal("0.01"))
+                total += Money.of(getattr(it, "unit_price", 0)) * int(getattr(it, "quantity", 0))
         return _apply_order_discounts(order, total)
     except Exception as e:
         logger.exception("Failed computing order total: %s", e)
-        return Decimal("0.00")
+        return ZERO
+
+
+def compute_order_total(order) -> Decimal:
+    return compute_order_total_money(order).to_decimal()
 
 
 def ensure_payment(order) -> Payment:
@@ -134,137 +140,516 @@ def ensure_payment(order) -> Payment:
     return pay
 
 
-def create_checkout_session(order):
+# Don't hand out a cached session this close to its expiry
+_SESSION_REUSE_MARGIN = timedelta(minutes=5)
+
+
+def _cached_session(payment: Payment, amount: Decimal, currency: str):
     """
-    Create a Stripe Checkout Session for the order (single aggregate line).
+    Return the stored Checkout Session if it is still open for this exact
+    amount/currency, else None. No Stripe round trip.
     """
-    if not stripe.api_key:
-        raise RuntimeError("Stripe secret key is not configured.")
+    if payment.is_paid or not (payment.stripe_session_id and payment.stripe_session_url):
+        return None
+    if payment.stripe_session_amount != amount or payment.stripe_session_currency != currency:
+        return None
+    expires_at = payment.stripe_session_expires_at
+    if not expires_at or expires_at - _SESSION_REUSE_MARGIN <= timezone.now():
+        return None
+    return stripe.checkout.Session.construct_from(
+        {
+            "id": payment.stripe_session_id,
+            "url": payment.stripe_session_url,
+            "expires_at": int(expires_at.timestamp()),
+            "payment_intent": payment.stripe_payment_intent or None,
+        },
+        stripe.api_key,
+    )
 
-    payment = ensure_payment(order)
+
+def _expire_stale_session(session_id: str) -> None:
+    """Best-effort: close a session created for an outdated amount so it can't be paid."""
+    try:
+        stripe.checkout.Session.expire(session_id)
+    except Exception as e:
+        logger.info("Could not expire stale checkout session %s: %s", session_id, e)
+
+
+async def _aexpire_stale_session(session_id: str) -> None:
+    try:
+        await stripe.checkout.Session.expire_async(session_id)
+    except Exception as e:
+        logger.info("Could not expire stale checkout session %s: %s", session_id, e)
+
+
+def _begin_checkout(order):
+    """
+    DB half of checkout start: validate the total, sync the Payment and look
+    up a reusable session. Returns (payment, amount, currency, cached_session).
+    """
     amount = compute_order_total(order)
     if amount <= 0:
         raise ValueError("Order total must be greater than zero.")
+    currency = _currency()
+
+    payment = ensure_payment(order)
+    return payment, amount, currency, _cached_session(payment, amount, currency)
+
 
+# How long a checkout start may hold the order's session slot, and how long another one waits for it
+_CHECKOUT_LEASE = timedelta(seconds=30)
+_CHECKOUT_WAIT = 10.0
+_CHECKOUT_POLL = 0.25
+
+
+def _claim_checkout(order):
+    """
+    Reuse the open session, or take the order's checkout lease with one
+    conditional UPDATE. Returns (payment, amount, currency, cached, claimed);
+    neither cached nor claimed means another request is minting the session.
+    """
+    payment, amount, currency, cached = _begin_checkout(order)
+    if cached is not None:
+        return payment, amount, currency, cached, False
+    now = timezone.now()
+    claimed = Payment.objects.filter(
+        Q(checkout_lock_until__isnull=True) | Q(checkout_lock_until__lte=now), pk=payment.pk,
+    ).update(checkout_lock_until=now + _CHECKOUT_LEASE)
+    if not claimed:
+        return payment, amount, currency, None, False
+    # The previous holder may have stored a session just before we claimed
+    payment.refresh_from_db()
+    cached = _cached_session(payment, amount, currency)
+    if cached is not None:
+        _release_checkout(payment)
+    return payment, amount, currency, cached, cached is None
+
+
+def _release_checkout(payment: Payment) -> None:
+    Payment.objects.filter(pk=payment.pk).update(checkout_lock_until=None)
+
+
+def _checkout_session_params(order, amount: Decimal, currency: str) -> dict:
     success_url = f"{_site_url()}{reverse('payments:checkout_success')}?order={order.id}&session_id={{CHECKOUT_SESSION_ID}}"
     cancel_url = f"{_site_url()}{reverse('payments:checkout_cancel')}?order={order.id}"
 
     line_items = [{
         "price_data": {
-            "currency": _currency(),
+            "currency": currency,
             "product_data": {"name": f"Order #{order.id}"},
             "unit_amount": _money_cents(amount),
         },
         "quantity": 1,
     }]
+    return {
+        "mode": "payment",
+        "payment_method_types": ["card"],
+        "line_items": line_items,
+        "metadata": {"order_id": str(order.id)},
+        "success_url": success_url,
+        "cancel_url": cancel_url,
+    }
+
+
+def _store_session(payment: Payment, session, amount: Decimal, currency: str) -> None:
+    """Persist identifiers + cache for reuse."""
+    try:
+        expires_ts = session.get("expires_at") or getattr(session, "expires_at", None)
+        payment.stripe_session_id = session.get("id", "") or getattr(session, "id", "")
+        payment.stripe_payment_intent = session.get("payment_intent", "") or getattr(session, "payment_intent", "") or ""
+        payment.stripe_session_url = session.get("url", "") or getattr(session, "url", "") or ""
+        payment.stripe_session_expires_at = (
+            datetime.fromtimestamp(int(expires_ts), tz=dt_timezone.utc) if expires_ts else None
+        )
+        payment.stripe_session_amount = amount
+        payment.stripe_session_currency = currency
+        payment.save(update_fields=[
+            "stripe_session_id",
+            "stripe_payment_intent",
+            "stripe_session_url",
+            "stripe_session_expires_at",
+            "stripe_session_amount",
+            "stripe_session_currency",
+        ])
+    except Exception:
+        logger.exception("Failed to persist Stripe IDs for order %s", payment.order_id)
 
-    session = stripe.checkout.Session.create(
-        mode="payment",
-        payment_method_types=["card"],
-        line_items=line_items,
-        metadata={"order_id": str(order.id)},
-        success_url=success_url,
-        cancel_url=cancel_url,
-    )
 
-    # Persist identifiers
+def create_checkout_session(order):
+    """
+    Create a Stripe Checkout Session for the order (single aggregate line).
+    Reuses the open session stored on the Payment when the order's amount and
+    currency are unchanged; otherwise expires it and creates a new one.
+
+    Only the request holding the order's checkout lease (_claim_checkout)
+    talks to Stripe, so two tabs never each mint a session; the other one
+    waits for the stored session. No transaction is held across Stripe.
+    """
+    if not stripe.api_key:
+        raise RuntimeError("Stripe secret key is not configured.")
+
+    deadline = time.monotonic() + _CHECKOUT_WAIT
+    while True:
+        payment, amount, currency, cached, claimed = _claim_checkout(order)
+        if cached is not None:
+            return cached
+        if claimed:
+            break
+        if time.monotonic() > deadline:
+            raise ValueError("Checkout is already being started for this order; try again.")
+        time.sleep(_CHECKOUT_POLL)
+
     try:
-        if hasattr(payment, "stripe_session_id"):
-            payment.stripe_session_id = session.get("id", "") or getattr(session, "id", "")
-        if hasattr(payment, "stripe_payment_intent"):
-            payment.stripe_payment_intent = session.get("payment_intent", "") or getattr(session, "payment_intent", "") or ""
-        payment.save(update_fields=[f for f in ["stripe_session_id", "stripe_payment_intent"] if hasattr(payment, f)])
-    except Exception:
-        logger.exception("Failed to persist Stripe IDs for order %s", order.id)
+        if payment.stripe_session_id and not payment.is_paid:
+            _expire_stale_session(payment.stripe_session_id)
+        session = stripe.checkout.Session.create(**_checkout_session_params(order, amount, currency))
+        _store_session(payment, session, amount, currency)
+    finally:
+        _release_checkout(payment)
+    return session
 
+
+async def acreate_checkout_session(order):
+    """
+    Async variant of create_checkout_session for ASGI views, with the same
+    checkout lease. Stripe calls go through the SDK's non-blocking client
+    (httpx); DB work runs in the thread-sensitive sync executor, and waiting
+    for another request's lease sleeps without blocking the worker.
+    """
+    if not stripe.api_key:
+        raise RuntimeError("Stripe secret key is not configured.")
+
+    claim = sync_to_async(_claim_checkout, thread_sensitive=True)
+    deadline = time.monotonic() + _CHECKOUT_WAIT
+    while True:
+        payment, amount, currency, cached, claimed = await claim(order)
+        if cached is not None:
+            return cached
+        if claimed:
+            break
+        if time.monotonic() > deadline:
+            raise ValueError("Checkout is already being started for this order; try again.")
+        await asyncio.sleep(_CHECKOUT_POLL)
+
+    try:
+        if payment.stripe_session_id and not payment.is_paid:
+            await _aexpire_stale_session(payment.stripe_session_id)
+        session = await stripe.checkout.Session.create_async(**_checkout_session_params(order, amount, currency))
+        await sync_to_async(_store_session, thread_sensitive=True)(payment, session, amount, currency)
+    finally:
+        await sync_to_async(_release_checkout, thread_sensitive=True)(payment)
     return session
 
 
+async def aretrieve_checkout_session(session_id: str):
+    return await stripe.checkout.Session.retrieve_async(session_id)
+
+
+# ---------- Reverse lookups by Stripe identifiers ----------
+def find_payment(
+    session_id: Optional[str] = None,
+    payment_intent_id: Optional[str] = None,
+    order_id=None,
+) -> Optional[Payment]:
+    """
+    Resolve a Payment from Stripe identifiers using the indexed columns
+    (session id first, then payment intent). metadata.order_id is only
+    consulted when neither id matches.
+    """
+    qs = Payment.objects.select_related("order")
+    if session_id:
+        pay = qs.filter(stripe_session_id=session_id).first()
+        if pay:
+            return pay
+    if payment_intent_id:
+        pay = qs.filter(stripe_payment_intent=payment_intent_id).first()
+        if pay:
+            return pay
+    if order_id:
+        try:
+            return qs.filter(order_id=int(order_id)).first()
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def find_order_for_checkout_session(data) -> Optional["Order"]:
+    """
+    Order for a Stripe checkout.session object (webhook payload or API
+    result). Falls back to metadata.order_id for orders that never got a
+    Payment row.
+    """
+    from orders.models import Order
+
+    data = data or {}
+    order_id = (data.get("metadata") or {}).get("order_id")
+    pay = find_payment(data.get("id"), data.get("payment_intent"), order_id)
+    if pay:
+        return pay.order
+    if not order_id:
+        return None
+    try:
+        return Order.objects.filter(pk=int(order_id)).first()
+    except (TypeError, ValueError):
+        return None
+
+
+def release_expired_checkout(order, session_id: str) -> bool:
+    """
+    Give back what an abandoned checkout held (loyalty reward, coupon use)
+    when Stripe expires `session_id`. Only if that session is the order's
+    current one, or the order has no live session left: a stale expiry
+    must not strip a newer checkout, and a paid order keeps its holds. The
+    Payment row lock orders this against _store_session and mark_paid, and
+    a held checkout lease counts as live.
+    Returns whether anything was released.
+    """
+    from coupons.services import release_coupon_for_order
+    from loyality.services import release_reward_for_order
+    from orders.models import Order
+
+    now = timezone.now()
+    with transaction.atomic():
+        payment = Payment.objects.select_for_update().filter(order=order).first()
+        if payment is not None and payment.is_paid:
+            return False
+        if Order.objects.filter(pk=order.pk, status="PAID").exists():
+            return False
+        if payment is not None and payment.stripe_session_id != session_id:
+            starting = payment.checkout_lock_until is not None and payment.checkout_lock_until > now
+            expires = payment.stripe_session_expires_at
+            live = bool(payment.stripe_session_id) and (expires is None or expires > now)
+            if starting or live:
+                return False
+        release_reward_for_order(order)
+        release_coupon_for_order(order)
+    return True
+
+
+def payments_by_stripe_ids(session_ids=(), payment_intent_ids=()) -> dict:
+    """
+    Bulk variant for reconciliation: {stripe id: Payment} for every session
+    id / payment intent that exists locally, in two indexed IN queries.
+    """
+    out = {}
+    session_ids = [x for x in session_ids if x]
+    intent_ids = [x for x in payment_intent_ids if x]
+    if session_ids:
+        for pay in Payment.objects.select_related("order").filter(stripe_session_id__in=session_ids):
+            out[pay.stripe_session_id] = pay
+    if intent_ids:
+        for pay in Payment.objects.select_related("order").filter(stripe_payment_intent__in=intent_ids):
+            out.setdefault(pay.stripe_payment_intent, pay)
+    return out
+
+
 def mark_paid(order, payment_intent_id: Optional[str] = None, session_id: Optional[str] = None) -> None:
     """
     Mark the order and its Payment record as paid.
+    The Payment row is locked so concurrent callers (webhook + success page)
+    see a single unpaid -> paid transition; the order.paid outbox event is
+    written by payments.signals in this same transaction.
     """
     try:
-        pay = ensure_payment(order)
-        changed = False
-
-        if hasattr(pay, "is_paid") and not pay.is_paid:
-            pay.is_paid = True
-            changed = True
-        if payment_intent_id and hasattr(pay, "stripe_payment_intent"):
-            pay.stripe_payment_intent = payment_intent_id
-            changed = True
-        if session_id and hasattr(pay, "stripe_session_id"):
-            pay.stripe_session_id = session_id
-            changed = True
-
-        if changed:
-            fields = []
-            for f in ["is_paid", "stripe_payment_intent", "stripe_session_id"]:
-                if hasattr(pay, f):
-                    fields.append(f)
-            pay.save(update_fields=fields)
-
-        if hasattr(order, "status"):
-            if getattr(order, "status") != "PAID":
-                order.status = "PAID"
-                order.save(update_fields=["status"])
+        with transaction.atomic():
+            _mark_paid_locked(order, payment_intent_id, session_id)
     except Exception as e:
         logger.exception("mark_paid failed: %s", e)
 
 
+def _mark_paid_locked(order, payment_intent_id: Optional[str], session_id: Optional[str]) -> None:
+    pay = ensure_payment(order)
+    pay = Payment.objects.select_for_update().get(pk=pay.pk)
+    changed = False
+
+    if hasattr(pay, "is_paid") and not pay.is_paid:
+        pay.is_paid = True
+        changed = True
+    if payment_intent_id and hasattr(pay, "stripe_payment_intent"):
+        pay.stripe_payment_intent = payment_intent_id
+        changed = True
+    if session_id and hasattr(pay, "stripe_session_id"):
+        pay.stripe_session_id = session_id
+        changed = True
+
+    if changed:
+        fields = []
+        for f in ["is_paid", "stripe_payment_intent", "stripe_session_id"]:
+            if hasattr(pay, f):
+                fields.append(f)
+        pay.save(update_fields=fields)
+
+    if hasattr(order, "status"):
+        if getattr(order, "status") != "PAID":
+            order.status = "PAID"
+            order.save(update_fields=["status"])
+
+
+async def amark_paid(order, payment_intent_id: Optional[str] = None, session_id: Optional[str] = None) -> None:
+    """Async wrapper: mark_paid needs a transaction, so it runs whole in the sync thread."""
+    await sync_to_async(mark_paid, thread_sensitive=True)(order, payment_intent_id, session_id)
+
+
 # ---------- Optional: PDF invoice (safe no-op if reportlab not installed) ----------
-def generate_order_invoice_pdf(order) -> Tuple[Optional[str], Optional[bytes]]:
+# Bump when the PDF layout changes so every invoice re-renders once.
+INVOICE_RENDER_VERSION = 1
+
+
+def invoice_data(order) -> dict:
+    """
+    Plain-data snapshot of everything the invoice prints. Its hash is the
+    content key: same priced contents -> same PDF, no re-render.
+    """
+    prefetch_related_objects([order], "items__menu_item")
+    items = []
+    for it in order.items.all():
+        items.append({
+            "name": getattr(getattr(it, "menu_item", None), "name", "Item"),
+            "quantity": int(getattr(it, "quantity", 0) or 0),
+            "unit_price": str(getattr(it, "unit_price", 0)),
+        })
+    return {
+        "v": INVOICE_RENDER_VERSION,
+        "order_id": order.id,
+        "currency": _currency().upper(),
+        "total": str(compute_order_total(order)),
+        "items": items,
+    }
+
+
+def invoice_content_hash(data: dict) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def render_invoice_pdf(data: dict) -> Optional[bytes]:
+    """Render invoice bytes from invoice_data(); no ORM access."""
     try:
         from reportlab.lib.pagesizes import A4
-        from reportlab.lib.units import mm
         from reportlab.pdfgen import canvas
     except Exception:
         logger.info("reportlab not installed; skipping invoice pdf generation")
-        return (None, None)
+        return None
 
     buf = BytesIO()
     c = canvas.Canvas(buf, pagesize=A4)
+    draw_invoice_page(c, data)
+    c.save()
+    pdf = buf.getvalue()
+    buf.close()
+    return pdf
+
+
+def draw_invoice_page(c, data: dict) -> None:
+    """Draw one invoice page from invoice_data() onto a reportlab canvas (ends the page)."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+
     width, height = A4
 
     y = height - 30 * 1 * mm
     c.setFont("Helvetica-Bold", 14)
-    c.drawString(30 * mm, y, f"Invoice — Order #{order.id}")
+    c.drawString(30 * mm, y, f"Invoice — Order #{data['order_id']}")
     y -= 12 * mm
 
     c.setFont("Helvetica", 11)
-    c.drawString(30 * mm, y, f"Total: {compute_order_total(order)} {_currency().upper()}")
+    c.drawString(30 * mm, y, f"Total: {data['total']} {data['currency']}")
     y -= 8 * mm
 
-    try:
-        for it in order.items.all():
-            name = getattr(getattr(it, "menu_item", None), "name", "Item")
-            qty = getattr(it, "quantity", 0)
-            unit = getattr(it, "unit_price", 0)
-            c.drawString(30 * mm, y, f"- {name} x {qty} @ {unit}")
-            y -= 6 * mm
-    except Exception:
-        pass
+    for it in data["items"]:
+        c.drawString(30 * mm, y, f"- {it['name']} x {it['quantity']} @ {it['unit_price']}")
+        y -= 6 * mm
 
     c.showPage()
-    c.save()
-    data = buf.getvalue()
-    buf.close()
 
-    filename = f"invoice_order_{order.id}.pdf"
-    return (filename, data)
+
+def generate_order_invoice_pdf(order) -> Tuple[Optional[str], Optional[bytes]]:
+    data = invoice_data(order)
+    pdf = render_invoice_pdf(data)
+    if not pdf:
+        return (None, None)
+    filename = f"invoice_order_{order.id}_{invoice_content_hash(data)[:12]}.pdf"
+    return (filename, pdf)
+
+
+def invoice_is_current(order, data: Optional[dict] = None) -> bool:
+    """True if the stored PDF was rendered from the order's current priced contents."""
+    if not getattr(order, "invoice_pdf", None):
+        return False
+    data = data if data is not None else invoice_data(order)
+    return bool(order.invoice_hash) and order.invoice_hash == invoice_content_hash(data)
 
 
 def save_invoice_pdf_file(order) -> Optional[str]:
+    """
+    Content-addressed render: re-renders only when the hash of the order's
+    priced contents differs from Order.invoice_hash. Meant for workers
+    (payments.tasks.render_invoice / the order.paid outbox handler); request
+    paths call request_invoice_render() instead.
+    """
     try:
-        filename, pdf_bytes = generate_order_invoice_pdf(order)
-        if not filename or not pdf_bytes:
+        data = invoice_data(order)
+        digest = invoice_content_hash(data)
+        if order.invoice_pdf and order.invoice_hash == digest:
+            return order.invoice_pdf.name
+
+        pdf_bytes = render_invoice_pdf(data)
+        if not pdf_bytes:
             return None
-        if hasattr(order, "invoice_pdf"):
-            from django.core.files.base import ContentFile
-            if not order.invoice_pdf:
-                order.invoice_pdf.save(filename, ContentFile(pdf_bytes), save=True)
-        return filename
+        return _store_invoice_pdf(order, digest, pdf_bytes)
     except Exception as e:
         logger.exception("Failed to save invoice PDF: %s", e)
         return None
+
+
+def _store_invoice_pdf(order, digest: str, pdf_bytes: bytes) -> str:
+    from django.core.files.base import ContentFile
+    if order.invoice_pdf:
+        order.invoice_pdf.delete(save=False)
+    order.invoice_pdf.save(f"invoice_order_{order.id}_{digest[:12]}.pdf", ContentFile(pdf_bytes), save=False)
+    order.invoice_hash = digest
+    order.save(update_fields=["invoice_pdf", "invoice_hash"])
+    return order.invoice_pdf.name
+
+
+def save_invoice_pdf_files(orders, force: bool = False, workers: Optional[int] = None) -> int:
+    """
+    Bulk variant of save_invoice_pdf_file for reprints/re-issues: snapshots
+    every order, renders the stale ones on the process-pool render farm and
+    stores the bytes. Returns how many invoices were (re)written.
+    """
+    from payments.render_farm import render_many
+
+    todo = []
+    for order in orders:
+        data = invoice_data(order)
+        digest = invoice_content_hash(data)
+        if force or not (order.invoice_pdf and order.invoice_hash == digest):
+            todo.append((order, digest, data))
+    if not todo:
+        return 0
+
+    pdfs = render_many([("invoice", data) for _, _, data in todo], workers=workers)
+    saved = 0
+    for (order, digest, _), pdf_bytes in zip(todo, pdfs):
+        if not pdf_bytes:
+            continue
+        try:
+            _store_invoice_pdf(order, digest, pdf_bytes)
+            saved += 1
+        except Exception as e:
+            logger.exception("Failed to save invoice PDF for order %s: %s", order.pk, e)
+    return saved
+
+
+def _enqueue_invoice_render(order_id: int) -> None:
+    try:
+        from payments.tasks import render_invoice
+        render_invoice.apply_async(args=[order_id], retry=False)
+    except Exception as e:
+        logger.info("Invoice render for order %s not queued: %s", order_id, e)
+
+
+def request_invoice_render(order) -> None:
+    """Queue a (re-)render after the current transaction commits. Never renders inline."""
+    order_id = order.pk
+    transaction.on_commit(lambda: _enqueue_invoice_render(order_id))
@@ -0,0 +1,26 @@
+# payments/tasks.py
+from __future__ import annotations
+from celery import shared_task
+
+from payments.outbox import dispatch_pending
+
+
+@shared_task
+def dispatch_outbox(limit: int = 100) -> int:
+    """
+    Consume pending outbox events (order.paid fan-out). Kicked on commit after
+    each paid transition and swept by beat in case the broker was unreachable.
+    """
+    return dispatch_pending(limit)
+
+
+@shared_task
+def render_invoice(order_id: int) -> str:
+    """Render the invoice PDF if the order's priced contents changed since the last render."""
+    from orders.models import Order
+    from payments.services import save_invoice_pdf_file
+
+    order = Order.objects.filter(pk=order_id).first()
+    if not order:
+        return ""
+    return save_invoice_pdf_file(order) or ""
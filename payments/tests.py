@@ -0,0 +1,257 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from orders.models import Order
+
+from . import outbox
+from .models import OutboxEvent, Payment
+from .services import _claim_checkout, _release_checkout
+
+
+@override_settings(OUTBOX_RETRY_SECONDS=30, OUTBOX_MAX_ATTEMPTS=3)
+class OutboxRetryTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(source="UBER_EATS")
+        self.event = OutboxEvent.objects.create(topic=OutboxEvent.TOPIC_ORDER_PAID, order=self.order)
+        self.calls = {"ok": 0, "flaky": 0}
+        self.fail = True
+
+        def ok(event):
+            self.calls["ok"] += 1
+
+        def flaky(event):
+            self.calls["flaky"] += 1
+            if self.fail:
+                raise RuntimeError("printer offline")
+
+        patcher = mock.patch.dict(outbox._HANDLERS, {OutboxEvent.TOPIC_ORDER_PAID: [ok, flaky]}, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _make_due(self):
+        OutboxEvent.objects.filter(pk=self.event.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+    def test_failed_handler_is_retried_and_others_are_not_rerun(self):
+        self.assertTrue(outbox.process_event(self.event.pk))
+        self.event.refresh_from_db()
+        self.assertIsNone(self.event.processed_at)
+        self.assertEqual(self.event.done_handlers, ["ok"])
+        self.assertIn("printer offline", self.event.last_error)
+        self.assertGreater(self.event.next_attempt_at, timezone.now())
+
+        # Not due yet: neither a direct call nor the sweep picks it up
+        self.assertFalse(outbox.process_event(self.event.pk))
+        self.assertEqual(outbox.dispatch_pending(), 0)
+
+        self.fail = False
+        self._make_due()
+        self.assertEqual(outbox.dispatch_pending(), 1)
+        self.event.refresh_from_db()
+        self.assertIsNotNone(self.event.processed_at)
+        self.assertEqual(self.event.last_error, "")
+        self.assertEqual(self.event.attempts, 2)
+        self.assertEqual(self.calls, {"ok": 1, "flaky": 2})
+
+    def test_backoff_doubles_per_attempt(self):
+        outbox.process_event(self.event.pk)
+        self.event.refresh_from_db()
+        first = self.event.next_attempt_at - timezone.now()
+        self._make_due()
+        outbox.process_event(self.event.pk)
+        self.event.refresh_from_db()
+        second = self.event.next_attempt_at - timezone.now()
+        self.assertAlmostEqual(first.total_seconds(), 30, delta=2)
+        self.assertAlmostEqual(second.total_seconds(), 60, delta=2)
+
+    def test_gives_up_after_max_attempts(self):
+        for _ in range(3):
+            self._make_due()
+            outbox.process_event(self.event.pk)
+        self.event.refresh_from_db()
+        self.assertIsNotNone(self.event.processed_at)
+        self.assertTrue(self.event.last_error.startswith("Gave up after 3 attempts"))
+        self.assertFalse(outbox.process_event(self.event.pk))
+
+
+class CheckoutLeaseTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(source="UBER_EATS", tip_amount="25.00")
+
+    def test_second_checkout_waits_for_the_first(self):
+        payment, _, _, cached, claimed = _claim_checkout(self.order)
+        self.assertIsNone(cached)
+        self.assertTrue(claimed)
+        self.assertEqual(_claim_checkout(self.order)[3:], (None, False))
+
+        _release_checkout(payment)
+        self.assertTrue(_claim_checkout(self.order)[4])
+
+    def test_expired_lease_can_be_taken_over(self):
+        payment = _claim_checkout(self.order)[0]
+        Payment.objects.filter(pk=payment.pk).update(checkout_lock_until=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(_claim_checkout(self.order)[4])
+
+
+class MergedInvoiceStreamTests(TestCase):
+    def _data(self, order):
+        return {"order_id": order.pk, "total": "12.50", "currency": "usd",
+                "items": [{"name": "Momo (veg)", "quantity": 2, "unit_price": "5.00"}]}
+
+    def test_pages_are_streamed_and_xref_points_at_objects(self):
+        from . import invoice_export
+
+        orders = [Order(pk=n) for n in range(1, 4)]
+        read = []
+
+        def lazy():
+            for order in orders:
+                read.append(order.pk)
+                yield order
+
+        with mock.patch.object(invoice_export, "invoice_data", self._data):
+            stream = invoice_export.stream_merged_invoice_pdf(lazy())
+            first = next(stream)
+            self.assertEqual(read, [1])
+            self.assertIn(b"/Type /Page ", first)
+            pdf = first + b"".join(stream)
+
+        self.assertTrue(pdf.startswith(b"%PDF-1.4") and pdf.endswith(b"%%EOF\n"))
+        xref_at = int(pdf.rsplit(b"startxref\n", 1)[1].split(b"\n", 1)[0])
+        rows = pdf[xref_at:].split(b"\n")
+        count = int(rows[1].split()[1])
+        for num in range(1, count):
+            offset = int(rows[2 + num].split()[0])
+            self.assertTrue(pdf[offset:].startswith(b"%d 0 obj" % num))
+        self.assertIn(b"/Count 3", pdf)
+
+
+class InvoiceExportFilterTests(TestCase):
+    def test_orders_paid_through_mark_paid_are_exported(self):
+        from .invoice_export import filter_orders
+        from .services import mark_paid
+
+        paid = Order.objects.create(source="UBER_EATS")
+        Order.objects.create(source="UBER_EATS")
+        mark_paid(paid, session_id="cs_paid")
+
+        self.assertEqual(list(filter_orders(Order.objects.all())), [paid])
+        self.assertEqual(filter_orders(Order.objects.all(), paid_only=False).count(), 2)
+
+
+class PaidEventTests(TestCase):
+    def test_failed_event_write_rolls_back_the_paid_transition(self):
+        from .services import mark_paid
+
+        order = Order.objects.create(source="UBER_EATS")
+        Payment.objects.create(order=order)
+        with mock.patch("payments.signals.record_order_paid", side_effect=RuntimeError("db down")), \
+                self.assertLogs("payments.services", "ERROR"):
+            mark_paid(order, session_id="cs_1")
+        self.assertFalse(Payment.objects.get(order=order).is_paid)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, "PENDING")
+
+        mark_paid(Order.objects.get(pk=order.pk), session_id="cs_1")
+        self.assertTrue(Payment.objects.get(order=order).is_paid)
+        self.assertEqual(OutboxEvent.objects.filter(order=order).count(), 1)
+
+
+class ExpiredSessionTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from loyality.models import LoyaltyReward
+
+        user = get_user_model().objects.create_user(username="guest")
+        self.order = Order.objects.create(created_by=user, source="UBER_EATS", tip_amount="25.00")
+        self.reward = LoyaltyReward.objects.create(
+            user=user, reward_type=LoyaltyReward.TYPE_FIXED, reward_amount="5.00", reserved_order_id=self.order.pk,
+        )
+        Payment.objects.create(
+            order=self.order, stripe_session_id="cs_new",
+            stripe_session_expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+    def _expire(self, session_id):
+        from .views import _handle_webhook_event
+
+        _handle_webhook_event({"type": "checkout.session.expired", "data": {"object": {
+            "id": session_id, "metadata": {"order_id": str(self.order.pk)},
+        }}})
+        self.reward.refresh_from_db()
+
+    def test_stale_session_expiry_keeps_the_newer_checkouts_reward(self):
+        self._expire("cs_old")
+        self.assertEqual(self.reward.reserved_order_id, self.order.pk)
+
+    def test_current_session_expiry_releases_the_reward(self):
+        self._expire("cs_new")
+        self.assertIsNone(self.reward.reserved_order_id)
+
+    def test_expiry_after_payment_keeps_the_reward(self):
+        from .services import mark_paid
+
+        mark_paid(self.order, session_id="cs_new")
+        self._expire("cs_new")
+        self.assertEqual(self.reward.reserved_order_id, self.order.pk)
+
+    def test_stale_expiry_releases_when_no_session_is_live(self):
+        Payment.objects.filter(order=self.order).update(stripe_session_expires_at=timezone.now() - timedelta(minutes=1))
+        self._expire("cs_old")
+        self.assertIsNone(self.reward.reserved_order_id)
+
+
+class ArchiveInvoicesTests(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        from django.core.files.base import ContentFile
+
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media, INVOICE_ARCHIVE_STORAGE="default")
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        tz = timezone.get_current_timezone()
+        self.orders = {}
+        for label, created in (("jan-a", (2024, 1, 3)), ("jan-b", (2024, 1, 31, 23)), ("feb", (2024, 2, 1, 0, 30))):
+            order = Order.objects.create(source="UBER_EATS")
+            order.invoice_pdf.save(f"invoice_{label}.pdf", ContentFile(b"%PDF-1.4 " + label.encode()), save=True)
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(datetime(*created), tz))
+            self.orders[label] = order
+        recent = Order.objects.create(source="UBER_EATS")
+        recent.invoice_pdf.save("invoice_recent.pdf", ContentFile(b"%PDF-1.4 recent"), save=True)
+
+    def _run(self, *args):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command("archive_invoices", "--older-than-days", "30", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_counts_by_local_month(self):
+        out = self._run("--dry-run")
+        self.assertIn("2024-01: 2 invoices", out)
+        self.assertIn("2024-02: 1 invoices", out)
+        self.assertFalse(Order.objects.exclude(invoice_archived_to="").exists())
+
+    def test_each_month_gets_its_own_zip(self):
+        import zipfile
+        from django.core.files.storage import default_storage
+
+        out = self._run("--batch", "1")
+        self.assertIn("Archived 3 of 3 invoices (zip)", out)
+        archived = dict(Order.objects.exclude(invoice_archived_to="").values_list("pk", "invoice_archived_to"))
+        self.assertEqual(
+            {archived[self.orders[label].pk].split("#")[0] for label in ("jan-a", "jan-b")},
+            {"archive/invoices/2024-01.zip"},
+        )
+        self.assertTrue(archived[self.orders["feb"].pk].startswith("archive/invoices/2024-02.zip#"))
+        with default_storage.open("archive/invoices/2024-01.zip", "rb") as fh:
+            self.assertEqual(len(zipfile.ZipFile(fh).namelist()), 2)
+        self.assertEqual(Order.objects.exclude(invoice_pdf="").count(), 1)
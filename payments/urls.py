@@ -1,12 +1,19 @@
 # payments/urls.py
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = "payments"
 
+# Under ASGI (uvicorn/daphne) serve the async variants so Stripe latency doesn't pin a worker.
+if getattr(settings, "PAYMENTS_ASYNC_VIEWS", False):
+    _checkout, _webhook, _success = views.acreate_checkout_session_view, views.astripe_webhook, views.acheckout_success
+else:
+    _checkout, _webhook, _success = views.create_checkout_session_view, views.stripe_webhook, views.checkout_success
+
 urlpatterns = [
-    path("create-checkout-session/<int:order_id>/", views.create_checkout_session_view, name="create_checkout_session"),
-    path("webhook/", views.stripe_webhook, name="stripe_webhook"),
-    path("success/", views.checkout_success, name="checkout_success"),
+    path("create-checkout-session/<int:order_id>/", _checkout, name="create_checkout_session"),
+    path("webhook/", _webhook, name="stripe_webhook"),
+    path("success/", _success, name="checkout_success"),
     path("cancel/", views.checkout_cancel, name="checkout_cancel"),
 ]
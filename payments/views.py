@@ -3,17 +3,24 @@ import json
 import logging
 
 import stripe
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse, JsonResponse, HttpResponseRedirect
-from django.shortcuts import get_object_or_404, render
+from django.shortcuts import aget_object_or_404, get_object_or_404, render
 from django.views.decorators.csrf import csrf_exempt
 
 from orders.models import Order
 from payments.services import (
+    acreate_checkout_session,
+    amark_paid,
+    aretrieve_checkout_session,
     create_checkout_session,
+    find_order_for_checkout_session,
+    invoice_is_current,
     mark_paid,
-    save_invoice_pdf_file,
+    release_expired_checkout,
+    request_invoice_render,
 )
 
 logger = logging.getLogger(__name__)
@@ -64,10 +71,45 @@ def create_checkout_session_view(request, order_id: int):
         return JsonResponse({"detail": "Server error"}, status=500)
 
 
-@csrf_exempt
-def stripe_webhook(request):
+@login_required(login_url="/")
+async def acreate_checkout_session_view(request, order_id: int):
     """
-    Handle Stripe webhooks.
+    Async variant of create_checkout_session_view (ASGI). Same contract; the
+    worker is free while Stripe is creating the session.
+    """
+    order = await aget_object_or_404(Order, pk=order_id)
+
+    if request.method == "GET":
+        try:
+            session = await acreate_checkout_session(order)
+            url = getattr(session, "url", None)
+            if url:
+                return HttpResponseRedirect(url)
+            return HttpResponse("No checkout URL returned.", status=500)
+        except Exception as e:
+            logger.exception("Failed to create checkout session: %s", e)
+            return HttpResponse("Failed to start checkout", status=400)
+
+    if request.method != "POST":
+        return HttpResponse(status=405)
+
+    try:
+        session = await acreate_checkout_session(order)
+        return JsonResponse({"url": getattr(session, "url", None)}, status=201)
+    except ValueError as e:
+        logger.warning("Stripe session error: %s", e)
+        return JsonResponse({"detail": str(e)}, status=400)
+    except stripe.error.StripeError as e:
+        logger.exception("Stripe error: %s", e)
+        return JsonResponse({"detail": "Payment provider error"}, status=502)
+    except Exception as e:
+        logger.exception("Unknown error: %s", e)
+        return JsonResponse({"detail": "Server error"}, status=500)
+
+
+def _construct_webhook_event(request):
+    """
+    Verify the Stripe signature. Returns the event or None if invalid.
     Make sure STRIPE_WEBHOOK_SECRET in .env has NO trailing spaces/newlines.
     """
     payload = request.body
@@ -75,35 +117,73 @@ def stripe_webhook(request):
     endpoint_secret = (getattr(settings, "STRIPE_WEBHOOK_SECRET", "") or "").strip()
 
     try:
-        event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
+        return stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
     except (ValueError, stripe.error.SignatureVerificationError) as e:
         logger.warning("Invalid webhook signature or payload: %s", e)
-        return HttpResponse(status=400)
+        return None
 
+
+def _handle_webhook_event(event) -> None:
     etype = event.get("type")
     data = event.get("data", {}).get("object", {}) or {}
 
+    if etype in ("checkout.session.completed", "checkout.session.async_payment_succeeded"):
+        # Indexed lookup by session / payment intent; metadata.order_id only as fallback
+        order = find_order_for_checkout_session(data)
+        if order is None:
+            logger.warning(
+                "Webhook for unknown session=%s order_id=%s",
+                data.get("id"), (data.get("metadata") or {}).get("order_id"),
+            )
+        else:
+            # Invoice is rendered by the order.paid outbox worker
+            mark_paid(order, payment_intent_id=data.get("payment_intent"), session_id=data.get("id"))
+
+    elif etype == "checkout.session.expired":
+        # An abandoned checkout gives its loyalty reward and coupon use back,
+        # unless the order has been paid or moved on to a newer live session
+        order = find_order_for_checkout_session(data)
+        if order is not None:
+            try:
+                release_expired_checkout(order, data.get("id") or "")
+            except Exception as e:
+                logger.info("Could not release checkout holds for order %s: %s", order.pk, e)
+
+    elif etype in ("checkout.session.async_payment_failed", "payment_intent.payment_failed"):
+        # Optional: set FAILED, notify user, etc.
+        pass
+
+
+@csrf_exempt
+def stripe_webhook(request):
+    """
+    Handle Stripe webhooks.
+    """
+    event = _construct_webhook_event(request)
+    if event is None:
+        return HttpResponse(status=400)
+
     try:
-        if etype in ("checkout.session.completed", "checkout.session.async_payment_succeeded"):
-            order_id = (data.get("metadata") or {}).get("order_id")
-            payment_intent_id = data.get("payment_intent")
-            session_id = data.get("id")
-
-            if order_id:
-                try:
-                    order = Order.objects.get(pk=int(order_id))
-                    mark_paid(order, payment_intent_id=payment_intent_id, session_id=session_id)
-                    try:
-                        save_invoice_pdf_file(order)  # idempotent
-                    except Exception:
-                        pass
-                except Order.DoesNotExist:
-                    logger.warning("Webhook for unknown order_id=%s", order_id)
-
-        elif etype in ("checkout.session.async_payment_failed", "payment_intent.payment_failed"):
-            # Optional: set FAILED, notify user, etc.
-            pass
+        _handle_webhook_event(event)
+    except Exception as e:
+        logger.exception("Webhook processing failed: %s", e)
+        return HttpResponse(status=500)
 
+    return HttpResponse(status=200)
+
+
+@csrf_exempt
+async def astripe_webhook(request):
+    """
+    Async variant of stripe_webhook. Signature check is CPU-only; the DB
+    work runs as one unit in the thread-sensitive sync executor.
+    """
+    event = _construct_webhook_event(request)
+    if event is None:
+        return HttpResponse(status=400)
+
+    try:
+        await sync_to_async(_handle_webhook_event, thread_sensitive=True)(event)
     except Exception as e:
         logger.exception("Webhook processing failed: %s", e)
         return HttpResponse(status=500)
@@ -111,20 +191,34 @@ def stripe_webhook(request):
     return HttpResponse(status=200)
 
 
+def _load_order(oid):
+    if not oid:
+        return None
+    try:
+        return Order.objects.get(pk=int(oid))
+    except (Order.DoesNotExist, ValueError):
+        return None
+
+
+def _invoice_url(order):
+    """URL of the invoice if it matches the order's current contents; else queue a render."""
+    if not order:
+        return None
+    try:
+        if invoice_is_current(order):
+            return order.invoice_pdf.url
+        request_invoice_render(order)
+    except Exception:
+        pass
+    return None
+
+
 def checkout_success(request):
     """
     Simple thank-you page. If session_id is present, we try to fetch & verify it.
     """
-    oid = request.GET.get("order")
     session_id = request.GET.get("session_id")
-    order = None
-    invoice_url = None
-
-    if oid:
-        try:
-            order = Order.objects.get(pk=int(oid))
-        except Order.DoesNotExist:
-            order = None
+    order = _load_order(request.GET.get("order"))
 
     # Optional: verify session status
     if session_id and stripe.api_key:
@@ -135,14 +229,7 @@ def checkout_success(request):
         except Exception:
             pass
 
-    if order:
-        try:
-            if not getattr(order, "invoice_pdf", None) or not order.invoice_pdf:
-                save_invoice_pdf_file(order)
-            if getattr(order, "invoice_pdf", None) and order.invoice_pdf:
-                invoice_url = order.invoice_pdf.url
-        except Exception:
-            pass
+    invoice_url = _invoice_url(order)
 
     # Clear server-side session cart (if used in your flow)
     try:
@@ -154,5 +241,34 @@ def checkout_success(request):
     return render(request, "payments/checkout_success.html", {"order": order, "invoice_url": invoice_url})
 
 
+async def acheckout_success(request):
+    """
+    Async variant of checkout_success; the Stripe session lookup does not
+    block a worker.
+    """
+    session_id = request.GET.get("session_id")
+    order = await sync_to_async(_load_order, thread_sensitive=True)(request.GET.get("order"))
+
+    if session_id and stripe.api_key:
+        try:
+            sess = await aretrieve_checkout_session(session_id)
+            if sess and getattr(sess, "payment_status", "") == "paid" and order:
+                await amark_paid(order, getattr(sess, "payment_intent", None), getattr(sess, "id", None))
+        except Exception:
+            pass
+
+    invoice_url = await sync_to_async(_invoice_url, thread_sensitive=True)(order)
+
+    try:
+        await request.session.aset("cart", [])
+    except Exception:
+        pass
+
+    # Context processors may touch request.user lazily -> render in the sync thread
+    return await sync_to_async(render, thread_sensitive=True)(
+        request, "payments/checkout_success.html", {"order": order, "invoice_url": invoice_url}
+    )
+
+
 def checkout_cancel(request):
     return render(request, "payments/checkout_cancel.html")
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class ReservationsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "reservations"
+
+    def ready(self):
+        # drop cached availability matrices when reservations/tables change
+        from . import signals  # noqa
@@ -0,0 +1,286 @@
+"""
+Reservation availability from per-table interval lists.
+
+A reservation holds its table over [reservation_start, reservation_end)
+(absolute, timezone-aware; see Reservation.save). load_window() fetches
+every non-terminal reservation of one location overlapping a time range
+in a single indexed query. The result is a TableIntervals per table:
+start times sorted ascending, plus a running maximum of the end times.
+Whether table T is free over [s, e) is then one binary search. No query
+per table or per slot, and windows that run past midnight work like any
+other.
+
+    index = load_day(location, date)
+    index.is_free(table_id, start, end)
+    index.conflict(table_id, start, end)   # -> (reservation_id, status) or None
+
+availability_matrix() answers a whole date range at once: every slot of
+every day for every table. Each table is one linear sweep of its sorted
+slots against its sorted intervals. A day's reservation-derived grid is
+cached per location and day (RESERVATION_MATRIX_TTL). The cache key holds
+version tokens that reservations.signals replace when a reservation
+touching that day, or one of the location's tables, changes. Turnover
+holds and past slots depend on "now", so they are overlaid on every
+request and never cached.
+"""
+from __future__ import annotations
+
+import logging
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import date as date_cls, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.versioned_cache import bump_versions, shared_versions
+from .models import Reservation, Table
+
+logger = logging.getLogger(__name__)
+
+AVAILABLE, RESERVED, BUSY, PAST = "available", "reserved", "busy", "past"
+
+
+@dataclass
+class TableIntervals:
+    starts: List[datetime] = field(default_factory=list)
+    ends: List[datetime] = field(default_factory=list)
+    # max(ends[:i + 1]) and the position it came from, so overlapping rows still answer in O(log n)
+    max_end: List[datetime] = field(default_factory=list)
+    max_at: List[int] = field(default_factory=list)
+    ids: List[int] = field(default_factory=list)
+    statuses: List[str] = field(default_factory=list)
+
+    def add(self, start: datetime, end: datetime, res_id: int, status: str) -> None:
+        # Rows arrive ordered by start
+        if self.max_end and self.max_end[-1] >= end:
+            self.max_end.append(self.max_end[-1])
+            self.max_at.append(self.max_at[-1])
+        else:
+            self.max_end.append(end)
+            self.max_at.append(len(self.starts))
+        self.starts.append(start)
+        self.ends.append(end)
+        self.ids.append(res_id)
+        self.statuses.append(status)
+
+    def conflict(self, start: datetime, end: datetime) -> Optional[int]:
+        """Position of a reservation overlapping [start, end), or None."""
+        i = bisect_left(self.starts, end)  # everything before i starts before `end`
+        if i and self.max_end[i - 1] > start:
+            return self.max_at[i - 1]
+        return None
+
+    def sweep(self, slot_starts: List[datetime], length: timedelta) -> List[Optional[int]]:
+        """conflict() for every slot of an ascending list, in one linear pass."""
+        out: List[Optional[int]] = []
+        starts, max_end, n, i = self.starts, self.max_end, len(self.starts), 0
+        for s in slot_starts:
+            e = s + length
+            while i < n and starts[i] < e:
+                i += 1
+            out.append(self.max_at[i - 1] if i and max_end[i - 1] > s else None)
+        return out
+
+
+@dataclass
+class AvailabilityIndex:
+    location_id: int
+    window_start: datetime
+    window_end: datetime
+    tables: Dict[int, TableIntervals] = field(default_factory=dict)
+
+    def conflict(self, table_id: int, start: datetime, end: datetime) -> Optional[Tuple[int, str]]:
+        intervals = self.tables.get(table_id)
+        if intervals is None:
+            return None
+        pos = intervals.conflict(start, end)
+        return None if pos is None else (intervals.ids[pos], intervals.statuses[pos])
+
+    def is_free(self, table_id: int, start: datetime, end: datetime) -> bool:
+        return self.conflict(table_id, start, end) is None
+
+
+def load_window(location_id: int, start: datetime, end: datetime) -> AvailabilityIndex:
+    """Every table-holding reservation of the location overlapping [start, end), in one query."""
+    index = AvailabilityIndex(location_id=location_id, window_start=start, window_end=end)
+    rows = (
+        Reservation.objects
+        .filter(location_id=location_id, table__isnull=False, reservation_start__lt=end, reservation_end__gt=start)
+        .exclude(status__in=Reservation.TERMINAL_STATUSES)
+        .order_by("table_id", "reservation_start")
+        .values_list("table_id", "reservation_start", "reservation_end", "id", "status")
+    )
+    tables = index.tables
+    for table_id, r_start, r_end, res_id, status in rows:
+        intervals = tables.get(table_id)
+        if intervals is None:
+            intervals = tables[table_id] = TableIntervals()
+        intervals.add(r_start, r_end, res_id, status)
+    return index
+
+
+def day_bounds(location, day: date_cls) -> Tuple[datetime, datetime]:
+    """Local midnight to midnight of `day` at `location`, as aware datetimes."""
+    tz = location.tzinfo
+    start = datetime.combine(day, time.min).replace(tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=1), time.min).replace(tzinfo=tz)
+    return start, end
+
+
+def load_day(location, day: date_cls) -> AvailabilityIndex:
+    """
+    Index for booking any slot that starts on `day`. The window runs one
+    reservation length past local midnight on both sides, so bookings that
+    cross midnight in either direction are included.
+    """
+    start, end = day_bounds(location, day)
+    pad = Reservation.duration()
+    return load_window(location.pk, start - pad, end + pad)
+
+
+def slot_window(location, day: date_cls, at: time) -> Tuple[datetime, datetime]:
+    """The [start, end) a new booking at local `day` `at` would hold."""
+    start = datetime.combine(day, at).replace(tzinfo=location.tzinfo)
+    return start, start + Reservation.duration()
+
+
+# ---------- Slot x table matrix ----------
+def _day_key(location_id: int, day: date_cls) -> str:
+    return f"reservations:day_ver:{location_id}:{day.isoformat()}"
+
+
+def _tables_key(location_id: int) -> str:
+    return f"reservations:tables_ver:{location_id}"
+
+
+def bump_days(location_id: int, days: Iterable[date_cls]) -> None:
+    """Invalidate cached matrices for these local days at the location."""
+    keys = [_day_key(location_id, d) for d in set(days)]
+    if keys:
+        bump_versions(*keys)
+
+
+def bump_tables(location_id: int) -> None:
+    bump_versions(_tables_key(location_id))
+
+
+def affected_days(location, start: datetime, end: datetime) -> List[date_cls]:
+    """Local days with a slot whose hold can overlap [start, end)."""
+    tz = location.tzinfo
+    first = (start - Reservation.duration()).astimezone(tz).date()
+    last = end.astimezone(tz).date()
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def day_slots(location, day: date_cls, step: int) -> List[datetime]:
+    tz = location.tzinfo
+    return [
+        datetime.combine(day, time(minute // 60, minute % 60)).replace(tzinfo=tz)
+        for minute in range(0, 24 * 60, step)
+    ]
+
+
+def _compute_day(location, day: date_cls, step: int, tables: List[dict], index: AvailabilityIndex) -> dict:
+    slots = day_slots(location, day, step)
+    length = Reservation.duration()
+    grid = {}
+    for t in tables:
+        intervals = index.tables.get(t["id"])
+        if intervals is None:
+            grid[str(t["id"])] = [AVAILABLE] * len(slots)
+            continue
+        grid[str(t["id"])] = [AVAILABLE if pos is None else RESERVED for pos in intervals.sweep(slots, length)]
+    return {
+        "date": day.isoformat(),
+        "slots": [s.strftime("%H:%M") for s in slots],
+        "starts": [s.isoformat() for s in slots],
+        "tables": grid,
+    }
+
+
+def availability_matrix(location, first_day: date_cls, days: int = 1, step: Optional[int] = None,
+                        now: Optional[datetime] = None, busy: Optional[Dict[str, int]] = None) -> dict:
+    """
+    Slot x table availability for `days` days from `first_day`. Cached days
+    cost no query. All uncached days share one reservations query, and
+    the tables take one more. `busy` ({table_number: seconds left}) marks
+    turnover holds.
+    """
+    from django.utils import timezone
+
+    step = int(step or getattr(settings, "RESERVATION_SLOT_MINUTES", 30))
+    ttl = int(getattr(settings, "RESERVATION_MATRIX_TTL", 300))
+    now = now or timezone.now()
+    tables = list(
+        Table.objects.filter(location=location, is_active=True)
+        .order_by("table_number").values("id", "table_number", "capacity")
+    )
+    wanted = [first_day + timedelta(days=i) for i in range(days)]
+    versions = shared_versions([_tables_key(location.pk)] + [_day_key(location.pk, d) for d in wanted])
+    tables_ver = versions[_tables_key(location.pk)]
+    keys = {
+        d: f"reservations:matrix:{location.pk}:{d.isoformat()}:{step}:{tables_ver}:{versions[_day_key(location.pk, d)]}"
+        for d in wanted
+    }
+    try:
+        cached = cache.get_many(list(keys.values()))
+    except Exception as e:
+        logger.info("Availability matrix cache unavailable: %s", e)
+        cached = {}
+    out = {d: cached[k] for d, k in keys.items() if k in cached}
+
+    missing = [d for d in wanted if d not in out]
+    if missing:
+        start, _ = day_bounds(location, missing[0])
+        _, end = day_bounds(location, missing[-1])
+        pad = Reservation.duration()
+        index = load_window(location.pk, start - pad, end + pad)
+        fresh = {d: _compute_day(location, d, step, tables, index) for d in missing}
+        out.update(fresh)
+        try:
+            cache.set_many({keys[d]: m for d, m in fresh.items()}, ttl)
+        except Exception as e:
+            logger.info("Could not cache availability matrix: %s", e)
+
+    by_number = {str(t["table_number"]): str(t["id"]) for t in tables}
+    holds = {
+        by_number[number]: now + timedelta(seconds=secs)
+        for number, secs in (busy or {}).items() if secs > 0 and number in by_number
+    }
+    result_days = []
+    for d in wanted:
+        day = {**out[d], "tables": {tid: list(row) for tid, row in out[d]["tables"].items()}}
+        for i, iso in enumerate(day["starts"]):
+            start = datetime.fromisoformat(iso)
+            if start + timedelta(minutes=step) <= now:
+                for row in day["tables"].values():
+                    row[i] = PAST
+                continue
+            for tid, until in holds.items():
+                if start < until and day["tables"][tid][i] == AVAILABLE:
+                    day["tables"][tid][i] = BUSY
+        del day["starts"]
+        result_days.append(day)
+    return {
+        "location": location.pk,
+        "step_minutes": step,
+        "duration_minutes": int(Reservation.duration().total_seconds() // 60),
+        "tables": tables,
+        "days": result_days,
+    }
+
+
+def party_size_matrix(matrix: dict) -> dict:
+    """Collapse a slot x table matrix to free-table counts per slot and party size."""
+    sizes = sorted({t["capacity"] for t in matrix["tables"]})
+    capacity = {str(t["id"]): t["capacity"] for t in matrix["tables"]}
+    days = []
+    for day in matrix["days"]:
+        counts = []
+        for i in range(len(day["slots"])):
+            free = [capacity[tid] for tid, row in day["tables"].items() if row[i] == AVAILABLE]
+            counts.append([sum(1 for c in free if c >= size) for size in sizes])
+        days.append({"date": day["date"], "slots": day["slots"], "free_tables": counts})
+    return {**{k: v for k, v in matrix.items() if k not in ("tables", "days")}, "party_sizes": sizes, "days": days}
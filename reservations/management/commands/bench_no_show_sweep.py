@@ -0,0 +1,117 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Location, Organization
+from reservations.models import Reservation, Table
+from reservations.no_shows import DUE_STATUSES, grace, sweep_no_shows
+
+
+# ---- The sweep as it was before reservations.no_shows, kept for comparison ----
+def _legacy_sweep(now):
+    ids = []
+    for r in Reservation.objects.exclude(status__in=["CANCELLED", "COMPLETED", "NO_SHOW", "SEATED"]):
+        dt = datetime.combine(r.reservation_date, r.reservation_time)
+        if timezone.is_naive(dt):
+            dt = timezone.make_aware(dt, timezone.get_current_timezone())
+        if now >= dt + timedelta(minutes=20):
+            ids.append(r.id)
+    if ids:
+        Reservation.objects.filter(id__in=ids).update(status="NO_SHOW")
+    return len(ids)
+
+
+def _seed(count, due, upcoming, tables, seed, now):
+    rng = random.Random(seed)
+    org = Organization.objects.create(name="Bench")
+    location = Location.objects.create(organization=org, name="Bench", timezone="Asia/Kathmandu")
+    table_ids = [
+        t.pk for t in Table.objects.bulk_create(
+            [Table(location=location, table_number=f"B{n}", capacity=4) for n in range(tables)]
+        )
+    ]
+    user = get_user_model().objects.create_user(username=f"bench-{int(now.timestamp())}", password=None)
+    tz, duration = location.tzinfo, Reservation.duration()
+    history = ["COMPLETED"] * 8 + ["CANCELLED", "NO_SHOW"]
+
+    def row(start, status):
+        local = start.astimezone(tz)
+        return Reservation(
+            location=location, table_id=rng.choice(table_ids), customer_name="Bench", customer_phone="0",
+            party_size=2, reservation_date=local.date(), reservation_time=local.time().replace(microsecond=0),
+            status=status, created_by=user, reservation_start=start.replace(microsecond=0),
+            reservation_end=start.replace(microsecond=0) + duration,
+        )
+
+    batch, made = [], 0
+    plan = [("history", count - due - upcoming), ("due", due), ("upcoming", upcoming)]
+    for kind, n in plan:
+        for _ in range(n):
+            if kind == "history":
+                start = now - timedelta(days=rng.randint(2, 3 * 365), minutes=rng.randint(0, 1440))
+                status = rng.choice(history)
+            elif kind == "due":
+                start = now - grace() - timedelta(minutes=rng.randint(1, 600))
+                status = rng.choice(DUE_STATUSES)
+            else:
+                start = now + timedelta(minutes=rng.randint(0, 14 * 1440))
+                status = rng.choice(DUE_STATUSES)
+            batch.append(row(start, status))
+            if len(batch) >= 5000:
+                Reservation.objects.bulk_create(batch)
+                made += len(batch)
+                batch = []
+    Reservation.objects.bulk_create(batch)
+    return made + len(batch)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the no-show sweep against a synthetic reservation history: the old per-row Python scan "
+        "vs the single indexed UPDATE. Everything it writes is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reservations", type=int, default=1_000_000, help="total rows, mostly finished history")
+        parser.add_argument("--due", type=int, default=200, help="PENDING/CONFIRMED rows past the grace period")
+        parser.add_argument("--upcoming", type=int, default=2000, help="PENDING/CONFIRMED rows still ahead")
+        parser.add_argument("--tables", type=int, default=40)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def _time(self, fn):
+        sid = transaction.savepoint()
+        start = time.perf_counter()
+        marked = fn()
+        wall = time.perf_counter() - start
+        transaction.savepoint_rollback(sid)
+        return wall, marked
+
+    def handle(self, *args, **opts):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                start = time.perf_counter()
+                rows = _seed(opts["reservations"], opts["due"], opts["upcoming"], opts["tables"], opts["seed"], now)
+                if connection.vendor == "postgresql":
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"ANALYZE {connection.ops.quote_name(Reservation._meta.db_table)}")
+                self.stdout.write(f"seeded {rows} reservations on {connection.vendor} in {time.perf_counter() - start:.1f}s")
+
+                before, old = self._time(lambda: _legacy_sweep(now))
+                after, new = self._time(lambda: sweep_no_shows(now=now, publish=False))
+                self.stdout.write(f"{'sweep':<20} {'seconds':>9} {'marked':>8}")
+                self.stdout.write(f"{'python scan':<20} {before:9.3f} {old:8d}")
+                self.stdout.write(f"{'indexed update':<20} {after:9.3f} {new:8d}")
+                self.stdout.write(f"speedup {before / after if after else 0:.1f}x")
+                raise _Rollback
+        except _Rollback:
+            pass
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:34
+
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_windows(apps, schema_editor):
+    Reservation = apps.get_model("reservations", "Reservation")
+    Location = apps.get_model("core", "Location")
+    duration = timedelta(minutes=int(getattr(settings, "RESERVATION_DURATION_MINUTES", 90)))
+    zones = {}
+    for pk, name in Location.objects.values_list("pk", "timezone"):
+        try:
+            zones[pk] = ZoneInfo(name)
+        except Exception:
+            zones[pk] = ZoneInfo(settings.TIME_ZONE)
+    batch = []
+    for r in Reservation.objects.only("pk", "location_id", "reservation_date", "reservation_time").iterator(chunk_size=2000):
+        r.reservation_start = datetime.combine(r.reservation_date, r.reservation_time).replace(tzinfo=zones[r.location_id])
+        r.reservation_end = r.reservation_start + duration
+        batch.append(r)
+        if len(batch) >= 2000:
+            Reservation.objects.bulk_update(batch, ["reservation_start", "reservation_end"])
+            batch = []
+    if batch:
+        Reservation.objects.bulk_update(batch, ["reservation_start", "reservation_end"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('reservations', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='reservation_end',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='reservation_start',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_windows, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['location', 'reservation_start', 'reservation_end'], name='reservation_locatio_00d606_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['table', 'reservation_start'], name='reservation_table_i_78d636_idx'),
+        ),
+    ]
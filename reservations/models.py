@@ -1,3 +1,5 @@
+from datetime import datetime, timedelta
+
 from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
@@ -40,6 +42,40 @@ class Reservation(models.Model):
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Absolute [start, end) the table is held, from date/time in the location's zone (set by save())
+    reservation_start = models.DateTimeField(null=True, blank=True, editable=False)
+    reservation_end = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Statuses that no longer hold a table
+    TERMINAL_STATUSES = ("CANCELLED", "COMPLETED", "NO_SHOW")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["location", "reservation_start", "reservation_end"]),
+            models.Index(fields=["table", "reservation_start"]),
+            # No-show sweep: only reservations still waiting for their guests
+            models.Index(
+                fields=["reservation_start"],
+                condition=models.Q(status__in=["PENDING", "CONFIRMED"]),
+                name="reservation_due_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.customer_name} - {self.reservation_date} {self.reservation_time}"
+
+    @staticmethod
+    def duration() -> timedelta:
+        return timedelta(minutes=int(getattr(settings, "RESERVATION_DURATION_MINUTES", 90)))
+
+    def compute_window(self):
+        start = datetime.combine(self.reservation_date, self.reservation_time).replace(tzinfo=self.location.tzinfo)
+        return start, start + self.duration()
+
+    def save(self, *args, **kwargs):
+        if self.reservation_date and self.reservation_time and self.location_id:
+            self.reservation_start, self.reservation_end = self.compute_window()
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and {"reservation_date", "reservation_time", "location"} & set(update_fields):
+                kwargs["update_fields"] = {*update_fields, "reservation_start", "reservation_end"}
+        super().save(*args, **kwargs)
@@ -0,0 +1,163 @@
+"""
+No-show sweep: one indexed UPDATE per batch instead of a Python scan.
+
+A PENDING/CONFIRMED reservation whose start (reservation_start, absolute
+and timezone-aware) is more than RESERVATION_NO_SHOW_GRACE_MINUTES in the
+past becomes NO_SHOW. The candidates are found through a partial index on
+reservation_start that covers only those two statuses, so the cost
+follows the handful of active rows and not the whole history:
+
+    UPDATE reservation SET status = 'NO_SHOW', updated_at = now
+     WHERE id IN (SELECT id ... WHERE status IN ('PENDING', 'CONFIRMED')
+                   AND reservation_start < now - grace
+                   ORDER BY reservation_start LIMIT batch)
+    RETURNING id, location_id, table_id, reservation_start
+
+On PostgreSQL and SQLite the changed rows come back from that same
+statement; elsewhere they are selected (locked) first and updated by id.
+Because the UPDATE bypasses model signals, sweep_no_shows() publishes the
+changes itself once they commit: one event per location to the staff
+screens' channel group, and the availability matrix days they freed.
+"""
+from __future__ import annotations
+
+import logging
+import sqlite3
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Reservation
+
+logger = logging.getLogger(__name__)
+
+NO_SHOW = "NO_SHOW"
+# Booked but never seated; SEATED and the terminal statuses are left alone
+DUE_STATUSES = ("PENDING", "CONFIRMED")
+DEFAULT_BATCH_SIZE = 5000
+
+
+def grace() -> timedelta:
+    return timedelta(minutes=int(getattr(settings, "RESERVATION_NO_SHOW_GRACE_MINUTES", 20)))
+
+
+def _can_return_from_update() -> bool:
+    if connection.vendor == "postgresql":
+        return True
+    return connection.vendor == "sqlite" and sqlite3.sqlite_version_info >= (3, 35)
+
+
+def _update_returning(cutoff: datetime, now: datetime, batch_size: int) -> List[tuple]:
+    qn = connection.ops.quote_name
+    table = qn(Reservation._meta.db_table)
+    # Literals, not parameters: the planner must see they match reservation_due_idx's condition
+    due = ", ".join(f"'{status}'" for status in DUE_STATUSES)
+    lock = " FOR UPDATE SKIP LOCKED" if connection.features.has_select_for_update_skip_locked else ""
+    sql = (
+        f"UPDATE {table} SET {qn('status')} = %s, {qn('updated_at')} = %s "
+        f"WHERE {qn('id')} IN ("
+        f"SELECT {qn('id')} FROM {table} WHERE {qn('status')} IN ({due}) AND {qn('reservation_start')} < %s "
+        f"ORDER BY {qn('reservation_start')} LIMIT %s{lock}"
+        f") AND {qn('status')} IN ({due}) "
+        f"RETURNING {qn('id')}, {qn('location_id')}, {qn('table_id')}, {qn('reservation_start')}"
+    )
+    adapt = connection.ops.adapt_datetimefield_value
+    params = [NO_SHOW, adapt(now), adapt(cutoff), batch_size]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    # Raw rows skip the ORM: turn reservation_start back into an aware datetime
+    col = Reservation._meta.get_field("reservation_start").get_col(Reservation._meta.db_table)
+    converters = connection.ops.get_db_converters(col)
+    out = []
+    for pk, location_id, table_id, start in rows:
+        for convert in converters:
+            start = convert(start, col, connection)
+        out.append((pk, location_id, table_id, start))
+    return out
+
+
+def _select_then_update(cutoff: datetime, now: datetime, batch_size: int) -> List[tuple]:
+    with transaction.atomic():
+        rows = list(
+            Reservation.objects.select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+            .filter(status__in=DUE_STATUSES, reservation_start__lt=cutoff)
+            .order_by("reservation_start")
+            .values_list("id", "location_id", "table_id", "reservation_start")[:batch_size]
+        )
+        if rows:
+            Reservation.objects.filter(pk__in=[r[0] for r in rows], status__in=DUE_STATUSES).update(
+                status=NO_SHOW, updated_at=now,
+            )
+    return rows
+
+
+def _broadcast(location_id: int, payload: dict) -> None:
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        from orders.kitchen import group_name
+
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        async_to_sync(layer.group_send)(group_name(location_id), {"type": "order.event", "data": payload})
+    except Exception as e:
+        # Hosts refresh from the reservations list
+        logger.info("Reservation broadcast skipped for location %s: %s", location_id, e)
+
+
+def publish_status_changes(rows: List[tuple], status: str = NO_SHOW) -> None:
+    """Announce (id, location_id, table_id, reservation_start) rows that moved to `status`."""
+    from core.models import Location
+    from .availability import affected_days, bump_days
+
+    by_location = defaultdict(list)
+    for pk, location_id, table_id, start in rows:
+        by_location[location_id].append((pk, table_id, start))
+    locations = Location.objects.in_bulk(list(by_location))
+    for location_id, changed in by_location.items():
+        location = locations.get(location_id)
+        if location is not None:
+            duration = Reservation.duration()
+            days = set()
+            for _, table_id, start in changed:
+                if table_id and start:
+                    days.update(affected_days(location, start, start + duration))
+            bump_days(location_id, days)
+        _broadcast(location_id, {
+            "event": "reservations",
+            "status": status,
+            "reservations": [
+                {"id": pk, "table_id": table_id, "reservation_start": start.isoformat() if start else None}
+                for pk, table_id, start in changed
+            ],
+        })
+
+
+def sweep_no_shows(now: Optional[datetime] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                   publish: bool = True) -> int:
+    """
+    Mark overdue PENDING/CONFIRMED reservations NO_SHOW, `batch_size` rows
+    per statement, and publish each batch once it commits. Returns the
+    number of reservations marked.
+    """
+    now = now or timezone.now()
+    cutoff = now - grace()
+    update = _update_returning if _can_return_from_update() else _select_then_update
+    marked = 0
+    while True:
+        with transaction.atomic():
+            rows = update(cutoff, now, batch_size)
+            if rows and publish:
+                transaction.on_commit(lambda rows=rows: publish_status_changes(rows))
+        marked += len(rows)
+        if len(rows) < batch_size:
+            break
+    if marked:
+        logger.info("Marked %d reservation(s) NO_SHOW", marked)
+    return marked
@@ -37,6 +37,7 @@ class CreateReservationSerializer(serializers.Serializer):
         table = Table.objects.get(pk=validated["table_id"])
         # Let your model default the status (often 'PENDING' or 'CONFIRMED')
         res = Reservation.objects.create(
+            location_id=table.location_id,
             table=table,
             customer_name=validated["customer_name"],
             customer_phone=validated["customer_phone"],
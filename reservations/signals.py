@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .availability import affected_days, bump_days, bump_tables
+from .models import Reservation, Table
+
+
+@receiver(pre_save, sender=Reservation)
+def remember_previous_window(sender, instance: Reservation, **kwargs):
+    # A moved reservation frees the days it used to touch as well
+    instance._previous_window = None
+    if instance.pk:
+        instance._previous_window = (
+            Reservation.objects.filter(pk=instance.pk)
+            .values_list("location_id", "reservation_start", "reservation_end").first()
+        )
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def invalidate_day_matrices(sender, instance: Reservation, **kwargs):
+    windows = [(instance.location_id, instance.reservation_start, instance.reservation_end)]
+    if getattr(instance, "_previous_window", None):
+        windows.append(instance._previous_window)
+    touched = {}
+    for location_id, start, end in windows:
+        if not (location_id and start and end):
+            continue
+        location = instance.location if location_id == instance.location_id else None
+        if location is None:
+            from core.models import Location
+            location = Location.objects.filter(pk=location_id).first()
+        if location is not None:
+            touched.setdefault(location_id, set()).update(affected_days(location, start, end))
+    for location_id, days in touched.items():
+        transaction.on_commit(lambda location_id=location_id, days=days: bump_days(location_id, days))
+
+
+@receiver(post_save, sender=Table)
+@receiver(post_delete, sender=Table)
+def invalidate_location_matrices(sender, instance: Table, **kwargs):
+    transaction.on_commit(lambda: bump_tables(instance.location_id))
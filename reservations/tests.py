@@ -0,0 +1,198 @@
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Location, Organization
+
+from .availability import AVAILABLE, RESERVED, TableIntervals, availability_matrix
+from .models import Reservation, Table
+
+
+@override_settings(KITCHEN_LOCATION_ID=None)
+class AvailabilityLocationTests(TestCase):
+    def setUp(self):
+        org = Organization.objects.create(name="Momo House")
+        self.uptown = Location.objects.create(organization=org, name="Uptown")
+        self.downtown = Location.objects.create(organization=org, name="Downtown")
+        self.closed = Location.objects.create(organization=org, name="Closed", is_active=False)
+        Table.objects.create(location=self.uptown, table_number="1", capacity=4)
+        Table.objects.create(location=self.downtown, table_number="9", capacity=2)
+        self.user = get_user_model().objects.create_user(username="diner")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _get(self, **params):
+        return self.client.get("/reserve/api/availability/", {"date": "2030-01-05", "time": "19:00", **params})
+
+    def test_page_passes_a_location_to_the_availability_call(self):
+        self.client.force_login(self.user)
+        page = self.client.get("/reserve/")
+        self.assertEqual(page.status_code, 200)
+        self.assertEqual(page.context["location_id"], self.downtown.pk)
+        self.assertEqual([loc.pk for loc in page.context["locations"]], [self.downtown.pk, self.uptown.pk])
+
+        res = self._get(location=page.context["location_id"])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([row["table_number"] for row in res.json()], ["9"])
+
+    def test_unknown_or_inactive_location_is_rejected(self):
+        self.assertEqual(self._get(location=self.closed.pk).status_code, 400)
+        self.assertEqual(self._get(location=999999).status_code, 400)
+        self.assertEqual(self._get(location="abc").status_code, 400)
+        self.assertEqual(self._get().status_code, 400)  # two active locations, none chosen
+
+
+class TableIntervalsTests(SimpleTestCase):
+    def setUp(self):
+        self.day = datetime(2030, 1, 5, tzinfo=dt_timezone.utc)
+        self.intervals = TableIntervals()
+        for res_id, (start, end) in enumerate([(18 * 60, 21 * 60), (18 * 60 + 30, 19 * 60), (23 * 60 + 30, 25 * 60)]):
+            self.intervals.add(self._at(start), self._at(end), res_id, "CONFIRMED")
+
+    def _at(self, minute):
+        return self.day + timedelta(minutes=minute)
+
+    def _conflict(self, start, end):
+        return self.intervals.conflict(self._at(start), self._at(end))
+
+    def test_a_long_reservation_is_found_behind_a_shorter_later_one(self):
+        self.assertEqual(self._conflict(20 * 60, 20 * 60 + 30), 0)
+        self.assertEqual(self._conflict(18 * 60 + 45, 18 * 60 + 50), 0)
+
+    def test_ends_are_exclusive(self):
+        self.assertIsNone(self._conflict(21 * 60, 23 * 60 + 30))
+        self.assertIsNone(self._conflict(17 * 60, 18 * 60))
+
+    def test_reservations_past_midnight_hold_the_next_day(self):
+        self.assertEqual(self._conflict(24 * 60 + 30, 26 * 60), 2)
+        self.assertIsNone(self._conflict(25 * 60, 26 * 60))
+
+    def test_sweep_matches_conflict_for_every_slot(self):
+        length = timedelta(minutes=90)
+        slots = [self._at(m) for m in range(16 * 60, 27 * 60, 15)]
+        self.assertEqual(
+            self.intervals.sweep(slots, length),
+            [self.intervals.conflict(s, s + length) for s in slots],
+        )
+
+
+@override_settings(RESERVATION_DURATION_MINUTES=90, RESERVATION_SLOT_MINUTES=30)
+class AvailabilityMatrixTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        org = Organization.objects.create(name="Momo House")
+        self.location = Location.objects.create(organization=org, name="Uptown", timezone="UTC")
+        self.table = Table.objects.create(location=self.location, table_number="1", capacity=4)
+        self.user = get_user_model().objects.create_user(username="host")
+        self.day = date(2030, 1, 5)
+
+    def _status(self, day, hhmm, table=None):
+        matrix = availability_matrix(self.location, day)
+        row = matrix["days"][0]
+        return row["tables"][str((table or self.table).pk)][row["slots"].index(hhmm)]
+
+    def _book(self, day, at):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Reservation.objects.create(
+                location=self.location, table=self.table, created_by=self.user, customer_name="Guest",
+                customer_phone="555", party_size=2, reservation_date=day, reservation_time=at,
+            )
+
+    def test_cached_day_is_replaced_when_a_reservation_commits(self):
+        self.assertEqual(self._status(self.day, "19:00"), AVAILABLE)
+        # Without the commit hook the cached grid is still served
+        Reservation.objects.create(
+            location=self.location, table=self.table, created_by=self.user, customer_name="Walk-in",
+            customer_phone="555", party_size=2, reservation_date=self.day, reservation_time=dt_time(19, 0),
+        )
+        self.assertEqual(self._status(self.day, "19:00"), AVAILABLE)
+
+        self._book(self.day, dt_time(12, 0))
+        self.assertEqual(self._status(self.day, "19:00"), RESERVED)
+        self.assertEqual(self._status(self.day, "12:30"), RESERVED)
+
+    def test_moving_a_reservation_frees_the_old_days_and_holds_the_next_day(self):
+        next_day = self.day + timedelta(days=1)
+        self.assertEqual(self._status(self.day, "19:00"), AVAILABLE)
+        self.assertEqual(self._status(next_day, "00:00"), AVAILABLE)
+
+        reservation = self._book(self.day, dt_time(19, 0))
+        self.assertEqual(self._status(self.day, "19:00"), RESERVED)
+
+        reservation.reservation_time = dt_time(23, 30)
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.save()
+        self.assertEqual(self._status(self.day, "19:00"), AVAILABLE)
+        self.assertEqual(self._status(next_day, "00:00"), RESERVED)
+        self.assertEqual(self._status(next_day, "01:00"), AVAILABLE)
+
+    def test_new_table_shows_up(self):
+        self.assertEqual(len(availability_matrix(self.location, self.day)["tables"]), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            table = Table.objects.create(location=self.location, table_number="2", capacity=2)
+        self.assertEqual(self._status(self.day, "19:00", table), AVAILABLE)
+
+
+@override_settings(RESERVATION_NO_SHOW_GRACE_MINUTES=20)
+class NoShowSweepTests(TestCase):
+    def setUp(self):
+        org = Organization.objects.create(name="Momo House")
+        self.location = Location.objects.create(organization=org, name="Uptown", timezone="Asia/Kathmandu")
+        self.table = Table.objects.create(location=self.location, table_number="1", capacity=4)
+        self.user = get_user_model().objects.create_user(username="host")
+        self.now = datetime(2030, 1, 5, 14, 0, tzinfo=dt_timezone.utc)
+        self.overdue = [
+            self._book(minutes, status) for minutes, status in ((120, "PENDING"), (60, "CONFIRMED"), (21, "PENDING"))
+        ]
+        self.kept = [
+            self._book(19, "PENDING"),     # still inside the grace period
+            self._book(90, "SEATED"),
+            self._book(90, "CANCELLED"),
+            self._book(-30, "CONFIRMED"),  # not due yet
+        ]
+
+    def _book(self, minutes_ago, status):
+        local = (self.now - timedelta(minutes=minutes_ago)).astimezone(self.location.tzinfo)
+        return Reservation.objects.create(
+            location=self.location, table=self.table, created_by=self.user, customer_name="Guest",
+            customer_phone="555", party_size=2, status=status,
+            reservation_date=local.date(), reservation_time=local.time(),
+        )
+
+    def _statuses(self, reservations):
+        return [Reservation.objects.get(pk=r.pk).status for r in reservations]
+
+    def _sweep(self, **kwargs):
+        from . import no_shows
+
+        with mock.patch.object(no_shows, "publish_status_changes") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                marked = no_shows.sweep_no_shows(now=self.now, batch_size=2, **kwargs)
+        return marked, [call.args[0] for call in publish.call_args_list]
+
+    def _check(self, marked, batches):
+        self.assertEqual(marked, 3)
+        self.assertEqual([len(rows) for rows in batches], [2, 1])
+        self.assertEqual(
+            sorted(row for rows in batches for row in rows),
+            [(r.pk, self.location.pk, self.table.pk, r.reservation_start) for r in self.overdue],
+        )
+        self.assertTrue(all(timezone.is_aware(row[3]) for rows in batches for row in rows))
+        self.assertEqual(self._statuses(self.overdue), ["NO_SHOW"] * 3)
+        self.assertEqual(self._statuses(self.kept), ["PENDING", "SEATED", "CANCELLED", "CONFIRMED"])
+        self.assertEqual(self._sweep(), (0, []))
+
+    def test_update_returning_marks_due_rows_in_batches(self):
+        from . import no_shows
+
+        self.assertTrue(no_shows._can_return_from_update())
+        self._check(*self._sweep())
+
+    def test_select_then_update_fallback_matches(self):
+        with mock.patch("reservations.no_shows._can_return_from_update", return_value=False):
+            self._check(*self._sweep())
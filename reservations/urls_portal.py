@@ -1,10 +1,11 @@
 from django.urls import path
-from .views_portal import reserve_page, AvailabilityView, CreateReservationView
+from .views_portal import reserve_page, AvailabilityView, AvailabilityMatrixView, CreateReservationView
 
 app_name = "reservations_portal"
 
 urlpatterns = [
     path("", reserve_page, name="page"),
     path("api/availability/", AvailabilityView.as_view(), name="availability"),
+    path("api/availability/matrix/", AvailabilityMatrixView.as_view(), name="availability_matrix"),
     path("api/reservations/", CreateReservationView.as_view(), name="create"),
 ]
@@ -1,5 +1,6 @@
 from __future__ import annotations
-from datetime import datetime, timedelta
+from datetime import date, time as dt_time, timedelta
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
 from django.shortcuts import render
@@ -9,6 +10,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
+from .availability import availability_matrix, load_day, party_size_matrix, slot_window
 from .models import Table, Reservation
 from .serializers_portal import (
     TableStatusSerializer,
@@ -17,14 +19,27 @@ from .serializers_portal import (
 )
 
 # derive “20-minute hold after checkout” from existing Orders/Payments
-def _current_dinein_busy_map(now=None):
+def _current_dinein_busy_map(location, now=None):
+    """
+    {table_number_str: seconds_remaining} for `location`. Orders carry no
+    location of their own: one belongs here through its reservation or its
+    kitchen ticket, and one with neither only to the store's default
+    location (KITCHEN_LOCATION_ID, or the only active location).
+    """
+    from django.db.models import Exists, OuterRef, Q
+    from orders.models import Ticket
     from payments.models import Payment  # local import to avoid circulars
     now = now or timezone.now()
     win = now - timedelta(minutes=20)
+    tickets = Ticket.objects.filter(order_id=OuterRef("order_id"), location__isnull=False)
+    here = Q(order__reservation__location_id=location.pk) | Exists(tickets.filter(location_id=location.pk))
+    default = _default_location()
+    if default is not None and default.pk == location.pk:
+        here |= Q(order__reservation__isnull=True) & ~Exists(tickets)
     # Paid dine-in orders in the last 20 minutes
     qs = (
         Payment.objects
-        .filter(is_paid=True, updated_at__gt=win,
+        .filter(here, is_paid=True, updated_at__gt=win,
                 order__source="DINE_IN",
                 order__table_number__isnull=False)
         .select_related("order")
@@ -33,34 +48,50 @@ def _current_dinein_busy_map(now=None):
     for p in qs:
         tnum = str(p.order.table_number)
         remaining = int((p.updated_at + timedelta(minutes=20) - now).total_seconds())
-        busy[tnum] = max(0, remaining)
+        busy[tnum] = max(busy.get(tnum, 0), remaining)
     return busy  # {table_number_str: seconds_remaining}
 
-def _parse_dt(date_str: str, time_str: str) -> datetime:
-    # naive local dt ok if your app already assumes local timezone
-    return datetime.fromisoformat(f"{date_str}T{time_str}")
-
-def _active_reservations(slot_dt: datetime):
-    # Treat reservations within ±90 minutes of the requested slot as blocking,
-    # excluding terminal states. Adjust statuses to match yours if needed.
-    margin = timedelta(minutes=90)
-    date = slot_dt.date()
-    time = slot_dt.time()
-    start = (datetime.combine(date, time) - margin).time()
-    end   = (datetime.combine(date, time) + margin).time()
-    return (
-        Reservation.objects.filter(
-            reservation_date=date,
-            reservation_time__gte=start,
-            reservation_time__lte=end,
-        )
-        .exclude(status__in=["CANCELLED","COMPLETED","NO_SHOW"])
-        .select_related("table")
-    )
+def _parse_slot(date_str: str, time_str: str):
+    return date.fromisoformat(date_str), dt_time.fromisoformat(time_str)
+
+def _resolve_location(request):
+    """
+    ?location=<id> of an active location (unknown or inactive ids give None);
+    else the configured store location; else the only active one.
+    """
+    from core.models import Location
+
+    raw = request.query_params.get("location")
+    if raw:
+        try:
+            return Location.objects.filter(pk=int(raw), is_active=True).first()
+        except (TypeError, ValueError):
+            return None
+    return _default_location()
+
+def _default_location():
+    """The configured store location, else the only active one."""
+    from core.models import Location
+
+    loc_id = getattr(settings, "KITCHEN_LOCATION_ID", None)
+    if loc_id:
+        return Location.objects.filter(pk=loc_id).first()
+    active = list(Location.objects.filter(is_active=True)[:2])
+    return active[0] if len(active) == 1 else None
 
 @login_required(login_url="/")
 def reserve_page(request):
-    return render(request, "reservations/reserve.html", {})
+    from core.models import Location
+
+    # The page sends ?location= with every availability request
+    locations = list(Location.objects.filter(is_active=True).order_by("name"))
+    current = _default_location()
+    if current is None and locations:
+        current = locations[0]
+    return render(request, "reservations/reserve.html", {
+        "locations": locations,
+        "location_id": current.pk if current else "",
+    })
 
 class AvailabilityView(APIView):
     permission_classes = [IsAuthenticated]
@@ -72,20 +103,20 @@ class AvailabilityView(APIView):
             return Response({"detail": "date and time are required"}, status=400)
 
         try:
-            slot_dt = _parse_dt(date, time)
+            day, at = _parse_slot(date, time)
         except ValueError:
             return Response({"detail": "Invalid date/time format."}, status=400)
+        location = _resolve_location(request)
+        if location is None:
+            return Response({"detail": "an active location is required"}, status=400)
 
         now = timezone.now()
-        # Map: table_id -> Reservation
-        res_map = {}
-        for r in _active_reservations(slot_dt):
-            res_map[r.table_id] = r
-
-        busy_map = _current_dinein_busy_map(now)  # table_number -> seconds
+        slot_start, slot_end = slot_window(location, day, at)
+        index = load_day(location, day)
+        busy_map = _current_dinein_busy_map(location, now)  # table_number -> seconds
 
         payload = []
-        for t in Table.objects.filter(is_active=True):
+        for t in Table.objects.filter(is_active=True, location=location):
             status = "available"
             hold_seconds = None
             res_id = None
@@ -96,11 +127,11 @@ class AvailabilityView(APIView):
                 status = "busy"
                 hold_seconds = busy_map[str(t.table_number)]
 
-            # Reserved in the requested slot
-            if t.id in res_map:
+            # Held by a reservation overlapping the requested slot
+            hit = index.conflict(t.id, slot_start, slot_end)
+            if hit:
                 status = "reserved"
-                res_id = res_map[t.id].id
-                res_status = res_map[t.id].status
+                res_id, res_status = hit
 
             payload.append({
                 "id": t.id,
@@ -114,6 +145,38 @@ class AvailabilityView(APIView):
 
         return Response(TableStatusSerializer(payload, many=True).data, status=200)
 
+class AvailabilityMatrixView(APIView):
+    """
+    Whole-day grid in one request:
+      ?start=YYYY-MM-DD&days=7&step=30&location=<id>&by=table|party
+    by=table (default): per day, every slot's status for every table.
+    by=party: per day and slot, how many free tables seat each party size.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        location = _resolve_location(request)
+        if location is None:
+            return Response({"detail": "an active location is required"}, status=400)
+        max_days = int(getattr(settings, "RESERVATION_MATRIX_MAX_DAYS", 14))
+        try:
+            start = request.query_params.get("start")
+            start = date.fromisoformat(start) if start else timezone.now().astimezone(location.tzinfo).date()
+            days = int(request.query_params.get("days") or 1)
+            step = int(request.query_params.get("step") or getattr(settings, "RESERVATION_SLOT_MINUTES", 30))
+        except ValueError:
+            return Response({"detail": "start must be YYYY-MM-DD; days/step must be integers."}, status=400)
+        if not 1 <= days <= max_days:
+            return Response({"detail": f"days must be between 1 and {max_days}."}, status=400)
+        if not 5 <= step <= 240 or (24 * 60) % step:
+            return Response({"detail": "step must divide the day, between 5 and 240 minutes."}, status=400)
+
+        now = timezone.now()
+        matrix = availability_matrix(location, start, days, step, now=now, busy=_current_dinein_busy_map(location, now))
+        if request.query_params.get("by") == "party":
+            matrix = party_size_matrix(matrix)
+        return Response(matrix, status=200)
+
 class CreateReservationView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -121,19 +184,17 @@ class CreateReservationView(APIView):
     def post(self, request):
         ser = CreateReservationSerializer(data=request.data, context={"request": request})
         ser.is_valid(raise_exception=True)
-        table = Table.objects.select_for_update().get(pk=ser.validated_data["table_id"])
-        slot_dt = _parse_dt(
-            ser.validated_data["date"].isoformat(),
-            ser.validated_data["time"].isoformat(timespec="minutes"),
-        )
+        table = Table.objects.select_for_update().select_related("location").get(pk=ser.validated_data["table_id"])
+        day, at = ser.validated_data["date"], ser.validated_data["time"]
+        slot_start, slot_end = slot_window(table.location, day, at)
 
         # deny if dine-in turnover busy
-        busy_map = _current_dinein_busy_map()
+        busy_map = _current_dinein_busy_map(table.location)
         if str(table.table_number) in busy_map and busy_map[str(table.table_number)] > 0:
             return Response({"detail": "Table busy (turnover). Try later or another table."}, status=409)
 
         # deny if another reservation blocks this time
-        if _active_reservations(slot_dt).filter(table=table).exists():
+        if load_day(table.location, day).conflict(table.id, slot_start, slot_end):
             return Response({"detail": "Table reserved at that time."}, status=409)
 
         reservation = ser.save()
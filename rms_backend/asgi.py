@@ -5,11 +5,13 @@ from channels.auth import AuthMiddlewareStack
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rms_backend.settings')
 
+django_asgi_app = get_asgi_application()
+
+from orders.routing import websocket_urlpatterns  # noqa: E402  (needs the app registry)
+
 application = ProtocolTypeRouter({
-    'http': get_asgi_application(),
+    'http': django_asgi_app,
     'websocket': AuthMiddlewareStack(
-        URLRouter([
-            # Add websocket URL patterns here
-        ])
+        URLRouter(websocket_urlpatterns)
     ),
 })
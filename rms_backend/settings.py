@@ -54,7 +54,7 @@ INSTALLED_APPS = [
     "billing",
     "payments",
     "coupons",
-     "loyality",
+    "loyality",
     "storefront",
 ]
 
@@ -76,6 +76,15 @@ CELERY_BEAT_SCHEDULE = {
         "task": "reservations.tasks_portal.mark_no_show_reservations",
         "schedule": 300.0,  # seconds
     },
+    # Safety net for order.paid outbox events whose on-commit kick was lost
+    "dispatch-payment-outbox-every-minute": {
+        "task": "payments.tasks.dispatch_outbox",
+        "schedule": 60.0,
+    },
+    "expire-loyalty-accruals-daily": {
+        "task": "loyality.tasks.expire_loyalty_accruals",
+        "schedule": 86400.0,
+    },
 }
 
 
@@ -175,6 +184,9 @@ REST_FRAMEWORK = {
         "rest_framework.parsers.FormParser",
         "rest_framework.parsers.MultiPartParser",
     ),
+    # Reverse proxies in front of the app; client IPs for throttling are read from
+    # X-Forwarded-For that many hops back (0 = REMOTE_ADDR, the header is ignored)
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", "0")),
 }
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
@@ -222,11 +234,88 @@ if parsed_dom.netloc:
     _csrf.add(f"https://{parsed_dom.netloc}")
 CSRF_TRUSTED_ORIGINS = sorted(_csrf)
 
+# ---------------- Cache ----------------
+# Shared by web, ASGI and Celery processes: the version tokens that invalidate
+# the availability matrix, coupon filter, promotions and loyalty config only
+# reach other processes through it. Local memory is per process (dev only);
+# core.checks refuses it when SHARED_CACHE_REQUIRED (default: DEBUG off).
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+SHARED_CACHE_REQUIRED = os.getenv("SHARED_CACHE_REQUIRED", "0" if DEBUG else "1") == "1"
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# ---------------- Channels / kitchen display ----------------
+# Redis layer so web and Celery processes reach the same websocket groups;
+# in-memory only works inside a single process (dev).
+CHANNEL_REDIS_URL = os.getenv("CHANNEL_REDIS_URL", "")
+if CHANNEL_REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [CHANNEL_REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+# Tickets are grouped per core.Location; orders carry none yet, so this is the default
+KITCHEN_LOCATION_ID = int(os.getenv("KITCHEN_LOCATION_ID", "0") or 0) or None
+KITCHEN_DEFAULT_STATION = os.getenv("KITCHEN_DEFAULT_STATION", "kitchen")
+
 # ---------------- Stripe ----------------
 STRIPE_PUBLIC_KEY = os.getenv("STRIPE_PUBLIC_KEY", "")
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
 STRIPE_CURRENCY = os.getenv("STRIPE_CURRENCY", "usd").lower()
+# Serve async checkout/webhook/success views (set when running under ASGI)
+PAYMENTS_ASYNC_VIEWS = os.getenv("PAYMENTS_ASYNC_VIEWS", "0") == "1"
+# Processes for bulk invoice/receipt PDF rendering (0 = CPU count)
+RENDER_FARM_WORKERS = int(os.getenv("RENDER_FARM_WORKERS", "0") or 0)
+# Largest invoice export served as one merged PDF (bigger ranges: ZIP)
+INVOICE_EXPORT_MERGED_MAX = int(os.getenv("INVOICE_EXPORT_MERGED_MAX", "5000"))
+# Receipt numbers reserved per process per DB round trip (1 = strictly gapless)
+INVOICE_NUMBER_BLOCK_SIZE = int(os.getenv("INVOICE_NUMBER_BLOCK_SIZE", "1"))
+# Storage alias (settings.STORAGES) that archive_invoices writes cold invoices to
+INVOICE_ARCHIVE_STORAGE = os.getenv("INVOICE_ARCHIVE_STORAGE", "default")
+# Thermal printer that dine-in receipts are queued for on payment ("" = don't auto-print)
+RECEIPT_PRINTER = os.getenv("RECEIPT_PRINTER", "")
+# Shared secret the local print agent sends as X-Print-Agent-Token
+PRINT_AGENT_TOKEN = os.getenv("PRINT_AGENT_TOKEN", "")
+# Times a print job is handed to the agent before it is left failed
+PRINT_MAX_ATTEMPTS = int(os.getenv("PRINT_MAX_ATTEMPTS", "5"))
+# Per-process coupon lookup cache: entries kept, and seconds before a hit/miss is re-read
+COUPON_CACHE_SIZE = int(os.getenv("COUPON_CACHE_SIZE", "4096"))
+COUPON_CACHE_TTL = float(os.getenv("COUPON_CACHE_TTL", "60"))
+# Bloom filter in front of coupon lookups: target false-positive rate, max age (s), log stats every N checks
+COUPON_FILTER_ERROR_RATE = float(os.getenv("COUPON_FILTER_ERROR_RATE", "0.01"))
+COUPON_FILTER_TTL = float(os.getenv("COUPON_FILTER_TTL", "300"))
+COUPON_FILTER_LOG_EVERY = int(os.getenv("COUPON_FILTER_LOG_EVERY", "1000"))
+# Per-client limit on /coupons/validate/ ("<n>/<s|min|hour|day>", "" = off)
+COUPON_VALIDATE_RATE = os.getenv("COUPON_VALIDATE_RATE", "30/min")
+# Max age (seconds) of a process's compiled promotion rules (coupons.promotions)
+PROMOTIONS_CACHE_TTL = float(os.getenv("PROMOTIONS_CACHE_TTL", "300"))
+# Max age (seconds) of a process's cached LoyaltyConfig (loyality.services)
+LOYALTY_CONFIG_TTL = float(os.getenv("LOYALTY_CONFIG_TTL", "300"))
+# Tips older than this many days expire from loyalty balances (0 = never)
+LOYALTY_ACCRUAL_EXPIRY_DAYS = int(os.getenv("LOYALTY_ACCRUAL_EXPIRY_DAYS", "0"))
+# How long a reservation holds its table (minutes)
+RESERVATION_DURATION_MINUTES = int(os.getenv("RESERVATION_DURATION_MINUTES", "90"))
+# Availability matrix: slot length (minutes), cache lifetime (seconds), longest range (days)
+RESERVATION_SLOT_MINUTES = int(os.getenv("RESERVATION_SLOT_MINUTES", "30"))
+RESERVATION_MATRIX_TTL = int(os.getenv("RESERVATION_MATRIX_TTL", "300"))
+RESERVATION_MATRIX_MAX_DAYS = int(os.getenv("RESERVATION_MATRIX_MAX_DAYS", "14"))
+# Minutes after its start before an unseated reservation is marked NO_SHOW
+RESERVATION_NO_SHOW_GRACE_MINUTES = int(os.getenv("RESERVATION_NO_SHOW_GRACE_MINUTES", "20"))
+# order.paid outbox: worker lease (s), first retry delay (s, doubles per attempt), attempts before giving up
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+OUTBOX_RETRY_SECONDS = float(os.getenv("OUTBOX_RETRY_SECONDS", "30"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
 
 # ---------------- Auth redirects ----------------
 LOGIN_URL = "/login/"
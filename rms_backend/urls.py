@@ -16,6 +16,7 @@ urlpatterns = [
     # APIs (unchanged)
     path("api/", include(("menu.urls", "menu"), namespace="menu")),
     path("api/orders/", include(("orders.urls", "orders"), namespace="orders")),
+    path("api/print/", include(("billing.urls_print", "print"), namespace="print")),
 
     # Payments
     path("payments/", include(("payments.urls", "payments"), namespace="payments")),
@@ -3,7 +3,6 @@ from __future__ import annotations
 
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import FieldDoesNotExist
-from django.db.models import Q
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse_lazy
 from django.views.generic import TemplateView
@@ -160,9 +159,8 @@ class MyOrdersView(LoginRequiredMixin, TemplateView):
             ctx["orders"] = []
             return ctx
 
-        paid_q = Q(payment__is_paid=True) | Q(is_paid=True) | Q(status="PAID")
         qs = (
-            Order.objects.filter(Q(created_by=self.request.user) & paid_q)
+            Order.objects.paid().filter(created_by=self.request.user)
             .select_related("payment")
             .prefetch_related("items__menu_item")
             .order_by("-created_at")